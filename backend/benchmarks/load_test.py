@@ -0,0 +1,316 @@
+"""
+HTTP load and latency benchmark of the API.
+
+Seeds a synthetic dataset in a dedicated database, starts the Open Gateway
+simulator and the API with local stand-ins (numpy vector search, fake
+embeddings), drives every scenario at the given concurrency and reports
+throughput and p50/p95/p99 latency per route. Results are saved as JSON in
+benchmarks/results/ (named after the current commit) and can be compared
+against a previous run to catch regressions.
+
+Usage (from backend/, with a local mongod):
+    python -m benchmarks.load_test [--requests 200] [--concurrency 32]
+        [--scenarios events_list,checkin] [--compare benchmarks/results/<file>.json]
+
+Environment:
+    MONGODB_URI          Mongo used for the benchmark (default mongodb://localhost:27017).
+    MONGODB_DATABASE     Benchmark database (default reputation_benchmark).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+BENCH_DATABASE = "reputation_benchmark"
+
+# Cada escenario devuelve (método, ruta, cuerpo) para la siguiente petición
+RequestFactory = Callable[[], Tuple[str, str, Optional[dict]]]
+
+
+def build_scenarios(manifest: Dict[str, List[str]]) -> Dict[str, RequestFactory]:
+    """
+    Request factories per scenario, cycling over the seeded IDs.
+
+    Check-in and review consume their reservations: each one is used once.
+    """
+    events = itertools.cycle(manifest["event_ids"])
+    users = itertools.cycle(manifest["user_ids"])
+    businesses = itertools.cycle(manifest["business_ids"])
+    pending = iter(manifest["pending_reservation_ids"])
+    checked_in = iter(manifest["checked_in_reservation_ids"])
+    new_phones = (f"+3470{i:07d}" for i in itertools.count())
+
+    return {
+        "events_list": lambda: ("GET", "/events", None),
+        "event_get": lambda: ("GET", f"/events/{next(events)}", None),
+        "business_events": lambda: ("GET", f"/businesses/{next(businesses)}/events", None),
+        "business_get": lambda: ("GET", f"/businesses/{next(businesses)}", None),
+        "user_events": lambda: ("GET", f"/events/user/{next(users)}/reservations", None),
+        "user_reservations": lambda: ("GET", f"/reservations/user/{next(users)}", None),
+        "recommendations": lambda: ("GET", f"/events/recommendations/{next(users)}", None),
+        "reservation_create": lambda: ("POST", "/reservations", {"eventId": next(events), "userId": next(users)}),
+        "checkin": lambda: ("POST", f"/reservations/{next(pending)}/checkin", None),
+        "review": lambda: ("POST", f"/reservations/{next(checked_in)}/review", {"rating": 4, "comment": "Muy buen ambiente y personal amable"}),
+        "user_create": lambda: ("POST", "/users/", {
+            "name": "Bench", "email": "bench@bench.local", "phone": next(new_phones), "birth_date": "1990-01-01",
+        }),
+    }
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    """Throughput and latency percentiles (ms) of one scenario."""
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    summary = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    if len(values):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        summary.update({
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "mean_ms": round(float(values.mean()), 2),
+            "max_ms": round(float(values.max()), 2),
+        })
+    return summary
+
+
+async def run_scenario(client: httpx.AsyncClient, factory: RequestFactory, requests: int, concurrency: int) -> dict:
+    """Send `requests` requests of one scenario with `concurrency` workers in flight."""
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            try:
+                method, path, body = factory()
+            except StopIteration:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run_benchmark(
+    client: httpx.AsyncClient,
+    manifest: Dict[str, List[str]],
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    warmup: int = 10,
+) -> Dict[str, dict]:
+    """Run the selected scenarios one after another and return their summaries."""
+    factories = build_scenarios(manifest)
+    results = {}
+    for name in scenarios:
+        factory = factories[name]
+        if warmup and name not in ("checkin", "review"):
+            await run_scenario(client, factory, warmup, min(concurrency, warmup))
+        results[name] = await run_scenario(client, factory, requests, concurrency)
+        print(format_row(name, results[name]))
+    return results
+
+
+def format_row(name: str, summary: dict) -> str:
+    return (
+        f"{name:<20} {summary['throughput_rps']:>9.1f} req/s  "
+        f"p50 {summary.get('p50_ms', float('nan')):>8.1f}  p95 {summary.get('p95_ms', float('nan')):>8.1f}  "
+        f"p99 {summary.get('p99_ms', float('nan')):>8.1f} ms  errors {summary['errors']}"
+    )
+
+
+def compare(results: Dict[str, dict], baseline_path: str, threshold: float) -> List[str]:
+    """
+    Compare p95 latency and throughput against a previous results file.
+
+    Returns:
+        list: routes that regressed by more than `threshold` (e.g. 0.1 = 10 %).
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["routes"]
+    regressions = []
+    print(f"\nComparación con {baseline_path}:")
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if not before or "p95_ms" not in before or "p95_ms" not in summary:
+            continue
+        p95_delta = summary["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        rps_delta = summary["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        flag = ""
+        if p95_delta > threshold or rps_delta < -threshold:
+            regressions.append(name)
+            flag = "  ⚠️  REGRESIÓN"
+        print(f"{name:<20} p95 {p95_delta:+7.1%}  throughput {rps_delta:+7.1%}{flag}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results: Dict[str, dict], config: dict) -> str:
+    """Write the results JSON to benchmarks/results/ and return its path."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    commit = git_commit()
+    timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"{timestamp}-{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "timestamp": timestamp, "config": config, "routes": results}, f, indent=2)
+    return path
+
+
+def benchmark_env(mongodb_uri: str, database: str, simulator_url: str) -> dict:
+    """Environment of the API process: local stand-ins for every external service."""
+    env = dict(os.environ)
+    env.update({
+        "MONGODB_URI": mongodb_uri,
+        "MONGODB_DATABASE": database,
+        "VECTOR_SEARCH_BACKEND": "numpy",
+        "EMBEDDING_BACKEND": "fake",
+        "OGW_BASE_URL": simulator_url,
+        "CHECKIN_CHECKS": env.get("CHECKIN_CHECKS", "location,kyc"),
+        "MONGODB_REPORT_COLLSCANS": env.get("MONGODB_REPORT_COLLSCANS", "true"),
+        "PYTHONPATH": BACKEND_DIR,
+    })
+    # AzureChatOpenAI se construye al importar algunos módulos aunque no se use
+    env.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    env.setdefault("AZURE_OPENAI_ENDPOINT", "https://benchmark.invalid")
+    env.setdefault("OPENAI_API_VERSION", "2024-02-01")
+    return env
+
+
+def start_server(app: str, port: int, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"El servidor no respondió a tiempo: {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark of the API.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--scenarios", default="", help="Comma separated scenarios (default: all)")
+    parser.add_argument("--events", type=int, default=500, help="Seeded events")
+    parser.add_argument("--users", type=int, default=200, help="Seeded users")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset random seed")
+    parser.add_argument("--api-port", type=int, default=8101)
+    parser.add_argument("--simulator-port", type=int, default=9101)
+    parser.add_argument("--simulator-latency", default="lognormal:80,0.4", help="OGW_SIM_LATENCY_MS of the simulator")
+    parser.add_argument("--base-url", default="", help="Benchmark an already running API (no seeding, no servers)")
+    parser.add_argument("--manifest", default="", help="Seed manifest JSON to use with --base-url")
+    parser.add_argument("--compare", default="", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Regression threshold for --compare")
+    parser.add_argument("--no-save", action="store_true", help="Do not write the results file")
+    args = parser.parse_args()
+
+    from src.app.database.mongodb import DATABASE_NAME, get_client_options, get_mongo_client
+
+    mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+    database = os.getenv("MONGODB_DATABASE", BENCH_DATABASE)
+    if database == DATABASE_NAME:
+        raise SystemExit(f"Refusing to seed the production database '{DATABASE_NAME}'")
+
+    manifest_path = args.manifest or os.path.join(RESULTS_DIR, "manifest.json")
+    servers: List[subprocess.Popen] = []
+    try:
+        if args.base_url:
+            base_url = args.base_url
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        else:
+            from benchmarks.seed import seed_dataset
+
+            client = get_mongo_client(mongodb_uri, **get_client_options())
+            print(f"🌱 Seeding {database}...")
+            manifest = seed_dataset(
+                client.get_database(database),
+                events=args.events,
+                users=args.users,
+                pending_reservations=args.requests + 10,
+                checked_in_reservations=args.requests + 10,
+                seed=args.seed,
+            )
+            client.close()
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+            simulator_url = f"http://127.0.0.1:{args.simulator_port}"
+            base_url = f"http://127.0.0.1:{args.api_port}"
+            env = benchmark_env(mongodb_uri, database, simulator_url)
+            env.update({"OGW_SIM_LATENCY_MS": args.simulator_latency, "OGW_SIM_SEED": str(args.seed)})
+            servers.append(start_server("src.app.simulators.open_gateway:app", args.simulator_port, env, os.path.join(RESULTS_DIR, "simulator.log")))
+            servers.append(start_server("src.app.main:app", args.api_port, env, os.path.join(RESULTS_DIR, "api.log")))
+            wait_until_ready(f"{simulator_url}/_sim/stats")
+            wait_until_ready(f"{base_url}/health/db")
+
+        scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()] or list(build_scenarios(manifest))
+
+        async def drive():
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+                return await run_benchmark(client, manifest, scenarios, args.requests, args.concurrency)
+
+        print(f"🚀 {args.requests} requests per scenario, concurrency {args.concurrency}\n")
+        results = asyncio.run(drive())
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait(timeout=10)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("compare", "no_save")}
+    if not args.no_save:
+        print(f"\n💾 Results saved to {save_results(results, config)}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            raise SystemExit(f"Regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Synthetic dataset for the benchmarks.
+
+Creates businesses, events (with their description embeddings), users,
+reviews (with their review embeddings) and reservations in every state the
+load test needs: pending (for check-in) and checked-in without review (for
+reviews). Embeddings come from the deterministic FakeEmbeddings, so no
+model is called and runs are reproducible for a given seed.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from pymongo.database import Database
+
+from src.app.helpers.ids import new_id
+from src.app.services.embeddings import FakeEmbeddings
+
+SEEDED_COLLECTIONS = (
+    "businesses", "events", "users", "reservations",
+    "eventEmbeddings", "reviewEmbeddings", "reviewEmbeddingJobs",
+    "reviewEmbeddingDeadLetters", "embeddingCache",
+)
+
+WORDS = (
+    "concierto jazz terraza cena degustación vinos tapas taller cerámica yoga "
+    "brunch museo visita guiada cata cerveza artesanal flamenco cocina italiana "
+    "sushi monólogo teatro cine exposición fotografía mercado vintage ruta bici"
+).split()
+
+COMMENTS = (
+    "Muy buen ambiente y personal amable",
+    "La comida llegó fría y tardaron mucho",
+    "Todo perfecto, repetiremos",
+    "Sitio limpio y seguro, buena música",
+    "Demasiado ruido y poca atención al cliente",
+)
+
+
+def _description(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(12))
+
+
+def seed_dataset(
+    db: Database,
+    businesses: int = 20,
+    events: int = 500,
+    users: int = 200,
+    reviews_per_user: int = 3,
+    pending_reservations: int = 500,
+    checked_in_reservations: int = 500,
+    dimensions: int = 3072,
+    seed: int = 42,
+) -> Dict[str, List[str]]:
+    """
+    Drop the benchmark collections and fill them with a synthetic dataset.
+
+    Args:
+        db (Database): Target database (never the production one).
+        businesses, events, users (int): Number of documents of each kind.
+        reviews_per_user (int): Reviews per user, used by the recommendations.
+        pending_reservations (int): Reservations ready for check-in.
+        checked_in_reservations (int): Completed check-ins ready for a review.
+        dimensions (int): Embedding size.
+        seed (int): Random seed.
+
+    Returns:
+        dict: IDs by kind (business_ids, event_ids, user_ids, phones,
+        pending_reservation_ids, checked_in_reservation_ids).
+    """
+    rng = random.Random(seed)
+    embeddings = FakeEmbeddings(dimensions)
+    now = datetime.utcnow()
+    for name in SEEDED_COLLECTIONS:
+        db.drop_collection(name)
+
+    business_docs = [
+        {
+            "_id": new_id(), "name": f"Negocio {i}", "vertical": "restauración", "plan": "basic",
+            "apiKey": f"bench-{i}", "config": {}, "totalReservations": 0, "totalNoShows": 0, "createdAt": now,
+        }
+        for i in range(businesses)
+    ]
+    db["businesses"].insert_many(business_docs)
+    business_ids = [str(doc["_id"]) for doc in business_docs]
+
+    event_docs = []
+    for i in range(events):
+        start = now + timedelta(days=rng.randint(1, 60))
+        event_docs.append({
+            "_id": new_id(),
+            "businessId": rng.choice(business_ids),
+            "name": f"Evento {i}",
+            "description": _description(rng),
+            "type": "fixed",
+            "start": start,
+            "end": start + timedelta(hours=2),
+            "capacity": rng.randint(10, 200),
+            "location": "Madrid",
+            "createdAt": now,
+            "price": round(rng.uniform(0, 60), 2),
+            "latitude": 40.4168 + rng.uniform(-0.05, 0.05),
+            "longitude": -3.7038 + rng.uniform(-0.05, 0.05),
+        })
+    db["events"].insert_many(event_docs)
+    event_ids = [str(doc["_id"]) for doc in event_docs]
+    events_by_id = {str(doc["_id"]): doc for doc in event_docs}
+
+    vectors = embeddings.embed_documents([doc["description"] for doc in event_docs])
+    db["eventEmbeddings"].insert_many([
+        {
+            "eventId": str(doc["_id"]),
+            "businessId": doc["businessId"],
+            "description": doc["description"],
+            "embedding": vector,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        for doc, vector in zip(event_docs, vectors)
+    ])
+
+    user_docs, phones = [], []
+    for i in range(users):
+        phone = f"+3460{i:07d}"
+        phones.append(phone)
+        user_docs.append({
+            "_id": new_id(),
+            "verified": True,
+            "kyc": {"_id": new_id(), "name": f"Usuario {i}", "email": f"user{i}@bench.local", "phone": phone, "birth_date": datetime(1990, 1, 1)},
+            "roles": [],
+            "metadata": None,
+            "createdAt": now,
+            "lastActiveAt": None,
+            "noShowCount": 0,
+            "successfulCheckins": 0,
+            "anomalyCheckins": 0,
+            "reviewCount": 0,
+            "averageUserRating": 0.0,
+        })
+    db["users"].insert_many(user_docs)
+    user_ids = [str(doc["_id"]) for doc in user_docs]
+    users_by_id = {str(doc["_id"]): doc for doc in user_docs}
+
+    def reservation(user_id: str, event_id: str, checkin=None) -> dict:
+        return {
+            "_id": new_id(),
+            "eventId": event_id,
+            "userId": user_id,
+            "status": "completed",
+            "preverifiedAt": now,
+            "otpVerified": True,
+            "kycVerified": True,
+            "locationVerified": True,
+            "kycInfo": users_by_id[user_id]["kyc"],
+            "checkin": checkin,
+            "completedAt": now,
+            "cancelledAt": None,
+            "canceledReason": None,
+        }
+
+    def completed_checkin(review=None) -> dict:
+        return {
+            "status": "completed", "requestedAt": now, "otpVerified": True,
+            "locationVerified": True, "kycVerified": True, "completedAt": None,
+            "anomalies": [], "review": review, "previous_anomaly_checkins": False,
+        }
+
+    # Reseñas históricas: alimentan los perfiles de las recomendaciones
+    reviewed, review_docs = [], []
+    for user_id in user_ids:
+        for event_id in rng.sample(event_ids, reviews_per_user):
+            rating = rng.randint(1, 5)
+            comment = rng.choice(COMMENTS)
+            res = reservation(user_id, event_id, completed_checkin({"rating": rating, "comment": comment, "createdAt": now}))
+            reviewed.append(res)
+            review_docs.append({
+                "reservationId": str(res["_id"]),
+                "userId": user_id,
+                "eventId": event_id,
+                "businessId": events_by_id[event_id]["businessId"],
+                "rating": float(rating),
+                "text": comment,
+                "createdAt": now,
+                "updatedAt": now,
+            })
+    for doc, vector in zip(review_docs, embeddings.embed_documents([doc["text"] for doc in review_docs])):
+        doc["embedding"] = vector
+
+    pending = [reservation(rng.choice(user_ids), rng.choice(event_ids)) for _ in range(pending_reservations)]
+    checked_in = [reservation(rng.choice(user_ids), rng.choice(event_ids), completed_checkin()) for _ in range(checked_in_reservations)]
+    for docs in (reviewed, pending, checked_in):
+        if docs:
+            db["reservations"].insert_many(docs)
+    if review_docs:
+        db["reviewEmbeddings"].insert_many(review_docs)
+
+    return {
+        "business_ids": business_ids,
+        "event_ids": event_ids,
+        "user_ids": user_ids,
+        "phones": phones,
+        "pending_reservation_ids": [str(doc["_id"]) for doc in pending],
+        "checked_in_reservation_ids": [str(doc["_id"]) for doc in checked_in],
+    }
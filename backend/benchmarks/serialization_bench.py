@@ -0,0 +1,118 @@
+"""
+Per-document cost of serializing read responses, before and after the fast path.
+
+  standard: what FastAPI does with `response_model` -> convert the ObjectIds,
+            validate every document against the model, dump it in JSON mode
+            and encode with the json module (JSONResponse).
+  fast:     helpers/serialization.fast_response -> precompiled shape plan,
+            no validation, orjson.
+
+Both paths run over the same synthetic documents (as the repositories return
+them) and the decoded outputs are compared, so the speedup is not bought
+with a different response.
+
+Usage (from backend/):
+    python -m benchmarks.serialization_bench [--docs 1000] [--repeat 20]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Type
+
+from bson import ObjectId
+from pydantic import BaseModel, TypeAdapter
+
+from src.app.helpers.serialization import FastJSONResponse, get_shape
+from src.app.models.EventModel import EventModel
+from src.app.models.ReservationModel import ReservationModel
+
+
+def make_event(rng: random.Random, now: datetime) -> dict:
+    start = now + timedelta(days=rng.randint(1, 60))
+    return {
+        "_id": ObjectId(), "businessId": str(ObjectId()), "name": f"Evento {rng.randint(0, 10_000)}",
+        "description": "concierto jazz terraza cena degustación " * 3, "type": "fixed",
+        "start": start, "end": start + timedelta(hours=2), "capacity": rng.randint(10, 200),
+        "location": "Madrid", "createdAt": now, "price": round(rng.uniform(0, 60), 2),
+        "latitude": 40.4168, "longitude": -3.7038,
+    }
+
+
+def make_reservation(rng: random.Random, now: datetime) -> dict:
+    return {
+        "_id": ObjectId(), "eventId": str(ObjectId()), "userId": str(ObjectId()), "status": "completed",
+        "preverifiedAt": now, "otpVerified": True, "kycVerified": True, "locationVerified": True,
+        "kycInfo": {"_id": str(ObjectId()), "name": "Usuario", "email": "user@bench.local", "phone": "+34600000000", "createdAt": now, "birth_date": datetime(1990, 1, 1)},
+        "checkin": {
+            "status": "completed", "requestedAt": now, "otpVerified": True, "locationVerified": True,
+            "kycVerified": True, "completedAt": now, "previous_anomaly_checkins": False,
+            "review": {"rating": rng.randint(1, 5), "comment": "Muy buen ambiente", "createdAt": now},
+        },
+        "completedAt": now, "cancelledAt": None, "canceledReason": None,
+    }
+
+
+def standard_path(model: Type[BaseModel]) -> Callable[[List[dict]], bytes]:
+    adapter = TypeAdapter(List[model])
+
+    def serialize(docs: List[dict]) -> bytes:
+        docs = [{**doc, "_id": str(doc["_id"])} for doc in docs]
+        content = adapter.dump_python(adapter.validate_python(docs), mode="json", by_alias=True)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    return serialize
+
+
+def fast_path(model: Type[BaseModel]) -> Callable[[List[dict]], bytes]:
+    shape = get_shape(model)
+    response = FastJSONResponse.__new__(FastJSONResponse)
+
+    def serialize(docs: List[dict]) -> bytes:
+        # Los repositorios ya devuelven los _id como string
+        docs = [{**doc, "_id": str(doc["_id"])} for doc in docs]
+        return response.render(shape.many(docs))
+
+    return serialize
+
+
+def time_per_doc(serialize: Callable[[List[dict]], bytes], docs: List[dict], repeat: int) -> float:
+    """Best-of-`repeat` time per document, in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(docs)
+        best = min(best, time.perf_counter() - start)
+    return best / len(docs) * 1e6
+
+
+def run(docs_count: int = 1000, repeat: int = 20, seed: int = 42) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=123000)
+    cases = {
+        "EventModel": (EventModel, [make_event(rng, now) for _ in range(docs_count)]),
+        "ReservationModel": (ReservationModel, [make_reservation(rng, now) for _ in range(docs_count)]),
+    }
+    results = {}
+    for name, (model, docs) in cases.items():
+        standard, fast = standard_path(model), fast_path(model)
+        same = json.loads(standard(docs)) == json.loads(fast(docs))
+        standard_us, fast_us = time_per_doc(standard, docs, repeat), time_per_doc(fast, docs, repeat)
+        results[name] = {"standard_us": standard_us, "fast_us": fast_us, "speedup": standard_us / fast_us, "same_output": same}
+        print(f"{name:<18} standard {standard_us:7.2f} µs/doc   fast {fast_us:7.2f} µs/doc   "
+              f"x{standard_us / fast_us:5.1f}   same output: {same}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-document serialization cost, standard vs fast path.")
+    parser.add_argument("--docs", type=int, default=1000, help="Documents per response")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per path (best one is reported)")
+    args = parser.parse_args()
+    run(args.docs, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
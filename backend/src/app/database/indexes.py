@@ -0,0 +1,304 @@
+"""
+Declarative index management.
+
+Every index is declared with an `IndexSpec` next to the query it serves (the
+`indexes` attribute of each Mongo repository, `SYNC_INDEXES` in
+vector_search) and `ensure_indexes` makes the database match them:
+
+  - creates the missing indexes and recreates those whose definition changed;
+  - drops the indexes of RETIRED_INDEXES, which no query uses any more;
+  - records INDEX_VERSION in the `schemaVersions` collection.
+
+It is idempotent and runs at startup (MONGODB_ENSURE_INDEXES, on by default)
+or from the CLI. Bump INDEX_VERSION whenever the declarations change.
+
+`CollscanReporter` finds the queries that still scan whole collections: with
+MONGODB_REPORT_COLLSCANS=true it records the shape of every query the app
+runs and, at shutdown (or from `report`), explains one sample per shape and
+logs those whose plan has a COLLSCAN stage. The repo has no test suite, so
+to check the queries of a test or load run, run the API against a real
+mongod with the variable on and read the report in its log at shutdown;
+benchmarks/load_test.py turns it on for the API it starts.
+
+Usage (from backend/):
+    python -m src.app.database.indexes [--dry-run]
+"""
+
+import argparse
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 5
+SCHEMA_VERSIONS_COLLECTION = "schemaVersions"
+
+# Índices del antiguo mongo_script.py que ya no sirven a ninguna consulta
+RETIRED_INDEXES = {
+    "users": ("idx_users_mobile",),
+    "events": ("idx_events_businessId",),
+    "reservations": ("idx_reservations_eventId", "idx_reservations_userId"),
+}
+
+
+class IndexSpec:
+    """
+    One declared index.
+
+    Args:
+        collection (str): Collection name.
+        keys (list): (field, direction) pairs, as for `create_index`.
+        name (str): Index name (stable: it identifies the index across runs).
+        serves (str): The query the index exists for.
+        options: Extra `create_index` options (unique, partialFilterExpression...).
+    """
+
+    def __init__(self, collection: str, keys: List[Tuple[str, int]], name: str, serves: str, **options):
+        self.collection = collection
+        self.keys = list(keys)
+        self.name = name
+        self.serves = serves
+        self.options = options
+
+    def matches(self, existing: dict) -> bool:
+        """Whether an index from `index_information()` has this definition."""
+        if [tuple(key) for key in existing.get("key", [])] != [tuple(key) for key in self.keys]:
+            return False
+        return all(existing.get(option) == value for option, value in self.options.items())
+
+
+def declared_indexes() -> List[IndexSpec]:
+    """All the indexes declared by the modules that run queries."""
+    # Importes aquí: esos módulos importan IndexSpec de este
+    from src.app.repositories.mongo import MONGO_REPOSITORIES
+    from src.app.services.vector_search import SYNC_INDEXES
+
+    specs = []
+    for repository in MONGO_REPOSITORIES:
+        specs.extend(repository.indexes)
+    specs.extend(SYNC_INDEXES)
+    return specs
+
+
+def plan_indexes(db: Database, specs: Optional[List[IndexSpec]] = None) -> Dict[str, list]:
+    """
+    Changes needed to make the database match the declarations.
+
+    Returns:
+        dict: `create` (new specs), `recreate` (specs whose definition
+        changed) and `drop` ((collection, name) of retired indexes).
+    """
+    specs = declared_indexes() if specs is None else specs
+    plan = {"create": [], "recreate": [], "drop": []}
+    existing_by_collection = {}
+    for spec in specs:
+        if spec.collection not in existing_by_collection:
+            existing_by_collection[spec.collection] = db[spec.collection].index_information()
+        existing = existing_by_collection[spec.collection].get(spec.name)
+        if existing is None:
+            plan["create"].append(spec)
+        elif not spec.matches(existing):
+            plan["recreate"].append(spec)
+    for collection, names in RETIRED_INDEXES.items():
+        existing = existing_by_collection.get(collection)
+        if existing is None:
+            existing = existing_by_collection[collection] = db[collection].index_information()
+        plan["drop"].extend((collection, name) for name in names if name in existing)
+    return plan
+
+
+def ensure_indexes(db: Database, specs: Optional[List[IndexSpec]] = None) -> Dict[str, list]:
+    """
+    Apply the index plan; a failing index is reported and the rest still applied.
+
+    Returns:
+        dict: the applied plan plus `errors` ((index name, message) pairs).
+    """
+    plan = plan_indexes(db, specs)
+    plan["errors"] = []
+    for collection, name in plan["drop"]:
+        try:
+            db[collection].drop_index(name)
+            logger.info("Dropped retired index %s.%s", collection, name)
+        except PyMongoError as e:
+            plan["errors"].append((name, str(e)))
+    for spec in plan["recreate"] + plan["create"]:
+        try:
+            if spec in plan["recreate"]:
+                db[spec.collection].drop_index(spec.name)
+            db[spec.collection].create_index(spec.keys, name=spec.name, **spec.options)
+            logger.info("Index %s.%s ready (%s)", spec.collection, spec.name, spec.serves)
+        except PyMongoError as e:
+            plan["errors"].append((spec.name, str(e)))
+            logger.error("Could not create index %s.%s: %s", spec.collection, spec.name, e)
+    db[SCHEMA_VERSIONS_COLLECTION].update_one(
+        {"_id": "indexes"},
+        {"$set": {"version": INDEX_VERSION, "appliedAt": datetime.utcnow(), "errors": len(plan["errors"])}},
+        upsert=True,
+    )
+    return plan
+
+
+def ensure_indexes_on_startup(db: Database):
+    """Startup hook: sync the indexes unless MONGODB_ENSURE_INDEXES=false; never fails the app."""
+    if os.getenv("MONGODB_ENSURE_INDEXES", "true").lower() not in ("1", "true", "yes"):
+        return
+    try:
+        ensure_indexes(db)
+    except PyMongoError as e:
+        logger.error("Index sync failed, the app keeps running: %s", e)
+
+
+# ——— Detección de consultas sin índice ———
+
+QUERY_COMMANDS = ("find", "aggregate", "count", "distinct", "update", "delete", "findAndModify")
+# Campos de sesión/transporte que no forman parte de la consulta
+COMMAND_METADATA = {"$db", "lsid", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "writeConcern", "batchSize", "singleBatch", "comment"}
+
+
+def _shape(value):
+    """Query shape: same structure with every literal replaced by its type."""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape(item) for item in value[:1]]
+    return type(value).__name__
+
+
+def _query_part(name: str, command: dict):
+    if name == "aggregate":
+        return command.get("pipeline")
+    if name == "update":
+        return [update.get("q") for update in command.get("updates", [])]
+    if name == "delete":
+        return [delete.get("q") for delete in command.get("deletes", [])]
+    return {"filter": command.get("filter") or command.get("query"), "sort": command.get("sort")}
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(item) for item in plan)
+    return False
+
+
+def _is_full_read(name: str, command: dict) -> bool:
+    # find({}) sin orden: lectura completa intencionada (p. ej. carga del índice vectorial)
+    return name == "find" and not command.get("filter") and not command.get("sort")
+
+
+class CollscanReporter(monitoring.CommandListener):
+    """Records one sample command per query shape, to explain them later."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, Tuple[str, dict]] = {}
+
+    def started(self, event):
+        if event.command_name not in QUERY_COMMANDS:
+            return
+        command = {key: value for key, value in event.command.items() if key not in COMMAND_METADATA}
+        if _is_full_read(event.command_name, command):
+            return
+        key = repr((event.command_name, command.get(event.command_name), _shape(_query_part(event.command_name, command))))
+        with self._lock:
+            self.samples.setdefault(key, (event.database_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def report(self, client) -> List[dict]:
+        """
+        Explain one sample per recorded query shape.
+
+        Returns:
+            list: the shapes whose plan scans a whole collection
+            (collection, command, query).
+        """
+        with self._lock:
+            samples = list(self.samples.values())
+        collscans = []
+        for database_name, command in samples:
+            name = next(iter(command))
+            try:
+                explained = client[database_name].command("explain", command, verbosity="queryPlanner")
+            except PyMongoError:
+                continue
+            if _has_collscan(explained.get("queryPlanner", explained)):
+                collscans.append({"collection": command[name], "command": name, "query": _query_part(name, command)})
+        return collscans
+
+
+_collscan_reporter: Optional[CollscanReporter] = None
+
+
+def get_collscan_reporter() -> Optional[CollscanReporter]:
+    """
+    The process-wide reporter, created when the client listeners are built
+    (after .env is loaded). None unless MONGODB_REPORT_COLLSCANS is on.
+    """
+    global _collscan_reporter
+    if _collscan_reporter is None and os.getenv("MONGODB_REPORT_COLLSCANS", "false").lower() in ("1", "true", "yes"):
+        _collscan_reporter = CollscanReporter()
+    return _collscan_reporter
+
+
+def log_collscan_report(client):
+    """Shutdown hook: log the unindexed queries seen by this process."""
+    if _collscan_reporter is None:
+        return
+    collscans = _collscan_reporter.report(client)
+    logger.warning("%d query shapes seen, %d without index", len(_collscan_reporter.samples), len(collscans))
+    for collscan in collscans:
+        logger.warning("COLLSCAN %s.%s: %s", collscan["collection"], collscan["command"], collscan["query"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make the MongoDB indexes match the declared ones.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the changes")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from src.app.database.mongodb import get_client_options, get_database, get_mongo_client
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI environment variable is required")
+    client = get_mongo_client(mongodb_uri, **get_client_options())
+    try:
+        db = get_database(client)
+        if args.dry_run:
+            plan = plan_indexes(db)
+            for spec in plan["create"]:
+                print(f"➕ create {spec.collection}.{spec.name} {spec.keys} ({spec.serves})")
+            for spec in plan["recreate"]:
+                print(f"♻️  recreate {spec.collection}.{spec.name} {spec.keys} ({spec.serves})")
+            for collection, name in plan["drop"]:
+                print(f"➖ drop {collection}.{name}")
+            if not any(plan.values()):
+                print(f"✅ Indexes up to date (version {INDEX_VERSION})")
+        else:
+            plan = ensure_indexes(db)
+            print(f"✅ Index version {INDEX_VERSION}: {len(plan['create'])} created, {len(plan['recreate'])} recreated, "
+                  f"{len(plan['drop'])} dropped, {len(plan['errors'])} errors")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Online migration of document IDs to their canonical string form (see helpers/ids.py).
+
+For every collection it:
+  1. Converts the ObjectId references (eventId, userId, businessId,
+     reservationId) to strings with one server-side update per field.
+  2. Rewrites every ObjectId `_id` as a string. `_id` is immutable, so each
+     document is copied under the string ID and the original deleted; if the
+     original was written between the copy and the delete, its latest
+     version wins.
+
+The API keeps serving during the run: with ID_LEGACY_OBJECTID_LOOKUP enabled
+lookups match both forms. Every step is idempotent, so an interrupted run can
+simply be started again. When `--dry-run` reports nothing left, set
+ID_LEGACY_OBJECTID_LOOKUP=false.
+
+Usage (from backend/):
+    python -m src.app.database.migrate_ids [--dry-run] [--batch-size 500]
+                                           [--collection events ...]
+"""
+
+import argparse
+import os
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+
+from src.app.database.mongodb import get_client_options, get_database, get_mongo_client
+from src.app.helpers.ids import REFERENCE_FIELDS, encode_id
+
+load_dotenv()
+
+MIGRATED_COLLECTIONS = (
+    "businesses", "events", "users", "reservations",
+    "eventEmbeddings", "reviewEmbeddings",
+)
+
+DUPLICATE_KEY = 11000
+
+
+def pending_counts(db: Database, collection: str) -> Dict[str, int]:
+    """Documents of a collection still holding ObjectId IDs, by field."""
+    coll = db[collection]
+    counts = {"_id": coll.count_documents({"_id": {"$type": "objectId"}})}
+    for field in REFERENCE_FIELDS:
+        counts[field] = coll.count_documents({field: {"$type": "objectId"}})
+    return counts
+
+
+def migrate_references(db: Database, collection: str) -> int:
+    """Convert the ObjectId reference fields to strings (server-side, no round trips)."""
+    modified = 0
+    for field in REFERENCE_FIELDS:
+        result = db[collection].update_many(
+            {field: {"$type": "objectId"}},
+            [{"$set": {field: {"$toString": f"${field}"}}}],
+        )
+        modified += result.modified_count
+    return modified
+
+
+def _copy(db: Database, collection: str, docs: List[dict]):
+    """Insert the string-ID copies; copies left by an interrupted run are refreshed."""
+    try:
+        db[collection].insert_many([{**doc, "_id": encode_id(doc["_id"])} for doc in docs], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details["writeErrors"]:
+            if error["code"] != DUPLICATE_KEY:
+                raise
+            doc = docs[error["index"]]
+            db[collection].replace_one({"_id": encode_id(doc["_id"])}, {**doc, "_id": encode_id(doc["_id"])})
+
+
+def migrate_ids_batch(db: Database, collection: str, batch_size: int) -> int:
+    """
+    Move one batch of ObjectId `_id`s to their string form.
+
+    Returns:
+        int: number of documents migrated (0 when none are left).
+    """
+    coll = db[collection]
+    docs = list(coll.find({"_id": {"$type": "objectId"}}).limit(batch_size))
+    if not docs:
+        return 0
+    _copy(db, collection, docs)
+    for doc in docs:
+        latest = coll.find_one_and_delete({"_id": doc["_id"]})
+        # Escrito entre la copia y el borrado: gana la última versión del original
+        if latest is not None and latest != doc:
+            coll.replace_one({"_id": encode_id(doc["_id"])}, {**latest, "_id": encode_id(doc["_id"])})
+    return len(docs)
+
+
+def migrate_collection(db: Database, collection: str, batch_size: int = 500) -> Dict[str, int]:
+    """Migrate the references and the `_id`s of one collection."""
+    references = migrate_references(db, collection)
+    ids = 0
+    while True:
+        migrated = migrate_ids_batch(db, collection, batch_size)
+        if not migrated:
+            break
+        ids += migrated
+        print(f"   {collection}: {ids} IDs migrated")
+    return {"references": references, "ids": ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize stored IDs to their canonical string form.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what is left to migrate")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per copy batch")
+    parser.add_argument("--collection", action="append", choices=MIGRATED_COLLECTIONS, help="Collection to migrate (repeatable; default all)")
+    args = parser.parse_args()
+
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI environment variable is required")
+    client = get_mongo_client(mongodb_uri, **get_client_options())
+    db = get_database(client)
+    try:
+        for collection in args.collection or MIGRATED_COLLECTIONS:
+            if args.dry_run:
+                counts = pending_counts(db, collection)
+                left = ", ".join(f"{field}={count}" for field, count in counts.items() if count) or "nothing"
+                print(f"🔎 {collection}: {left} left")
+            else:
+                print(f"🚚 Migrating {collection}...")
+                result = migrate_collection(db, collection, args.batch_size)
+                print(f"✅ {collection}: {result['references']} references, {result['ids']} IDs")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
-from pymongo import MongoClient, ASCENDING
+import os
+import sys
+from pymongo import MongoClient
 from pymongo.errors import CollectionInvalid, OperationFailure
 from pymongo.operations import SearchIndexModel
 from datetime import datetime
 
+# backend/ en el path para importar el gestor de índices
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from src.app.database.indexes import ensure_indexes
+
 # --------------------------------------------------------
 # 1. Conexión a MongoDB
 # --------------------------------------------------------
@@ -15,7 +21,7 @@ db = client["reputation_system"]  # Nombre de la base de datos
 # --------------------------------------------------------
 # 2. Creación de colecciones (si no existen)
 # --------------------------------------------------------
-collections = ["users", "businesses", "events", "reservations", "reviewEmbeddings", "eventEmbeddings"]
+collections = ["users", "businesses", "events", "reservations", "reviewEmbeddings", "eventEmbeddings", "reviewEmbeddingJobs", "businessReputation", "analyticsRollups", "siteGrid"]
 for coll_name in collections:
     try:
         db.create_collection(coll_name)
@@ -26,38 +32,10 @@ for coll_name in collections:
         print(f"Error al crear colección '{coll_name}': {e}")
         
 # --------------------------------------------------------
-# 3. Índices básicos para las colecciones principales
+# 3. Índices: declarados junto a las consultas (database/indexes.py)
 # --------------------------------------------------------
+ensure_indexes(db)
 
-# 3.1 users: índice único en 'mobile'
-try:
-    db.users.create_index([("mobile", ASCENDING)], unique=True, name="idx_users_mobile")
-    print("Índice único creado en 'users.mobile'.")
-except Exception as e:
-    print(f"Error al crear índice en 'users.mobile': {e}")
-
-# 3.2 businesses: índice único en 'apiKey'
-try:
-    db.businesses.create_index([("apiKey", ASCENDING)], unique=True, name="idx_businesses_apiKey")
-    print("Índice único creado en 'businesses.apiKey'.")
-except Exception as e:
-    print(f"Error al crear índice en 'businesses.apiKey': {e}")
-
-# 3.3 events: índice en 'businessId' para consultas rápidas
-try:
-    db.events.create_index([("businessId", ASCENDING)], name="idx_events_businessId")
-    print("Índice creado en 'events.businessId'.")
-except Exception as e:
-    print(f"Error al crear índice en 'events.businessId': {e}")
-
-# 3.4 reservations: índices en 'eventId' y 'userId'
-try:
-    db.reservations.create_index([("eventId", ASCENDING)], name="idx_reservations_eventId")
-    db.reservations.create_index([("userId", ASCENDING)], name="idx_reservations_userId")
-    print("Índices creados en 'reservations.eventId' y 'reservations.userId'.")
-except Exception as e:
-    print(f"Error al crear índices en 'reservations': {e}")
-    
 # --------------------------------------------------------
 # 4. Configuración de Vector Search en 'reviewEmbeddings'
 # --------------------------------------------------------
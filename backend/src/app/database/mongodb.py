@@ -1,23 +1,216 @@
+import functools
+import os
+import threading
+from collections import Counter
+from typing import Callable, Optional, TypeVar
+
+from anyio import CapacityLimiter, to_thread
+
+from pymongo import monitoring
 from pymongo.database import Database
 from pymongo.mongo_client import MongoClient
 
+DATABASE_NAME = "reputation_system"
+
+# Cliente compartido por todo el proceso. Se crea en el lifespan de la app (main.py)
+# y lo reutilizan todas las dependencias de los routers.
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
+
+# Limita cuántas operaciones síncronas de PyMongo corren a la vez en el threadpool,
+# para no bloquear el event loop de uvicorn ni desbordar el pool de conexiones.
+_db_limiter: Optional[CapacityLimiter] = None
+
+T = TypeVar("T")
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collect connection pool statistics for the shared MongoClient.
+
+    Counters are aggregated across all servers of the topology.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._checkout_wait_ms = 0.0
+
+    def _inc(self, key: str, value: int = 1):
+        with self._lock:
+            self._counters[key] += value
+
+    def pool_created(self, event):
+        self._inc("pools_created")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc("pools_cleared")
+
+    def pool_closed(self, event):
+        self._inc("pools_closed")
+
+    def connection_created(self, event):
+        self._inc("connections_created")
+        self._inc("connections_open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc("connections_closed")
+        self._inc("connections_open", -1)
+
+    def connection_check_out_started(self, event):
+        self._inc("checkouts_started")
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkouts_failed")
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._counters["checkouts"] += 1
+            self._counters["checked_out"] += 1
+            # `duration` (segundos) existe a partir de PyMongo 4.7
+            self._checkout_wait_ms += (getattr(event, "duration", 0.0) or 0.0) * 1000
+
+    def connection_checked_in(self, event):
+        self._inc("checked_out", -1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            checkouts = stats.get("checkouts", 0)
+            stats["avg_checkout_wait_ms"] = round(self._checkout_wait_ms / checkouts, 3) if checkouts else 0.0
+        return stats
+
+
+pool_stats = PoolStatsListener()
+
+
+def get_client_options() -> dict:
+    """
+    Build the MongoClient pool and timeout options from environment variables.
+
+    :return: keyword arguments for MongoClient
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "30000")),
+    }
+
+
 def get_database(client: MongoClient)-> Database:
     """
     Get the MongoDB database instance.
-    
+
+    The name can be overridden with MONGODB_DATABASE (e.g. a benchmark dataset).
+
     :param client: MongoClient instance
     :return: Database instance
     """
-    return client.get_database("reputation_system")
+    return client.get_database(os.getenv("MONGODB_DATABASE", DATABASE_NAME))
 
-def get_mongo_client(uri: str) -> MongoClient:
+def get_mongo_client(uri: str, **options) -> MongoClient:
     """
     Create a MongoDB client using the provided URI.
-    
+
+    Prefer `init_mongo_client` / `get_db` inside the API: this creates a new
+    connection pool every time it is called.
+
     :param uri: MongoDB connection URI
+    :param options: extra MongoClient keyword arguments
     :return: MongoClient instance
     """
-    return MongoClient(uri)
+    return MongoClient(uri, **options)
+
+def init_mongo_client(uri: Optional[str] = None) -> MongoClient:
+    """
+    Create the process-wide pooled MongoClient if it does not exist yet.
+
+    :param uri: MongoDB connection URI (defaults to MONGODB_URI)
+    :return: shared MongoClient instance
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            uri = uri or os.getenv("MONGODB_URI")
+            if not uri:
+                raise ValueError("MONGODB_URI environment variable is required")
+            # Import relativo y diferido: los scripts importan este módulo como database.mongodb
+            from .indexes import get_collscan_reporter
+
+            listeners = [pool_stats]
+            collscan_reporter = get_collscan_reporter()
+            if collscan_reporter is not None:
+                listeners.append(collscan_reporter)
+            _client = get_mongo_client(uri, event_listeners=listeners, **get_client_options())
+        return _client
+
+def close_mongo_client():
+    """Close the shared MongoClient and its connection pool."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+def get_client() -> MongoClient:
+    """
+    Get the shared MongoClient, creating it lazily (e.g. in scripts without lifespan).
+
+    :return: shared MongoClient instance
+    """
+    if _client is None:
+        return init_mongo_client()
+    return _client
+
+def get_db() -> Database:
+    """FastAPI dependency: database handle backed by the shared connection pool."""
+    return get_database(get_client())
+
+def get_pool_stats() -> dict:
+    """
+    Get connection pool statistics of the shared client.
+
+    :return: dict with pool counters and configured options
+    """
+    return {
+        "connected": _client is not None,
+        "options": get_client_options(),
+        "pool": pool_stats.snapshot(),
+    }
+
+def get_db_limiter() -> CapacityLimiter:
+    """
+    Get the capacity limiter that bounds concurrent database work (MONGODB_MAX_WORKERS).
+
+    :return: CapacityLimiter shared by all `run_db` calls
+    """
+    global _db_limiter
+    if _db_limiter is None:
+        default = os.getenv("MONGODB_MAX_POOL_SIZE", "100")
+        _db_limiter = CapacityLimiter(int(os.getenv("MONGODB_MAX_WORKERS", default)))
+    return _db_limiter
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking PyMongo call in the bounded database executor.
+
+    Cursors are lazy, so wrap them with `list` to fetch inside the worker thread:
+    `await run_db(list, col.find({...}))`.
+
+    :param func: blocking callable (collection method or sync helper)
+    :return: the callable's result
+    """
+    return await to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=get_db_limiter())
 
 def get_users_collection(db: Database):
     return db.get_collection("users")
@@ -32,4 +225,4 @@ def get_reservations_collection(db: Database):
     return db.get_collection("reservations")
 
 def get_review_embeddings_collection(db: Database):
-    return db.get_collection("reviewEmbeddings")
\ No newline at end of file
+    return db.get_collection("reviewEmbeddings")
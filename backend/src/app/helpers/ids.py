@@ -0,0 +1,74 @@
+"""
+Document ID codec.
+
+The canonical form of every `_id` and every reference to one (`eventId`,
+`userId`, `businessId`, `reservationId`) is a plain string: the 24-hex form
+for IDs that were ObjectIds and the UUID string otherwise. New documents get
+`new_id()`, the string form of a fresh ObjectId, so IDs still sort by
+creation time.
+
+Databases created before the codec still hold ObjectId `_id`s until
+`database/migrate_ids.py` has run. While ID_LEGACY_OBJECTID_LOOKUP is
+enabled (the default) lookups also match the ObjectId form, in the same
+indexed `$in`; disable it once the migration reports nothing left.
+"""
+
+import os
+import uuid
+from typing import Iterable, List, Optional
+
+from bson import ObjectId
+
+REFERENCE_FIELDS = ("eventId", "userId", "businessId", "reservationId")
+
+
+def legacy_lookup_enabled() -> bool:
+    return os.getenv("ID_LEGACY_OBJECTID_LOOKUP", "true").lower() in ("1", "true", "yes")
+
+
+def new_id() -> str:
+    """ID for a new document."""
+    return str(ObjectId())
+
+
+def encode_id(value) -> Optional[str]:
+    """
+    Canonical form of an ID.
+
+    Args:
+        value: ObjectId, UUID or string.
+
+    Returns:
+        str: the ID as string (None stays None).
+    """
+    return None if value is None else str(value)
+
+
+def stored_forms(value) -> List:
+    """Every form the ID may be stored in (the ObjectId one only while legacy lookups are on)."""
+    canonical = encode_id(value)
+    if legacy_lookup_enabled() and ObjectId.is_valid(canonical):
+        return [canonical, ObjectId(canonical)]
+    return [canonical]
+
+
+def id_filter(value):
+    """Query value matching one ID: `{"_id": id_filter(event_id)}`."""
+    forms = stored_forms(value)
+    return forms[0] if len(forms) == 1 else {"$in": forms}
+
+
+def ids_filter(values: Iterable) -> dict:
+    """Query value matching any of several IDs, as a single `$in`."""
+    return {"$in": [form for value in values for form in stored_forms(value)]}
+
+
+def decode_doc(doc: Optional[dict], fields: tuple = REFERENCE_FIELDS) -> Optional[dict]:
+    """Convert `_id` and the reference fields of a document to their canonical form."""
+    if doc:
+        if "_id" in doc:
+            doc["_id"] = encode_id(doc["_id"])
+        for field in fields:
+            if isinstance(doc.get(field), (ObjectId, uuid.UUID)):
+                doc[field] = encode_id(doc[field])
+    return doc
@@ -0,0 +1,69 @@
+"""
+Keyset pagination for the list endpoints.
+
+List endpoints take `limit` and `cursor` query parameters and keep returning
+a plain JSON list; when there are more results the response carries an
+opaque continuation token in the `X-Next-Cursor` header, to be sent back as
+`cursor`. Pages are sorted by `_id`, so a page never repeats or skips
+documents inserted while paginating.
+
+The token is the base64url-encoded JSON of the position the repository
+returned (the last `_id` of the page); clients must treat it as opaque.
+"""
+
+import base64
+import binascii
+import json
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Query, status
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(position: dict) -> str:
+    """Opaque token for a page position."""
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Page position of a token.
+
+    Raises:
+        ValueError: if the token was not produced by `encode_cursor`.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(position, dict) or not isinstance(position.get("id"), str):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+class PageParams:
+    """FastAPI dependency with the `limit` and `cursor` query parameters."""
+
+    def __init__(
+        self,
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Elementos por página"),
+        cursor: Optional[str] = Query(None, description=f"Token de la cabecera {NEXT_CURSOR_HEADER} de la página anterior"),
+    ):
+        self.limit = limit
+        try:
+            self.after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def next_cursor_headers(position: Optional[dict]) -> dict:
+    """Response headers with the continuation token of the next page, if there is one."""
+    if position is None:
+        return {}
+    return {NEXT_CURSOR_HEADER: encode_cursor(position)}
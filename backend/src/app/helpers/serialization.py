@@ -0,0 +1,108 @@
+"""
+Fast JSON path for read endpoints.
+
+Documents coming from the repositories are trusted: they were validated on
+write and the queries already project the response fields. Read handlers can
+therefore skip FastAPI's `response_model` validation and return
+`fast_response(docs, Model)`, which:
+
+  - shapes each document like `Model` would (aliases, defaults of missing
+    fields, extra fields dropped, nested models included) with a plan
+    precompiled once per model, without validating values;
+  - encodes with orjson, which handles datetime, UUID and numpy natively
+    (ObjectId and other BSON types are converted to string).
+
+The decorator's `response_model` is kept for the OpenAPI schema: FastAPI
+does not revalidate a returned Response.
+"""
+
+import typing
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def orjson_default(value):
+    """Types orjson does not know (ObjectId, Decimal128...): their string form."""
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson (also the app's default response class)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _nested_model(annotation) -> Tuple[Optional[Type[BaseModel]], bool]:
+    """Model inside an annotation (Model, Optional[Model], List[Model]) and whether it is a list."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    origin = typing.get_origin(annotation)
+    for arg in typing.get_args(annotation):
+        model, _ = _nested_model(arg)
+        if model is not None:
+            return model, origin in (list, List)
+    return None, False
+
+
+class ResponseShape:
+    """Precompiled plan to give a trusted document the shape of a response model."""
+
+    def __init__(self, model: Type[BaseModel]):
+        # (clave, default, default_factory, forma anidada, es lista)
+        self.fields = []
+        for name, field in model.model_fields.items():
+            nested, is_list = _nested_model(field.annotation)
+            default = None if field.default is PydanticUndefined else field.default
+            self.fields.append((field.alias or name, default, field.default_factory, nested and get_shape(nested), is_list))
+
+    def one(self, doc: dict) -> dict:
+        shaped = {}
+        for key, default, factory, nested, is_list in self.fields:
+            if key in doc:
+                value = doc[key]
+            elif factory is not None:
+                value = factory()
+            else:
+                value = default
+            if nested is not None and value is not None:
+                value = [nested.one(item) for item in value] if is_list else nested.one(value)
+            shaped[key] = value
+        return shaped
+
+    def many(self, docs: List[dict]) -> List[dict]:
+        one = self.one
+        return [one(doc) for doc in docs]
+
+
+_shapes: Dict[type, ResponseShape] = {}
+
+
+def get_shape(model: Type[BaseModel]) -> ResponseShape:
+    shape = _shapes.get(model)
+    if shape is None:
+        shape = _shapes[model] = ResponseShape(model)
+    return shape
+
+
+def fast_response(content, model: Type[BaseModel], status_code: int = 200, headers: Optional[dict] = None) -> FastJSONResponse:
+    """
+    Response for trusted documents, shaped like `model` and encoded with orjson.
+
+    Args:
+        content (dict | list): One document or a list of documents.
+        model: Response model (of each document, for lists).
+    """
+    shape = get_shape(model)
+    body = shape.many(content) if isinstance(content, list) else shape.one(content)
+    return FastJSONResponse(body, status_code=status_code, headers=headers)
@@ -1,6 +1,24 @@
 # src/app/main.py
 
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# El .env se carga antes de importar los módulos que leen variables de entorno
+load_dotenv()
+
 from fastapi import FastAPI
+from src.app.database.mongodb import init_mongo_client, close_mongo_client, get_pool_stats, get_database, run_db
+from src.app.helpers.pagination import NEXT_CURSOR_HEADER
+from src.app.helpers.serialization import FastJSONResponse
+from src.app.database.indexes import ensure_indexes_on_startup, log_collscan_report
+from src.app.repositories.provider import init_repositories, repository_backend
+from src.app.services.vector_search import get_vector_search, sync_periodically
+from src.app.services.reviews_analysis import warm_category_vectors
+from src.app.services.review_embedding_worker import get_review_embedding_worker
+from src.app.services.reputation import reputation_settle_seconds, settle_periodically
+from src.app.services.site_selection import get_site_grid, refresh_periodically
+from src.app.services.open_gatewayt_auth import init_ogw_client, close_ogw_client
 from src.app.routers.business import router as business_router
 from src.app.routers.event import router as event_router, all_events_router
 from src.app.routers.reservation import router as reservation_router
@@ -9,7 +27,52 @@ from src.app.routers.recommendation import router as recommendation_router
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI(title="Reputation Platform API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    use_mongo = repository_backend() != "memory"
+    if use_mongo:
+        # Un único MongoClient (con su pool de conexiones) para todo el proceso
+        client = init_mongo_client()
+        repos = init_repositories(get_database(client))
+        # Índices declarados junto a sus consultas (idempotente)
+        await run_db(ensure_indexes_on_startup, repos.db)
+        # Con VECTOR_SEARCH_BACKEND=numpy carga los embeddings en memoria antes de servir
+        await run_db(get_vector_search().load, repos.db)
+        # Los cambios de otros procesos se aplican en segundo plano, nunca en una búsqueda
+        vector_sync = asyncio.create_task(sync_periodically(repos.db))
+    else:
+        # REPOSITORY_BACKEND=memory: sin base de datos (tests, benchmarks)
+        repos = init_repositories()
+    # Vectores de las categorías del análisis de reviews: una vez por proceso
+    await run_db(warm_category_vectors, repos.db)
+    # Rejilla de site-selection en memoria; después se sincroniza por updatedAt en segundo plano
+    await run_db(get_site_grid().refresh, repos)
+    grid_sync = asyncio.create_task(refresh_periodically(repos))
+    # Worker que genera los embeddings de las reseñas fuera de la petición
+    worker = get_review_embedding_worker()
+    await worker.start(repos)
+    # No-shows de los eventos terminados para la reputación (REPUTATION_SETTLE_SECONDS=0 lo desactiva)
+    settle_seconds = reputation_settle_seconds()
+    settler = asyncio.create_task(settle_periodically(repos, settle_seconds)) if settle_seconds > 0 else None
+    # Cliente HTTP compartido (pool keep-alive) para Open Gateway
+    init_ogw_client()
+    yield
+    await close_ogw_client()
+    await worker.stop()
+    if settler is not None:
+        settler.cancel()
+        await asyncio.gather(settler, return_exceptions=True)
+    grid_sync.cancel()
+    await asyncio.gather(grid_sync, return_exceptions=True)
+    if use_mongo:
+        vector_sync.cancel()
+        await asyncio.gather(vector_sync, return_exceptions=True)
+        # Con MONGODB_REPORT_COLLSCANS=true lista las consultas sin índice vistas
+        await run_db(log_collscan_report, client)
+        close_mongo_client()
+
+# orjson para todas las respuestas; las lecturas además usan fast_response
+app = FastAPI(title="Reputation Platform API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.include_router(business_router)
 app.include_router(event_router)
@@ -24,4 +87,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)
\ No newline at end of file
+    expose_headers=[NEXT_CURSOR_HEADER],
+)
+
+
+@app.get("/health/db", tags=["health"], summary="Estado del pool de conexiones a MongoDB")
+async def get_db_health():
+    return get_pool_stats()
@@ -38,7 +38,6 @@ class CreateEventModel(BaseModel):
     longitude: Optional[float] = None
     
 class EventWithReservationModel(EventModel):
-    event: EventModel
     reservation_id: str
     
 class EventEmbeddingsResult(BaseModel):
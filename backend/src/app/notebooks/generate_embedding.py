@@ -1,126 +1,202 @@
 """
 Script to generate embeddings for all events in the database.
-This script will process each event, generate embeddings for their descriptions,
-and store them in the eventEmbeddings collection.
+This script streams the events, skips the ones that already have an embedding,
+generates embeddings for their descriptions in batches and stores them in the
+eventEmbeddings collection.
+
+The run is resumable: progress is checkpointed to a JSON file after every
+batch, so a crashed run continues where it stopped.
+
+Usage:
+    python generate_embedding.py [--batch-size 64] [--concurrency 4]
+                                 [--checkpoint embedding_backfill.json] [--reset]
 """
 
+import argparse
+import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional
 from dotenv import load_dotenv
-from langchain_openai import AzureOpenAIEmbeddings
 from bson import ObjectId
 
 # Add the parent directory to Python path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database.mongodb import get_mongo_client, get_database, get_events_collection
+from database.mongodb import get_mongo_client, get_database, get_events_collection, get_client_options
 from models.EventEmbeddingModel import EventEmbeddingModel
+from services.embeddings import get_embedding_service
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Azure OpenAI embeddings
-embeddings = AzureOpenAIEmbeddings(model="text-embedding-3-large")
+DEFAULT_CHECKPOINT = "embedding_backfill.json"
+MAX_ATTEMPTS = 3
 
-def generate_embedding(text: str) -> List[float]:
-    """Generate embedding for given text using Azure OpenAI."""
-    return embeddings.embed_query(text)
+def generate_embedding(text: str, db=None) -> List[float]:
+    """Generate embedding for given text using Azure OpenAI (through the shared cache)."""
+    return get_embedding_service(db).embed_query(text)
 
-def get_all_events(db):
-    """Get all events from the events collection."""
-    events_collection = get_events_collection(db)
-    return list(events_collection.find({}))
+def generate_embeddings(texts: List[str], db=None) -> List[List[float]]:
+    """Generate embeddings for a batch of texts in one call (through the shared cache)."""
+    return get_embedding_service(db).embed_documents(texts)
 
-def check_existing_embedding(db, event_id: str) -> bool:
-    """Check if embedding already exists for this event."""
+def get_embedded_event_ids(db) -> set:
+    """Get the IDs of all events that already have an embedding (one streamed query)."""
     embeddings_collection = db.get_collection("eventEmbeddings")
-    existing = embeddings_collection.find_one({"eventId": event_id})
-    return existing is not None
+    cursor = embeddings_collection.aggregate([{"$group": {"_id": "$eventId"}}], allowDiskUse=True)
+    return {doc["_id"] for doc in cursor}
+
+def load_checkpoint(path: str) -> dict:
+    """Load the checkpoint of a previous run (empty if there is none)."""
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Atomically write the checkpoint file."""
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def resume_filter(checkpoint: dict) -> dict:
+    """
+    Query for the events after the checkpoint.
+
+    Events are scanned by ascending `_id`; Mongo sorts string IDs before
+    ObjectIds, so after a string watermark every ObjectId is still pending.
+    """
+    last_id = checkpoint.get("last_id")
+    if last_id is None:
+        return {}
+    if checkpoint.get("last_id_type") == "objectId":
+        return {"_id": {"$gt": ObjectId(last_id)}}
+    return {"$or": [{"_id": {"$gt": last_id}}, {"_id": {"$type": "objectId"}}]}
+
+def iter_event_batches(db, embedded_ids: set, checkpoint: dict, batch_size: int, stats: dict) -> Iterator[List[dict]]:
+    """Stream the pending events with a cursor and group them in batches."""
+    events_collection = get_events_collection(db)
+    cursor = (
+        events_collection.find(resume_filter(checkpoint), {"businessId": 1, "description": 1})
+        .sort("_id", 1)
+        .batch_size(max(batch_size, 100))
+    )
+    batch = []
+    for event in cursor:
+        stats["scanned"] += 1
+        event_id = str(event.get("_id"))
+        description = event.get("description") or ""
+
+        # Skip if description is empty or the embedding already exists
+        if not description.strip() or event_id in embedded_ids:
+            stats["skipped"] += 1
+            batch.append({"_id": event["_id"], "skip": True})
+        else:
+            batch.append({"_id": event["_id"], "eventId": event_id, "businessId": event.get("businessId", ""), "description": description})
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def embed_and_store_batch(db, batch: List[dict]) -> int:
+    """Generate the embeddings of a batch and write them with one insert_many (retried with backoff)."""
+    pending = [event for event in batch if not event.get("skip")]
+    if not pending:
+        return 0
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            vectors = generate_embeddings([event["description"] for event in pending], db)
+            now = datetime.utcnow()
+            docs = []
+            for event, embedding_vector in zip(pending, vectors):
+                event_embedding = EventEmbeddingModel(
+                    eventId=event["eventId"],
+                    businessId=event["businessId"],
+                    description=event["description"],
+                    embedding=embedding_vector,
+                    createdAt=now,
+                    updatedAt=now
+                )
+                docs.append(event_embedding.dict(by_alias=True))
+            db.get_collection("eventEmbeddings").insert_many(docs, ordered=False)
+            return len(docs)
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            print(f"⚠️  Batch failed (attempt {attempt}/{MAX_ATTEMPTS}): {e}")
+            time.sleep(2 ** attempt)
+
+def process_events(batch_size: int = 64, concurrency: int = 4, checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT, reset: bool = False):
+    """Main function to backfill the embeddings of all events."""
 
-def insert_event_embedding(db, event_embedding: EventEmbeddingModel):
-    """Insert event embedding into the eventEmbeddings collection."""
-    embeddings_collection = db.get_collection("eventEmbeddings")
-    
-    # Convert to dict and handle ObjectId
-    embedding_dict = event_embedding.dict(by_alias=True)
-    if '_id' in embedding_dict and isinstance(embedding_dict['_id'], str):
-        embedding_dict['_id'] = ObjectId(embedding_dict['_id'])
-    
-    result = embeddings_collection.insert_one(embedding_dict)
-    return result.inserted_id
-
-def process_events():
-    """Main function to process all events and generate embeddings."""
-    
     # Get MongoDB connection
     mongodb_uri = os.getenv("MONGODB_URI")
     if not mongodb_uri:
         raise ValueError("MONGODB_URI environment variable is required")
-    
-    client = get_mongo_client(mongodb_uri)
+
+    client = get_mongo_client(mongodb_uri, **get_client_options())
     db = get_database(client)
-    
+
+    checkpoint = {} if reset else load_checkpoint(checkpoint_path)
+    if checkpoint.get("last_id") is not None:
+        print(f"↩️  Resuming after event {checkpoint['last_id']}")
+    stats = {"scanned": 0, "processed": 0, "skipped": 0, "errors": 0}
+
     try:
-        # Get all events
-        events = get_all_events(db)
-        print(f"Found {len(events)} events to process")
-        
-        processed = 0
-        skipped = 0
-        errors = 0
-        
-        for event in events:
+        # Set difference: events already embedded are skipped without querying one by one
+        embedded_ids = get_embedded_event_ids(db)
+        print(f"Found {len(embedded_ids)} events with an embedding already")
+
+        # Batches are embedded concurrently but the checkpoint only advances over
+        # the longest prefix of finished batches, so a resume never skips work.
+        in_flight = []
+        blocked = False
+
+        def advance(block: bool) -> bool:
+            done_batch, future = in_flight.pop(0)
             try:
-                event_id = str(event.get("_id"))
-                business_id = event.get("businessId", "")
-                description = event.get("description", "")
-                
-                # Skip if description is empty
-                if not description.strip():
-                    print(f"Skipping event {event_id}: No description")
-                    skipped += 1
-                    continue
-                
-                # Check if embedding already exists
-                if check_existing_embedding(db, event_id):
-                    print(f"Skipping event {event_id}: Embedding already exists")
-                    skipped += 1
-                    continue
-                
-                print(f"Processing event {event_id}: {description[:50]}...")
-                
-                # Generate embedding for the description
-                embedding_vector = generate_embedding(description)
-                
-                # Create EventEmbeddingModel instance
-                event_embedding = EventEmbeddingModel(
-                    eventId=event_id,
-                    businessId=business_id,
-                    description=description,
-                    embedding=embedding_vector,
-                    createdAt=datetime.utcnow(),
-                    updatedAt=datetime.utcnow()
-                )
-                
-                # Insert into database
-                inserted_id = insert_event_embedding(db, event_embedding)
-                print(f"✅ Successfully created embedding {inserted_id} for event {event_id}")
-                processed += 1
-                
+                stats["processed"] += future.result()
             except Exception as e:
-                print(f"❌ Error processing event {event.get('_id', 'unknown')}: {str(e)}")
-                errors += 1
-                continue
-        
+                print(f"❌ Error processing batch ending at {done_batch[-1]['_id']}: {str(e)}")
+                stats["errors"] += sum(1 for event in done_batch if not event.get("skip"))
+                return True
+            if not block:
+                last_id = done_batch[-1]["_id"]
+                checkpoint.update({
+                    "last_id": str(last_id),
+                    "last_id_type": "objectId" if isinstance(last_id, ObjectId) else "string",
+                    "updatedAt": datetime.utcnow().isoformat(),
+                })
+                save_checkpoint(checkpoint_path, checkpoint)
+            return block
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for batch in iter_event_batches(db, embedded_ids, checkpoint, batch_size, stats):
+                in_flight.append((batch, executor.submit(embed_and_store_batch, db, batch)))
+                # Bounded concurrency: wait for the oldest batch before reading more
+                while len(in_flight) >= concurrency * 2:
+                    blocked = advance(blocked)
+                print(f"📦 Scanned {stats['scanned']} events, {stats['processed']} embedded so far")
+            while in_flight:
+                blocked = advance(blocked)
+
         # Print summary
         print(f"\n📊 Processing Summary:")
-        print(f"✅ Processed: {processed}")
-        print(f"⏭️  Skipped: {skipped}")
-        print(f"❌ Errors: {errors}")
-        print(f"📝 Total events: {len(events)}")
-        
+        print(f"✅ Processed: {stats['processed']}")
+        print(f"⏭️  Skipped: {stats['skipped']}")
+        print(f"❌ Errors: {stats['errors']}")
+        print(f"📝 Total events scanned: {stats['scanned']}")
+
     except Exception as e:
         print(f"❌ Fatal error: {str(e)}")
         raise
@@ -128,6 +204,13 @@ def process_events():
         client.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill event description embeddings.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per embedding call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding calls in flight")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file ('' to disable)")
+    parser.add_argument("--reset", action="store_true", help="Ignore the previous checkpoint")
+    args = parser.parse_args()
+
     print("🚀 Starting event embedding generation...")
-    process_events()
+    process_events(batch_size=args.batch_size, concurrency=args.concurrency, checkpoint_path=args.checkpoint, reset=args.reset)
     print("✨ Event embedding generation completed!")
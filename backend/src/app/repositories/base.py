@@ -0,0 +1,319 @@
+"""
+Repository interfaces.
+
+Repositories own every query, projection and ID conversion of their
+collection, so routers and services only deal with plain dicts whose `_id`
+is always a string. Methods are blocking: call them through `run_db` from
+async code, like the PyMongo calls they replace.
+
+`page_*` methods implement keyset pagination (see helpers/pagination.py):
+they take the page size and the position returned with the previous page
+(None for the first one) and return the page sorted by `_id` plus the
+position of the next page (None on the last one).
+
+Two implementations exist: `repositories.mongo` (PyMongo) and
+`repositories.memory` (process-local dicts, for tests and benchmarks).
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Documentos de la página y posición de la siguiente (None si es la última)
+Page = Tuple[List[dict], Optional[dict]]
+
+
+class EventsRepository:
+    """Queries on the `events` collection."""
+
+    def get(self, event_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_for_business(self, business_id: str, event_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_many(self, event_ids: Iterable[str]) -> Dict[str, dict]:
+        """Events keyed by `_id`, in the order the IDs were first requested; missing ones are left out."""
+        raise NotImplementedError
+
+    def list_recent(self, limit: int) -> List[dict]:
+        raise NotImplementedError
+
+    def page_all(self, limit: int, after: Optional[dict] = None) -> Page:
+        raise NotImplementedError
+
+    def page_by_business(self, business_id: str, limit: int, after: Optional[dict] = None) -> Page:
+        raise NotImplementedError
+
+    def iter_by_business(self, business_id: str, batch_size: int) -> Iterator[List[dict]]:
+        """All the events of a business in `_id` order, in batches read from one cursor."""
+        raise NotImplementedError
+
+    def iter_ids_by_business(self, business_id: str, batch_size: int) -> Iterator[List[str]]:
+        """IDs of all the events of a business, in batches."""
+        raise NotImplementedError
+
+    def create(self, doc: dict) -> str:
+        """Insert an event and return its `_id`."""
+        raise NotImplementedError
+
+    def update(self, business_id: str, event_id: str, data: dict) -> int:
+        """Update an event of a business; returns the number of modified documents."""
+        raise NotImplementedError
+
+    def iter_ended_unsettled(self, ended_before: datetime, batch_size: int) -> Iterator[List[dict]]:
+        """Events (`_id`, businessId, end) that ended before a date and whose no-shows are not settled yet."""
+        raise NotImplementedError
+
+    def claim_settlement(self, event_id: str, now: datetime, lease_until: datetime) -> bool:
+        """Lease an unsettled event until `lease_until`; False if it is settled or another run holds the lease."""
+        raise NotImplementedError
+
+    def mark_settled(self, event_id: str, settled_at: datetime) -> bool:
+        """Mark the no-shows of an event as settled and drop its lease; False if it already was."""
+        raise NotImplementedError
+
+
+class ReservationsRepository:
+    """Queries on the `reservations` collection."""
+
+    def get(self, reservation_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def list_by_user(self, user_id: str) -> List[dict]:
+        raise NotImplementedError
+
+    def page_by_user(self, user_id: str, limit: int, after: Optional[dict] = None) -> Page:
+        raise NotImplementedError
+
+    def page_by_event(self, event_id: str, limit: int, after: Optional[dict] = None) -> Page:
+        raise NotImplementedError
+
+    def list_events_by_user(self, user_id: str) -> List[dict]:
+        """
+        Events of the reservations of a user, one per reservation in `_id` order:
+        the event fields plus `reservation_id`. Reservations whose event no
+        longer exists are left out.
+        """
+        raise NotImplementedError
+
+    def iter_by_events(self, event_ids: List[str], batch_size: int) -> Iterator[List[dict]]:
+        """All the reservations of some events, in batches read from one cursor."""
+        raise NotImplementedError
+
+    def count_no_shows(self, event_id: str) -> int:
+        """Reservations of an event that were neither checked in nor cancelled."""
+        raise NotImplementedError
+
+    def create(self, doc: dict) -> str:
+        raise NotImplementedError
+
+    # Los set_* devuelven la reserva tal y como estaba justo antes de su escritura
+    # (None si no existe): los contadores se calculan sobre ella, no sobre una lectura previa
+
+    def set_checkin(self, reservation_id: str, checkin: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set_checkin_status(self, reservation_id: str, status: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set_review(self, reservation_id: str, review: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+
+class UsersRepository:
+    """Queries on the `users` collection."""
+
+    def get(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_by_phone(self, phone: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def create(self, doc: dict) -> str:
+        raise NotImplementedError
+
+    def increment(self, user_id: str, field: str, amount: int = 1):
+        """Atomically add `amount` to a numeric field."""
+        raise NotImplementedError
+
+
+class BusinessesRepository:
+    """Queries on the `businesses` collection."""
+
+    def get(self, business_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_by_api_key(self, api_key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def create(self, doc: dict) -> dict:
+        """Insert a business and return the stored document."""
+        raise NotImplementedError
+
+    def iter_ids(self, batch_size: int) -> Iterator[List[str]]:
+        """IDs of all the businesses, in batches."""
+        raise NotImplementedError
+
+
+class BusinessReputationRepository:
+    """
+    Reputation counters of each business (`businessReputation`, `_id` = business ID).
+
+    The counters are only changed with atomic increments, so concurrent
+    check-ins and reviews never overwrite each other.
+    """
+
+    def get(self, business_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def increment(self, business_id: str, amounts: Dict[str, float], updated_at: datetime):
+        """Add to counters (dotted paths), creating the document if needed."""
+        raise NotImplementedError
+
+    def replace(self, business_id: str, doc: dict):
+        """Overwrite the counters of a business (rebuild)."""
+        raise NotImplementedError
+
+
+class EventEmbeddingsRepository:
+    """Queries on `eventEmbeddings` (one description embedding per event)."""
+
+    def find_vectors(self, event_ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        """float32 embedding per event ID."""
+        raise NotImplementedError
+
+    def insert_many(self, docs: List[dict]):
+        raise NotImplementedError
+
+    def search(self, query_vector: List[float], limit: int = 10, filter: Optional[dict] = None) -> List[dict]:
+        """Nearest events: dicts with eventId, description and score (0..1)."""
+        raise NotImplementedError
+
+
+class ReviewEmbeddingsRepository:
+    """Queries on `reviewEmbeddings` (one embedding per reviewed reservation)."""
+
+    def top_rated_by_user(self, user_id: str, limit: int) -> List[dict]:
+        """Best rated reviews of a user (eventId, rating, createdAt), by decreasing rating."""
+        raise NotImplementedError
+
+    def upsert_many(self, docs: List[dict]) -> List[dict]:
+        """Upsert by `reservationId`; returns the docs with their `_id` set."""
+        raise NotImplementedError
+
+    def search(self, query_vector: List[float], limit: int = 10, filter: Optional[dict] = None) -> List[dict]:
+        """Nearest reviews: dicts with text, rating and score (0..1)."""
+        raise NotImplementedError
+
+
+class ReviewEmbeddingJobsRepository:
+    """Outbox of pending review embeddings (`reviewEmbeddingJobs`) and its dead letters."""
+
+    def enqueue(self, reservation_id: str, job: dict):
+        """Create or replace the pending job of a reservation."""
+        raise NotImplementedError
+
+    def claim(self, claim_id: str, limit: int, lease_until: datetime, now: datetime) -> List[dict]:
+        """Lease up to `limit` due jobs (pending, or processing with an expired lease)."""
+        raise NotImplementedError
+
+    def reschedule(self, job_id: str, claim_id: str, changes: dict):
+        """Put a claimed job back to pending with the given field changes."""
+        raise NotImplementedError
+
+    def dead_letter(self, job: dict, error: str):
+        """Move a claimed job to the dead letters."""
+        raise NotImplementedError
+
+    def ack(self, job_ids: List[str], claim_id: str):
+        """Delete finished jobs (only if still held by this claim)."""
+        raise NotImplementedError
+
+    def list_dead_letters(self) -> List[dict]:
+        raise NotImplementedError
+
+    def delete_dead_letter(self, job_id: str):
+        raise NotImplementedError
+
+
+class AnalyticsRollupsRepository:
+    """
+    Time-bucketed counters per event (`analyticsRollups`).
+
+    One document per (business, event, granularity, bucket start), changed
+    only with atomic increments.
+    """
+
+    def increment(self, rows: List[Tuple[dict, Dict[str, float]]]):
+        """Add to the counters of some buckets: (key fields, amounts) pairs, creating missing buckets."""
+        raise NotImplementedError
+
+    def find(self, business_id: str, granularity: str, start: datetime, end: datetime, event_id: Optional[str] = None) -> List[dict]:
+        """Buckets of a business with start in [start, end), by bucket start."""
+        raise NotImplementedError
+
+    def replace_business(self, business_id: str, docs: List[dict]):
+        """Replace every bucket of a business (rebuild)."""
+        raise NotImplementedError
+
+
+class SiteGridRepository:
+    """
+    Demand and supply counters per geohash cell (`siteGrid`, `_id` = cell).
+
+    Counters are only changed with atomic increments; `updatedAt` lets the
+    in-process grids pick up the cells changed by any process.
+    """
+
+    def increment(self, cell: str, amounts: Dict[str, float], updated_at: datetime):
+        """Add to counters of a cell (dotted paths), creating it if needed."""
+        raise NotImplementedError
+
+    def iter_changed(self, since: Optional[datetime], batch_size: int) -> Iterator[List[dict]]:
+        """Cells updated at or after `since` (all of them if None), in batches."""
+        raise NotImplementedError
+
+    def replace_all(self, docs: List[dict], rebuilt_at: datetime):
+        """Replace the whole grid (rebuild) and store `rebuilt_at` as its rebuild marker."""
+        raise NotImplementedError
+
+    def rebuilt_at(self) -> Optional[datetime]:
+        """Marker of the last `replace_all` (None if the grid was never rebuilt)."""
+        raise NotImplementedError
+
+
+class Repositories:
+    """
+    All repositories of one backend.
+
+    `db` is the underlying MongoDB database (None for the in-memory backend),
+    for the components that still need it directly (embedding cache).
+    """
+
+    def __init__(
+        self,
+        events: EventsRepository,
+        reservations: ReservationsRepository,
+        users: UsersRepository,
+        businesses: BusinessesRepository,
+        event_embeddings: EventEmbeddingsRepository,
+        review_embeddings: ReviewEmbeddingsRepository,
+        review_embedding_jobs: ReviewEmbeddingJobsRepository,
+        reputation: BusinessReputationRepository,
+        analytics: AnalyticsRollupsRepository,
+        site_grid: SiteGridRepository,
+        db=None,
+    ):
+        self.events = events
+        self.reservations = reservations
+        self.users = users
+        self.businesses = businesses
+        self.event_embeddings = event_embeddings
+        self.review_embeddings = review_embeddings
+        self.review_embedding_jobs = review_embedding_jobs
+        self.reputation = reputation
+        self.analytics = analytics
+        self.site_grid = site_grid
+        self.db = db
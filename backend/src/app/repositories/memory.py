@@ -0,0 +1,529 @@
+"""
+In-memory implementation of the repositories.
+
+Documents live in process-local dicts keyed by string `_id`, with secondary
+indexes for the lookups the API does (events by business, reservations by
+user and event, users by phone). Embeddings are kept in NumpyVectorIndex
+instances, so vector searches behave like VECTOR_SEARCH_BACKEND=numpy.
+Meant for tests, benchmarks and offline runs: nothing is persisted.
+"""
+
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.app.helpers.ids import encode_id, new_id
+from src.app.repositories.base import (
+    AnalyticsRollupsRepository,
+    BusinessesRepository,
+    BusinessReputationRepository,
+    EventEmbeddingsRepository,
+    EventsRepository,
+    Page,
+    Repositories,
+    ReservationsRepository,
+    ReviewEmbeddingJobsRepository,
+    ReviewEmbeddingsRepository,
+    SiteGridRepository,
+    UsersRepository,
+)
+from src.app.services.vector_search import VECTOR_COLLECTIONS, NumpyVectorIndex
+
+
+class MemoryCollection:
+    """Dict of documents by string `_id` plus secondary indexes on some fields."""
+
+    def __init__(self, indexed_fields: tuple = ()):
+        self.docs: Dict[str, dict] = {}
+        self.indexes: Dict[str, Dict[object, Dict[str, None]]] = {field: defaultdict(dict) for field in indexed_fields}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _field(doc: dict, field: str):
+        value = doc
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    def get(self, doc_id) -> Optional[dict]:
+        with self.lock:
+            doc = self.docs.get(str(doc_id))
+            return dict(doc) if doc is not None else None
+
+    def find(self, field: str, value) -> List[dict]:
+        with self.lock:
+            return [dict(self.docs[doc_id]) for doc_id in self.indexes[field].get(value, {})]
+
+    def all(self) -> List[dict]:
+        with self.lock:
+            return [dict(doc) for doc in self.docs.values()]
+
+    def page(self, field: Optional[str], value, limit: int, after: Optional[dict]) -> Page:
+        """Keyset page by `_id` of all the documents, or of those with `field == value`."""
+        with self.lock:
+            doc_ids = self.indexes[field].get(value, {}) if field else self.docs
+            doc_ids = sorted(doc_id for doc_id in doc_ids if after is None or doc_id > after["id"])
+            docs = [dict(self.docs[doc_id]) for doc_id in doc_ids[:limit]]
+        position = {"id": docs[-1]["_id"]} if len(doc_ids) > limit else None
+        return docs, position
+
+    def batches(self, field: str, values: list, batch_size: int) -> Iterator[List[dict]]:
+        """Documents with `field` in `values`, by `_id`, in batches (snapshot of the IDs at the start)."""
+        with self.lock:
+            doc_ids = sorted({doc_id for value in values for doc_id in self.indexes[field].get(value, {})})
+        for start in range(0, len(doc_ids), batch_size):
+            batch = [self.get(doc_id) for doc_id in doc_ids[start:start + batch_size]]
+            batch = [doc for doc in batch if doc is not None]
+            if batch:
+                yield batch
+
+    def put(self, doc: dict) -> str:
+        doc = dict(doc)
+        doc["_id"] = encode_id(doc.get("_id")) or new_id()
+        with self.lock:
+            self._unindex(doc["_id"])
+            self.docs[doc["_id"]] = doc
+            for field, index in self.indexes.items():
+                index[self._field(doc, field)][doc["_id"]] = None
+        return doc["_id"]
+
+    def update(self, doc_id, changes: dict) -> bool:
+        """Apply dotted-path `$set` changes; returns False if the document does not exist."""
+        return self.swap(doc_id, changes) is not None
+
+    def swap(self, doc_id, changes: dict) -> Optional[dict]:
+        """Like `update`, but returns the document as it was before (None if it does not exist)."""
+        with self.lock:
+            previous = self.docs.get(str(doc_id))
+            if previous is None:
+                return None
+            # Copia a lo largo de cada ruta: `previous` queda intacto
+            doc = dict(previous)
+            for path, value in changes.items():
+                parts = path.split(".")
+                target = doc
+                for part in parts[:-1]:
+                    target[part] = dict(target.get(part) or {})
+                    target = target[part]
+                target[parts[-1]] = value
+            self.put(doc)
+            return previous
+
+    def delete(self, doc_id) -> Optional[dict]:
+        with self.lock:
+            self._unindex(str(doc_id))
+            return self.docs.pop(str(doc_id), None)
+
+    def _unindex(self, doc_id: str):
+        old = self.docs.get(doc_id)
+        if old is None:
+            return
+        for field, index in self.indexes.items():
+            index.get(self._field(old, field), {}).pop(doc_id, None)
+
+
+class MemoryEventsRepository(EventsRepository):
+    def __init__(self):
+        self.collection = MemoryCollection(("businessId",))
+
+    def get(self, event_id):
+        return self.collection.get(event_id)
+
+    def get_for_business(self, business_id, event_id):
+        event = self.collection.get(event_id)
+        return event if event and event.get("businessId") == business_id else None
+
+    def get_many(self, event_ids):
+        found = {}
+        for event_id in dict.fromkeys(str(event_id) for event_id in event_ids if event_id):
+            event = self.collection.get(event_id)
+            if event:
+                found[event_id] = event
+        return found
+
+    def list_recent(self, limit):
+        events = self.collection.all()
+        events.sort(key=lambda event: event.get("createdAt") or datetime.min, reverse=True)
+        return events[:limit]
+
+    def page_all(self, limit, after=None):
+        return self.collection.page(None, None, limit, after)
+
+    def page_by_business(self, business_id, limit, after=None):
+        return self.collection.page("businessId", business_id, limit, after)
+
+    def iter_by_business(self, business_id, batch_size):
+        return self.collection.batches("businessId", [business_id], batch_size)
+
+    def iter_ids_by_business(self, business_id, batch_size):
+        for batch in self.collection.batches("businessId", [business_id], batch_size):
+            yield [event["_id"] for event in batch]
+
+    def create(self, doc):
+        return self.collection.put(doc)
+
+    def update(self, business_id, event_id, data):
+        if self.get_for_business(business_id, event_id) is None:
+            return 0
+        return int(self.collection.update(event_id, data))
+
+    def iter_ended_unsettled(self, ended_before, batch_size):
+        events = [
+            {"_id": event["_id"], "businessId": event.get("businessId"), "end": event["end"]}
+            for event in self.collection.all()
+            if event.get("reputationSettledAt") is None and event.get("end") and event["end"] < ended_before
+        ]
+        events.sort(key=lambda event: event["end"])
+        for start in range(0, len(events), batch_size):
+            yield events[start:start + batch_size]
+
+    def claim_settlement(self, event_id, now, lease_until):
+        with self.collection.lock:
+            event = self.collection.get(event_id)
+            if event is None or event.get("reputationSettledAt") is not None:
+                return False
+            settling_until = event.get("reputationSettlingUntil")
+            if settling_until is not None and settling_until >= now:
+                return False
+            return self.collection.update(event_id, {"reputationSettlingUntil": lease_until})
+
+    def mark_settled(self, event_id, settled_at):
+        with self.collection.lock:
+            event = self.collection.get(event_id)
+            if event is None or event.get("reputationSettledAt") is not None:
+                return False
+            return self.collection.update(event_id, {"reputationSettledAt": settled_at, "reputationSettlingUntil": None})
+
+
+class MemoryReservationsRepository(ReservationsRepository):
+    def __init__(self, events: MemoryEventsRepository):
+        self.collection = MemoryCollection(("userId", "eventId"))
+        self.events = events
+
+    def get(self, reservation_id):
+        return self.collection.get(reservation_id)
+
+    def list_by_user(self, user_id):
+        return self.collection.find("userId", user_id)
+
+    def page_by_user(self, user_id, limit, after=None):
+        return self.collection.page("userId", user_id, limit, after)
+
+    def page_by_event(self, event_id, limit, after=None):
+        return self.collection.page("eventId", event_id, limit, after)
+
+    def list_events_by_user(self, user_id):
+        reservations = sorted(self.collection.find("userId", user_id), key=lambda res: res["_id"])
+        events = self.events.get_many(res.get("eventId") for res in reservations)
+        return [
+            {**events[res["eventId"]], "reservation_id": res["_id"]}
+            for res in reservations
+            if res.get("eventId") in events
+        ]
+
+    def iter_by_events(self, event_ids, batch_size):
+        return self.collection.batches("eventId", list(event_ids), batch_size)
+
+    def count_no_shows(self, event_id):
+        return sum(
+            1 for res in self.collection.find("eventId", event_id)
+            if res.get("checkin") is None and res.get("cancelledAt") is None
+        )
+
+    def create(self, doc):
+        return self.collection.put(doc)
+
+    def set_checkin(self, reservation_id, checkin):
+        return self.collection.swap(reservation_id, {"checkin": checkin})
+
+    def set_checkin_status(self, reservation_id, status):
+        return self.collection.swap(reservation_id, {"checkin.status": status})
+
+    def set_review(self, reservation_id, review):
+        return self.collection.swap(reservation_id, {"checkin.review": review})
+
+
+class MemoryUsersRepository(UsersRepository):
+    def __init__(self):
+        self.collection = MemoryCollection(("kyc.phone",))
+
+    def get(self, user_id):
+        return self.collection.get(user_id)
+
+    def find_by_phone(self, phone):
+        users = self.collection.find("kyc.phone", phone)
+        return users[0] if users else None
+
+    def create(self, doc):
+        return self.collection.put(doc)
+
+    def increment(self, user_id, field, amount=1):
+        with self.collection.lock:
+            user = self.collection.get(user_id)
+            if user is not None:
+                self.collection.update(user_id, {field: (user.get(field) or 0) + amount})
+
+
+class MemoryBusinessesRepository(BusinessesRepository):
+    def __init__(self):
+        self.collection = MemoryCollection(("apiKey",))
+
+    def get(self, business_id):
+        return self.collection.get(business_id)
+
+    def find_by_api_key(self, api_key):
+        businesses = self.collection.find("apiKey", api_key)
+        return businesses[0] if businesses else None
+
+    def create(self, doc):
+        doc = dict(doc)
+        doc.pop("_id", None)
+        return self.collection.get(self.collection.put(doc))
+
+    def iter_ids(self, batch_size):
+        with self.collection.lock:
+            business_ids = sorted(self.collection.docs)
+        for start in range(0, len(business_ids), batch_size):
+            yield business_ids[start:start + batch_size]
+
+
+def increment_doc(collection: MemoryCollection, doc_id: str, amounts: dict, updated_at: datetime):
+    """Upsert with `$inc` on dotted paths plus `$set` of updatedAt, like the Mongo counters."""
+    with collection.lock:
+        doc = collection.get(doc_id) or {"_id": str(doc_id)}
+        for path, amount in amounts.items():
+            *parents, field = path.split(".")
+            target = doc
+            for part in parents:
+                target[part] = dict(target.get(part) or {})
+                target = target[part]
+            target[field] = (target.get(field) or 0) + amount
+        doc["updatedAt"] = updated_at
+        collection.put(doc)
+
+
+class MemoryBusinessReputationRepository(BusinessReputationRepository):
+    def __init__(self):
+        self.collection = MemoryCollection()
+
+    def get(self, business_id):
+        return self.collection.get(business_id)
+
+    def increment(self, business_id, amounts, updated_at):
+        increment_doc(self.collection, business_id, amounts, updated_at)
+
+    def replace(self, business_id, doc):
+        self.collection.put({**doc, "_id": str(business_id)})
+
+
+class _MemoryEmbeddings:
+    """Embedding documents plus their NumpyVectorIndex."""
+
+    def __init__(self, name: str):
+        config = VECTOR_COLLECTIONS[name]
+        self.docs: Dict[str, dict] = {}
+        self.index = NumpyVectorIndex(config["filter_fields"], config["project_fields"])
+        self.lock = threading.RLock()
+
+    def put(self, doc: dict) -> dict:
+        doc = dict(doc)
+        doc["_id"] = encode_id(doc.get("_id")) or new_id()
+        with self.lock:
+            self.docs[doc["_id"]] = doc
+            if doc.get("embedding"):
+                self.index.upsert(doc)
+        return doc
+
+
+class MemoryEventEmbeddingsRepository(EventEmbeddingsRepository):
+    def __init__(self):
+        self.store = _MemoryEmbeddings("eventEmbeddings")
+        self.by_event: Dict[str, str] = {}
+
+    def find_vectors(self, event_ids):
+        vectors = {}
+        with self.store.lock:
+            for event_id in event_ids:
+                doc = self.store.docs.get(self.by_event.get(event_id))
+                if doc and doc.get("embedding"):
+                    vectors[event_id] = np.asarray(doc["embedding"], dtype=np.float32)
+        return vectors
+
+    def insert_many(self, docs):
+        with self.store.lock:
+            for doc in docs:
+                stored = self.store.put(doc)
+                self.by_event[stored["eventId"]] = stored["_id"]
+
+    def search(self, query_vector, limit=10, filter=None):
+        return self.store.index.search(query_vector, limit=limit, filter=filter)
+
+
+class MemoryReviewEmbeddingsRepository(ReviewEmbeddingsRepository):
+    def __init__(self):
+        self.store = _MemoryEmbeddings("reviewEmbeddings")
+        self.by_reservation: Dict[str, str] = {}
+
+    def top_rated_by_user(self, user_id, limit):
+        with self.store.lock:
+            reviews = [
+                {"eventId": doc["eventId"], "rating": doc["rating"], "createdAt": doc.get("createdAt")}
+                for doc in self.store.docs.values()
+                if doc.get("userId") == user_id and doc.get("rating") is not None
+            ]
+        reviews.sort(key=lambda review: review["rating"], reverse=True)
+        return reviews[:limit]
+
+    def upsert_many(self, docs):
+        written = []
+        with self.store.lock:
+            for doc in docs:
+                existing_id = self.by_reservation.get(doc["reservationId"])
+                previous = self.store.docs.get(existing_id, {})
+                stored = self.store.put({
+                    **doc,
+                    "_id": existing_id,
+                    "createdAt": previous.get("createdAt") or doc.get("createdAt") or datetime.utcnow(),
+                })
+                self.by_reservation[stored["reservationId"]] = stored["_id"]
+                written.append(stored)
+        return written
+
+    def search(self, query_vector, limit=10, filter=None):
+        return self.store.index.search(query_vector, limit=limit, filter=filter)
+
+
+class MemoryReviewEmbeddingJobsRepository(ReviewEmbeddingJobsRepository):
+    def __init__(self):
+        self.jobs: Dict[str, dict] = {}
+        self.dead_letters: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def enqueue(self, reservation_id, job):
+        with self.lock:
+            self.jobs[str(reservation_id)] = {**job, "_id": str(reservation_id)}
+
+    def claim(self, claim_id, limit, lease_until, now):
+        with self.lock:
+            due = [
+                job for job in self.jobs.values()
+                if (job.get("status") == "pending" and job["nextAttemptAt"] <= now)
+                or (job.get("status") == "processing" and job["leaseUntil"] < now)
+            ]
+            due.sort(key=lambda job: job["nextAttemptAt"])
+            claimed = []
+            for job in due[:limit]:
+                job.update({"status": "processing", "claimId": claim_id, "leaseUntil": lease_until})
+                claimed.append(dict(job))
+            return claimed
+
+    def reschedule(self, job_id, claim_id, changes):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and job.get("claimId") == claim_id:
+                job.update({**changes, "status": "pending"})
+
+    def dead_letter(self, job, error):
+        with self.lock:
+            dead = {key: value for key, value in job.items() if key not in ("status", "claimId", "leaseUntil")}
+            dead.update({"error": error, "failedAt": datetime.utcnow()})
+            self.dead_letters[job["_id"]] = dead
+            current = self.jobs.get(job["_id"])
+            if current and current.get("claimId") == job.get("claimId"):
+                del self.jobs[job["_id"]]
+
+    def ack(self, job_ids, claim_id):
+        with self.lock:
+            for job_id in job_ids:
+                job = self.jobs.get(job_id)
+                if job and job.get("claimId") == claim_id:
+                    del self.jobs[job_id]
+
+    def list_dead_letters(self):
+        with self.lock:
+            return [dict(job) for job in self.dead_letters.values()]
+
+    def delete_dead_letter(self, job_id):
+        with self.lock:
+            self.dead_letters.pop(job_id, None)
+
+
+class MemoryAnalyticsRollupsRepository(AnalyticsRollupsRepository):
+    def __init__(self):
+        # (businessId, eventId, granularity, bucketStart) -> documento del bucket
+        self.buckets: Dict[tuple, dict] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(doc: dict) -> tuple:
+        return doc["businessId"], doc["eventId"], doc["granularity"], doc["bucketStart"]
+
+    def increment(self, rows):
+        with self.lock:
+            for key, amounts in rows:
+                bucket = self.buckets.setdefault(self._key(key), dict(key))
+                for field, amount in amounts.items():
+                    bucket[field] = bucket.get(field, 0) + amount
+
+    def find(self, business_id, granularity, start, end, event_id=None):
+        with self.lock:
+            buckets = [
+                dict(bucket) for bucket in self.buckets.values()
+                if bucket["businessId"] == business_id and bucket["granularity"] == granularity
+                and start <= bucket["bucketStart"] < end and (not event_id or bucket["eventId"] == event_id)
+            ]
+        buckets.sort(key=lambda bucket: bucket["bucketStart"])
+        return buckets
+
+    def replace_business(self, business_id, docs):
+        with self.lock:
+            for key in [key for key in self.buckets if key[0] == business_id]:
+                del self.buckets[key]
+            for doc in docs:
+                self.buckets[self._key(doc)] = dict(doc)
+
+
+class MemorySiteGridRepository(SiteGridRepository):
+    def __init__(self):
+        self.collection = MemoryCollection()
+        self._rebuilt_at: Optional[datetime] = None
+
+    def increment(self, cell, amounts, updated_at):
+        increment_doc(self.collection, cell, amounts, updated_at)
+
+    def iter_changed(self, since, batch_size):
+        cells = [cell for cell in self.collection.all() if since is None or cell["updatedAt"] >= since]
+        cells.sort(key=lambda cell: cell["updatedAt"])
+        for start in range(0, len(cells), batch_size):
+            yield cells[start:start + batch_size]
+
+    def replace_all(self, docs, rebuilt_at):
+        with self.collection.lock:
+            for cell_id in list(self.collection.docs):
+                self.collection.delete(cell_id)
+            for doc in docs:
+                self.collection.put(doc)
+            self._rebuilt_at = rebuilt_at
+
+    def rebuilt_at(self):
+        return self._rebuilt_at
+
+
+def build_memory_repositories() -> Repositories:
+    """A fresh, empty set of in-memory repositories."""
+    events = MemoryEventsRepository()
+    return Repositories(
+        events=events,
+        reservations=MemoryReservationsRepository(events),
+        users=MemoryUsersRepository(),
+        businesses=MemoryBusinessesRepository(),
+        event_embeddings=MemoryEventEmbeddingsRepository(),
+        review_embeddings=MemoryReviewEmbeddingsRepository(),
+        review_embedding_jobs=MemoryReviewEmbeddingJobsRepository(),
+        reputation=MemoryBusinessReputationRepository(),
+        analytics=MemoryAnalyticsRollupsRepository(),
+        site_grid=MemorySiteGridRepository(),
+    )
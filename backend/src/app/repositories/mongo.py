@@ -0,0 +1,547 @@
+"""
+MongoDB implementation of the repositories.
+
+IDs go through `helpers.ids`: queries match the canonical string form (plus
+the legacy ObjectId one until the ID migration is done), new documents get a
+string `_id` and every returned document has its IDs in canonical form.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.database import Database
+
+from src.app.database.indexes import SCHEMA_VERSIONS_COLLECTION, IndexSpec
+from src.app.helpers.ids import decode_doc, encode_id, id_filter, ids_filter, legacy_lookup_enabled, new_id
+from src.app.repositories.base import (
+    AnalyticsRollupsRepository,
+    BusinessesRepository,
+    BusinessReputationRepository,
+    EventEmbeddingsRepository,
+    EventsRepository,
+    Page,
+    Repositories,
+    ReservationsRepository,
+    ReviewEmbeddingJobsRepository,
+    ReviewEmbeddingsRepository,
+    SiteGridRepository,
+    UsersRepository,
+)
+from src.app.services.vector_search import get_vector_search
+
+# Campos de los modelos de respuesta: los listados no traen nada más
+EVENT_LIST_PROJECTION = {
+    field: 1 for field in (
+        "businessId", "name", "description", "type", "start", "end", "capacity",
+        "location", "createdAt", "price", "latitude", "longitude",
+    )
+}
+RESERVATION_LIST_PROJECTION = {
+    field: 1 for field in (
+        "eventId", "userId", "status", "code", "hashes", "preverifiedAt", "otpVerified",
+        "locationVerified", "kycVerified", "kycInfo", "checkin", "completedAt",
+        "cancelledAt", "canceledReason", "metadata",
+    )
+}
+
+
+def rollup_id(key: dict) -> str:
+    """Deterministic `_id` of an analytics bucket, so increments are upserts by `_id`."""
+    return f"{key['businessId']}:{key['eventId']}:{key['granularity']}:{key['bucketStart'].isoformat()}"
+
+
+def after_filter(after: dict) -> dict:
+    """
+    Documents after a page position in `_id` order.
+
+    BSON sorts every string before every ObjectId, so while legacy ObjectId
+    IDs remain, the page after a string ID also includes all the ObjectIds.
+    """
+    if after.get("oid"):
+        return {"_id": {"$gt": ObjectId(after["id"])}}
+    if legacy_lookup_enabled():
+        return {"$or": [{"_id": {"$gt": after["id"]}}, {"_id": {"$type": "objectId"}}]}
+    return {"_id": {"$gt": after["id"]}}
+
+
+def find_page(collection, query: dict, projection: dict, limit: int, after: Optional[dict]) -> Page:
+    """
+    One keyset page of a query, sorted by `_id`.
+
+    Reads one document more than the page size to know whether there is a
+    next page; the compound indexes (field, _id) serve filter and sort.
+    """
+    if after:
+        query = {"$and": [query, after_filter(after)]} if query else after_filter(after)
+    docs = list(collection.find(query, projection).sort("_id", 1).limit(limit + 1))
+    position = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last_id = docs[-1]["_id"]
+        position = {"id": encode_id(last_id), "oid": isinstance(last_id, ObjectId)}
+    return [decode_doc(doc) for doc in docs], position
+
+
+def find_batches(collection, query: dict, projection: dict, batch_size: int, sort_field: str = "_id") -> Iterator[List[dict]]:
+    """Stream a query in `sort_field` order from one cursor, `batch_size` documents per round trip."""
+    with collection.find(query, projection).sort(sort_field, 1).batch_size(batch_size) as cursor:
+        batch = []
+        for doc in cursor:
+            batch.append(decode_doc(doc))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class MongoEventsRepository(EventsRepository):
+    indexes = (
+        IndexSpec("events", [("businessId", 1), ("_id", 1)], "idx_events_businessId_id",
+                  "page_by_business / iter_by_business / get_for_business: businessId + orden por _id"),
+        IndexSpec("events", [("createdAt", -1)], "idx_events_createdAt",
+                  "list_recent (eventos populares): orden por createdAt desc"),
+        IndexSpec("events", [("reputationSettledAt", 1), ("end", 1)], "idx_events_reputationSettledAt_end",
+                  "iter_ended_unsettled: eventos terminados sin no-shows liquidados, por end"),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["events"]
+
+    def get(self, event_id):
+        return decode_doc(self.collection.find_one({"_id": id_filter(event_id)}))
+
+    def get_for_business(self, business_id, event_id):
+        return decode_doc(self.collection.find_one({"_id": id_filter(event_id), "businessId": business_id}))
+
+    def get_many(self, event_ids):
+        ordered_ids = list(dict.fromkeys(str(event_id) for event_id in event_ids if event_id))
+        if not ordered_ids:
+            return {}
+        # Un único $in indexado para todos los IDs
+        found = {}
+        for event in self.collection.find({"_id": ids_filter(ordered_ids)}):
+            event = decode_doc(event)
+            found[event["_id"]] = event
+        return {event_id: found[event_id] for event_id in ordered_ids if event_id in found}
+
+    def list_recent(self, limit):
+        return [decode_doc(event) for event in self.collection.find({}).sort("createdAt", -1).limit(limit)]
+
+    def page_all(self, limit, after=None):
+        return find_page(self.collection, {}, EVENT_LIST_PROJECTION, limit, after)
+
+    def page_by_business(self, business_id, limit, after=None):
+        return find_page(self.collection, {"businessId": business_id}, EVENT_LIST_PROJECTION, limit, after)
+
+    def iter_by_business(self, business_id, batch_size):
+        return find_batches(self.collection, {"businessId": business_id}, EVENT_LIST_PROJECTION, batch_size)
+
+    def iter_ids_by_business(self, business_id, batch_size):
+        for batch in find_batches(self.collection, {"businessId": business_id}, {"_id": 1}, batch_size):
+            yield [event["_id"] for event in batch]
+
+    def create(self, doc):
+        doc = {**doc, "_id": encode_id(doc.get("_id")) or new_id()}
+        self.collection.insert_one(doc)
+        return doc["_id"]
+
+    def update(self, business_id, event_id, data):
+        result = self.collection.update_one({"_id": id_filter(event_id), "businessId": business_id}, {"$set": data})
+        return result.modified_count
+
+    def iter_ended_unsettled(self, ended_before, batch_size):
+        # reputationSettledAt: None también encaja con los eventos sin el campo
+        return find_batches(
+            self.collection,
+            {"reputationSettledAt": None, "end": {"$lt": ended_before}},
+            {"businessId": 1, "end": 1},
+            batch_size,
+            sort_field="end",
+        )
+
+    def claim_settlement(self, event_id, now, lease_until):
+        # Una sola actualización condicional: sin liquidar y sin lease vigente
+        result = self.collection.update_one(
+            {
+                "_id": id_filter(event_id),
+                "reputationSettledAt": None,
+                "$or": [{"reputationSettlingUntil": None}, {"reputationSettlingUntil": {"$lt": now}}],
+            },
+            {"$set": {"reputationSettlingUntil": lease_until}},
+        )
+        return result.modified_count == 1
+
+    def mark_settled(self, event_id, settled_at):
+        result = self.collection.update_one(
+            {"_id": id_filter(event_id), "reputationSettledAt": None},
+            {"$set": {"reputationSettledAt": settled_at}, "$unset": {"reputationSettlingUntil": ""}},
+        )
+        return result.modified_count == 1
+
+
+class MongoReservationsRepository(ReservationsRepository):
+    indexes = (
+        IndexSpec("reservations", [("userId", 1), ("_id", 1)], "idx_reservations_userId_id",
+                  "page_by_user / list_by_user / list_events_by_user: userId + orden por _id"),
+        IndexSpec("reservations", [("eventId", 1), ("_id", 1)], "idx_reservations_eventId_id",
+                  "page_by_event / iter_by_events: eventId + orden por _id"),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["reservations"]
+
+    def get(self, reservation_id):
+        return decode_doc(self.collection.find_one({"_id": id_filter(reservation_id)}))
+
+    def list_by_user(self, user_id):
+        return [decode_doc(res) for res in self.collection.find({"userId": user_id})]
+
+    def page_by_user(self, user_id, limit, after=None):
+        return find_page(self.collection, {"userId": user_id}, RESERVATION_LIST_PROJECTION, limit, after)
+
+    def page_by_event(self, event_id, limit, after=None):
+        return find_page(self.collection, {"eventId": event_id}, RESERVATION_LIST_PROJECTION, limit, after)
+
+    def list_events_by_user(self, user_id):
+        if legacy_lookup_enabled():
+            # eventId en string y, si es un ObjectId válido, también en su forma antigua
+            keys = {"eventKeys": ["$eventId", {"$convert": {"input": "$eventId", "to": "objectId", "onError": None, "onNull": None}}]}
+            local_field = "eventKeys"
+        else:
+            keys = {}
+            local_field = "eventId"
+        pipeline = [
+            {"$match": {"userId": user_id}},
+            {"$sort": {"_id": 1}},
+            {"$project": {"eventId": 1, **keys}},
+            # Un único viaje: el join con events se hace en el servidor por _id
+            {"$lookup": {
+                "from": "events",
+                "localField": local_field,
+                "foreignField": "_id",
+                "pipeline": [{"$project": EVENT_LIST_PROJECTION}],
+                "as": "event",
+            }},
+            {"$unwind": "$event"},
+            {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$event", {"reservation_id": {"$toString": "$_id"}}]}}},
+        ]
+        return [decode_doc(event) for event in self.collection.aggregate(pipeline)]
+
+    def iter_by_events(self, event_ids, batch_size):
+        return find_batches(self.collection, {"eventId": {"$in": list(event_ids)}}, RESERVATION_LIST_PROJECTION, batch_size)
+
+    def count_no_shows(self, event_id):
+        return self.collection.count_documents({"eventId": event_id, "checkin": None, "cancelledAt": None})
+
+    def create(self, doc):
+        doc = {**doc, "_id": encode_id(doc.get("_id")) or new_id()}
+        self.collection.insert_one(doc)
+        return doc["_id"]
+
+    def _set(self, reservation_id, changes: dict) -> Optional[dict]:
+        return decode_doc(self.collection.find_one_and_update(
+            {"_id": id_filter(reservation_id)}, {"$set": changes}, return_document=ReturnDocument.BEFORE,
+        ))
+
+    def set_checkin(self, reservation_id, checkin):
+        return self._set(reservation_id, {"checkin": checkin})
+
+    def set_checkin_status(self, reservation_id, status):
+        return self._set(reservation_id, {"checkin.status": status})
+
+    def set_review(self, reservation_id, review):
+        return self._set(reservation_id, {"checkin.review": review})
+
+
+class MongoUsersRepository(UsersRepository):
+    indexes = (
+        IndexSpec("users", [("kyc.phone", 1)], "idx_users_kyc_phone",
+                  "find_by_phone (create_user comprueba si el teléfono existe)", unique=True,
+                  # kyc es opcional: sin el filtro, los usuarios sin teléfono chocarían en null
+                  partialFilterExpression={"kyc.phone": {"$exists": True}}),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["users"]
+
+    def get(self, user_id):
+        return decode_doc(self.collection.find_one({"_id": id_filter(user_id)}))
+
+    def find_by_phone(self, phone):
+        return decode_doc(self.collection.find_one({"kyc.phone": phone}))
+
+    def create(self, doc):
+        doc = {**doc, "_id": encode_id(doc.get("_id")) or new_id()}
+        self.collection.insert_one(doc)
+        return doc["_id"]
+
+    def increment(self, user_id, field, amount=1):
+        self.collection.update_one({"_id": id_filter(user_id)}, {"$inc": {field: amount}})
+
+
+class MongoBusinessesRepository(BusinessesRepository):
+    indexes = (
+        IndexSpec("businesses", [("apiKey", 1)], "idx_businesses_apiKey",
+                  "find_by_api_key", unique=True),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["businesses"]
+
+    def get(self, business_id):
+        return decode_doc(self.collection.find_one({"_id": id_filter(business_id)}))
+
+    def find_by_api_key(self, api_key):
+        return decode_doc(self.collection.find_one({"apiKey": api_key}))
+
+    def create(self, doc):
+        # El _id del payload (UUID del modelo) se sustituye por uno canónico
+        doc = {**doc, "_id": new_id()}
+        self.collection.insert_one(doc)
+        return doc
+
+    def iter_ids(self, batch_size):
+        for batch in find_batches(self.collection, {}, {"_id": 1}, batch_size):
+            yield [business["_id"] for business in batch]
+
+
+class MongoBusinessReputationRepository(BusinessReputationRepository):
+    # Solo lecturas y escrituras por _id: no necesita índices propios
+    indexes = ()
+
+    def __init__(self, db: Database):
+        self.collection = db["businessReputation"]
+
+    def get(self, business_id):
+        return self.collection.find_one({"_id": str(business_id)})
+
+    def increment(self, business_id, amounts, updated_at):
+        self.collection.update_one(
+            {"_id": str(business_id)},
+            {"$inc": dict(amounts), "$set": {"updatedAt": updated_at}},
+            upsert=True,
+        )
+
+    def replace(self, business_id, doc):
+        self.collection.replace_one({"_id": str(business_id)}, {**doc, "_id": str(business_id)}, upsert=True)
+
+
+class MongoEventEmbeddingsRepository(EventEmbeddingsRepository):
+    indexes = (
+        IndexSpec("eventEmbeddings", [("eventId", 1)], "idx_eventEmbeddings_eventId",
+                  "find_vectors: eventId $in (perfiles de recomendación)"),
+    )
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.collection = db["eventEmbeddings"]
+
+    def find_vectors(self, event_ids):
+        events = self.collection.find({"eventId": {"$in": list(event_ids)}}, {"eventId": 1, "embedding": 1, "_id": 0})
+        return {
+            event["eventId"]: np.asarray(event["embedding"], dtype=np.float32)
+            for event in events
+            if event.get("embedding")
+        }
+
+    def insert_many(self, docs):
+        if docs:
+            self.collection.insert_many(docs, ordered=False)
+
+    def search(self, query_vector, limit=10, filter=None):
+        return get_vector_search().search(self.db, "eventEmbeddings", query_vector, limit=limit, filter=filter)
+
+
+class MongoReviewEmbeddingsRepository(ReviewEmbeddingsRepository):
+    indexes = (
+        IndexSpec("reviewEmbeddings", [("userId", 1), ("rating", -1)], "idx_reviewEmbeddings_userId_rating",
+                  "top_rated_by_user: userId + orden por rating desc"),
+        IndexSpec("reviewEmbeddings", [("reservationId", 1)], "idx_reviewEmbeddings_reservationId",
+                  "upsert_many: upsert por reservationId", unique=True),
+    )
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.collection = db["reviewEmbeddings"]
+
+    def top_rated_by_user(self, user_id, limit):
+        top_reviews = self.collection.find(
+            {"userId": user_id, "rating": {"$ne": None}},
+            {"eventId": 1, "rating": 1, "createdAt": 1, "_id": 0},
+        ).sort("rating", -1).limit(limit)
+        return list(top_reviews)
+
+    def upsert_many(self, docs):
+        if not docs:
+            return []
+        now = datetime.utcnow()
+        self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"reservationId": doc["reservationId"]},
+                    {"$set": {key: value for key, value in doc.items() if key not in ("_id", "createdAt")},
+                     "$setOnInsert": {"_id": new_id(), "createdAt": doc.get("createdAt") or now}},
+                    upsert=True,
+                )
+                for doc in docs
+            ],
+            ordered=False,
+        )
+        written = self.collection.find(
+            {"reservationId": {"$in": [doc["reservationId"] for doc in docs]}},
+            {"_id": 1, "reservationId": 1},
+        )
+        ids = {doc["reservationId"]: encode_id(doc["_id"]) for doc in written}
+        return [{**doc, "_id": ids.get(doc["reservationId"])} for doc in docs]
+
+    def search(self, query_vector, limit=10, filter=None):
+        return get_vector_search().search(self.db, "reviewEmbeddings", query_vector, limit=limit, filter=filter)
+
+
+class MongoReviewEmbeddingJobsRepository(ReviewEmbeddingJobsRepository):
+    indexes = (
+        IndexSpec("reviewEmbeddingJobs", [("status", 1), ("nextAttemptAt", 1)], "idx_reviewEmbeddingJobs_status_nextAttemptAt",
+                  "claim: trabajos pendientes vencidos, por nextAttemptAt"),
+        IndexSpec("reviewEmbeddingJobs", [("status", 1), ("leaseUntil", 1)], "idx_reviewEmbeddingJobs_status_leaseUntil",
+                  "claim: trabajos con el lease caducado"),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["reviewEmbeddingJobs"]
+        self.dead_letters = db["reviewEmbeddingDeadLetters"]
+
+    def enqueue(self, reservation_id, job):
+        self.collection.replace_one({"_id": str(reservation_id)}, job, upsert=True)
+
+    def claim(self, claim_id, limit, lease_until, now):
+        jobs = []
+        for _ in range(limit):
+            job = self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "nextAttemptAt": {"$lte": now}},
+                    {"status": "processing", "leaseUntil": {"$lt": now}},
+                ]},
+                {"$set": {"status": "processing", "claimId": claim_id, "leaseUntil": lease_until}},
+                sort=[("nextAttemptAt", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    def reschedule(self, job_id, claim_id, changes):
+        self.collection.update_one({"_id": job_id, "claimId": claim_id}, {"$set": {**changes, "status": "pending"}})
+
+    def dead_letter(self, job, error):
+        dead = {key: value for key, value in job.items() if key not in ("status", "claimId", "leaseUntil")}
+        dead.update({"error": error, "failedAt": datetime.utcnow()})
+        self.dead_letters.replace_one({"_id": job["_id"]}, dead, upsert=True)
+        self.collection.delete_one({"_id": job["_id"], "claimId": job.get("claimId")})
+
+    def ack(self, job_ids, claim_id):
+        self.collection.delete_many({"_id": {"$in": list(job_ids)}, "claimId": claim_id})
+
+    def list_dead_letters(self):
+        return list(self.dead_letters.find({}))
+
+    def delete_dead_letter(self, job_id):
+        self.dead_letters.delete_one({"_id": job_id})
+
+
+class MongoAnalyticsRollupsRepository(AnalyticsRollupsRepository):
+    indexes = (
+        IndexSpec("analyticsRollups", [("businessId", 1), ("granularity", 1), ("bucketStart", 1)],
+                  "idx_analyticsRollups_businessId_granularity_bucketStart",
+                  "find: buckets de un negocio en un rango, por bucketStart"),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["analyticsRollups"]
+
+    def increment(self, rows):
+        if not rows:
+            return
+        # Un único viaje para los buckets de todas las granularidades
+        self.collection.bulk_write(
+            [
+                UpdateOne({"_id": rollup_id(key)}, {"$inc": dict(amounts), "$setOnInsert": key}, upsert=True)
+                for key, amounts in rows
+            ],
+            ordered=False,
+        )
+
+    def find(self, business_id, granularity, start, end, event_id=None):
+        query = {"businessId": business_id, "granularity": granularity, "bucketStart": {"$gte": start, "$lt": end}}
+        if event_id:
+            query["eventId"] = event_id
+        return list(self.collection.find(query, {"_id": 0}).sort("bucketStart", 1))
+
+    def replace_business(self, business_id, docs):
+        self.collection.delete_many({"businessId": business_id})
+        if docs:
+            self.collection.insert_many([{**doc, "_id": rollup_id(doc)} for doc in docs], ordered=False)
+
+
+class MongoSiteGridRepository(SiteGridRepository):
+    indexes = (
+        IndexSpec("siteGrid", [("updatedAt", 1)], "idx_siteGrid_updatedAt",
+                  "iter_changed: celdas con updatedAt >= última sincronización"),
+    )
+
+    def __init__(self, db: Database):
+        self.collection = db["siteGrid"]
+        self.versions = db[SCHEMA_VERSIONS_COLLECTION]
+
+    def increment(self, cell, amounts, updated_at):
+        self.collection.update_one({"_id": cell}, {"$inc": dict(amounts), "$set": {"updatedAt": updated_at}}, upsert=True)
+
+    def iter_changed(self, since, batch_size):
+        query = {"updatedAt": {"$gte": since}} if since else {}
+        return find_batches(self.collection, query, None, batch_size, sort_field="updatedAt")
+
+    def replace_all(self, docs, rebuilt_at):
+        self.collection.delete_many({})
+        if docs:
+            self.collection.insert_many(docs, ordered=False)
+        # El marcador va después de las celdas: quien lo vea cambiar recarga la rejilla completa
+        self.versions.update_one({"_id": "siteGrid"}, {"$set": {"rebuiltAt": rebuilt_at}}, upsert=True)
+
+    def rebuilt_at(self):
+        marker = self.versions.find_one({"_id": "siteGrid"}, {"rebuiltAt": 1})
+        return (marker or {}).get("rebuiltAt")
+
+
+MONGO_REPOSITORIES = (
+    MongoEventsRepository,
+    MongoReservationsRepository,
+    MongoUsersRepository,
+    MongoBusinessesRepository,
+    MongoEventEmbeddingsRepository,
+    MongoReviewEmbeddingsRepository,
+    MongoReviewEmbeddingJobsRepository,
+    MongoBusinessReputationRepository,
+    MongoAnalyticsRollupsRepository,
+    MongoSiteGridRepository,
+)
+
+
+def build_mongo_repositories(db: Database) -> Repositories:
+    """All the Mongo repositories over one database."""
+    return Repositories(
+        events=MongoEventsRepository(db),
+        reservations=MongoReservationsRepository(db),
+        users=MongoUsersRepository(db),
+        businesses=MongoBusinessesRepository(db),
+        event_embeddings=MongoEventEmbeddingsRepository(db),
+        review_embeddings=MongoReviewEmbeddingsRepository(db),
+        review_embedding_jobs=MongoReviewEmbeddingJobsRepository(db),
+        reputation=MongoBusinessReputationRepository(db),
+        analytics=MongoAnalyticsRollupsRepository(db),
+        site_grid=MongoSiteGridRepository(db),
+        db=db,
+    )
@@ -0,0 +1,51 @@
+"""
+Selection of the repository backend (REPOSITORY_BACKEND=mongo|memory).
+"""
+
+import os
+import threading
+from typing import Optional
+
+from src.app.repositories.base import Repositories
+
+_repositories: Optional[Repositories] = None
+_repositories_lock = threading.Lock()
+
+
+def repository_backend() -> str:
+    return os.getenv("REPOSITORY_BACKEND", "mongo").lower()
+
+
+def init_repositories(db=None) -> Repositories:
+    """
+    Build the process-wide repositories (called from the app lifespan).
+
+    Args:
+        db (Database): Database of the shared MongoClient; ignored by the memory backend.
+    """
+    global _repositories
+    with _repositories_lock:
+        if repository_backend() == "memory":
+            from src.app.repositories.memory import build_memory_repositories
+            _repositories = build_memory_repositories()
+        else:
+            from src.app.repositories.mongo import build_mongo_repositories
+            if db is None:
+                from src.app.database.mongodb import get_db
+                db = get_db()
+            _repositories = build_mongo_repositories(db)
+        return _repositories
+
+
+def get_repositories() -> Repositories:
+    """FastAPI dependency: the process-wide repositories."""
+    if _repositories is None:
+        return init_repositories()
+    return _repositories
+
+
+def reset_repositories():
+    """Forget the current repositories (the next call builds new ones)."""
+    global _repositories
+    with _repositories_lock:
+        _repositories = None
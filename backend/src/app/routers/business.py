@@ -1,21 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from pymongo.database import Database
-from bson import ObjectId
-from src.app.database.mongodb import get_database, get_mongo_client
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from src.app.database.mongodb import run_db
+from src.app.helpers.serialization import fast_response
 from src.app.models.BusinessModel import CreateBusinessModel, BusinessModel, BusinessDetailsModel
-from src.app.database.mongodb import get_businesses_collection 
+from src.app.repositories.base import Repositories
+from src.app.repositories.provider import get_repositories
 from dotenv import load_dotenv
-from langchain_openai import AzureOpenAIEmbeddings, AzureChatOpenAI
-import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import logging
+from src.app.services.exports import NDJSON_MEDIA_TYPE, export_business_events, export_business_reservations
+from src.app.services.analytics import GRANULARITIES, query_analytics
+from src.app.services.reputation import get_reputation
+from src.app.services.site_selection import rank_locations, site_grid_precision
+from src.app.services.reviews_analysis import CATEGORIAS, find_category_reviews, build_reviews_prompt, get_chat_model, stream_reviews_analysis
 
 load_dotenv()
 
-router = APIRouter(prefix="/businesses", tags=["businesses"])
+logger = logging.getLogger(__name__)
 
-def get_db() -> Database:
-    uri = os.getenv("MONGODB_URI")
-    client = get_mongo_client(uri)
-    return get_database(client)
+router = APIRouter(prefix="/businesses", tags=["businesses"])
 
 @router.post(
     "/register",
@@ -25,19 +29,12 @@ def get_db() -> Database:
 )
 async def register_business(
     payload: CreateBusinessModel,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["businesses"]
-    print("Payload", payload)
     new = payload.dict(by_alias=True)
-    
-    print("Inserting...")
-    # Remove '_id' if present, so MongoDB generates it automatically
-    new.pop("_id", None)
-    result = col.insert_one(new)
-    print("Inserted.")
-    # Fetch the inserted document to return with all fields (including generated _id)
-    inserted = col.find_one({"_id": result.inserted_id})
+    # The repository assigns a canonical '_id' (the payload one is ignored)
+    inserted = await run_db(repos.businesses.create, new)
+    logger.info("Registered business %s", inserted.get("_id"))
     return inserted
 
 @router.get(
@@ -47,12 +44,12 @@ async def register_business(
 )
 async def get_business_by_apikey(
     api_key: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    business = get_businesses_collection(db).find_one({"apiKey": api_key})
+    business = await run_db(repos.businesses.find_by_api_key, api_key)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
-    return business
+    return fast_response(business, BusinessDetailsModel)
 
 
 @router.get(
@@ -62,13 +59,12 @@ async def get_business_by_apikey(
 )
 async def get_business_details(
     business_id: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    business = get_businesses_collection(db).find_one({"_id": ObjectId(business_id)})
-    print("Business", business)
+    business = await run_db(repos.businesses.get, business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
-    return business
+    return fast_response(business, BusinessDetailsModel)
 
 
 @router.get(
@@ -77,9 +73,13 @@ async def get_business_details(
 )
 async def get_business_reputation(
     business_id: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    return {"business_id": business_id, "score": 0.0, "breakdown": {}}
+    # Una lectura del documento de contadores: la puntuación se calcula al vuelo
+    reputation = await run_db(get_reputation, repos, business_id)
+    if reputation is None:
+        raise HTTPException(status_code=404, detail="Business not found")
+    return reputation
 
 @router.get(
     "/analytics/{business_id}",
@@ -87,9 +87,25 @@ async def get_business_reputation(
 )
 async def get_business_analytics(
     business_id: str,
-    db: Database = Depends(get_db),
+    start: Optional[datetime] = Query(None, description="Inicio del rango (por defecto, hace 30 días)"),
+    end: Optional[datetime] = Query(None, description="Fin del rango, excluido (por defecto, ahora)"),
+    granularity: Optional[str] = Query(None, description=f"Tamaño del bucket: {', '.join(GRANULARITIES)} (por defecto, según el rango)"),
+    event_id: Optional[str] = Query(None, description="Solo este evento"),
+    repos: Repositories = Depends(get_repositories),
 ):
-    return {"business_id": business_id, "analytics": {}}
+    # Los buckets se guardan en UTC sin zona horaria
+    end = (end.astimezone(timezone.utc).replace(tzinfo=None) if end and end.tzinfo else end) or datetime.utcnow()
+    start = (start.astimezone(timezone.utc).replace(tzinfo=None) if start and start.tzinfo else start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    business = await run_db(repos.businesses.get, business_id)
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+    try:
+        # Se sirve desde los buckets precalculados, nunca desde reservations
+        return await run_db(query_analytics, repos, business_id, start, end, granularity, event_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get(
     "/site-selection/{business_id}",
@@ -97,9 +113,46 @@ async def get_business_analytics(
 )
 async def get_site_selection(
     business_id: str,
-    db: Database = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100, description="Número de ubicaciones"),
+    radius_km: Optional[float] = Query(None, gt=0, description="Solo celdas a esta distancia de los eventos del negocio"),
+    repos: Repositories = Depends(get_repositories),
+):
+    business = await run_db(repos.businesses.get, business_id)
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+    # Ranking vectorizado sobre la rejilla precalculada en memoria
+    top_locations = await run_db(rank_locations, repos, business, limit, radius_km)
+    return {"business_id": business_id, "precision": site_grid_precision(), "top_locations": top_locations}
+
+@router.get(
+    "/export/{business_id}/events",
+    summary="Exportar todos los eventos de un negocio (NDJSON en streaming)",
+    response_class=StreamingResponse,
+)
+async def export_events(
+    business_id: str,
+    repos: Repositories = Depends(get_repositories),
+):
+    return StreamingResponse(
+        export_business_events(business_id, repos),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="events-{business_id}.ndjson"'},
+    )
+
+@router.get(
+    "/export/{business_id}/reservations",
+    summary="Exportar todas las reservas de los eventos de un negocio (NDJSON en streaming)",
+    response_class=StreamingResponse,
+)
+async def export_reservations(
+    business_id: str,
+    repos: Repositories = Depends(get_repositories),
 ):
-    return {"business_id": business_id, "top_locations": []} 
+    return StreamingResponse(
+        export_business_reservations(business_id, repos),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="reservations-{business_id}.ndjson"'},
+    )
 
 @router.get(
     "/reviews_analysys/{business_id}",
@@ -108,78 +161,47 @@ async def get_site_selection(
 async def get_business_reviews_analysis(
     business_id: str,
     category: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-   
-    #Modelo Embeddings
-    embeddings = AzureOpenAIEmbeddings(model="text-embedding-3-large")
-    #Modelo de lenguaje
-    llm = AzureChatOpenAI(model="gpt-4o-mini", temperature=0.2, streaming=True)
-
-    #Diccionario de Categorías y el prompt para el modelo de lenguaje
-    categorias={
-        "Ambiente": "Quiero saber cómo se percibe mi negocio en términos de ambiente, incluyendo aspectos como limpieza, decoración, y comodidad.",
-        "Seguridad": " Quiero saber cómo se percibe mi negocio en términos de seguridad, incluyendo la percepción de los clientes sobre la seguridad física y la protección de datos.",
-        "Atención al Cliente": "Quiero saber cómo se percibe mi negocio en términos de atención al cliente, incluyendo la amabilidad, rapidez y eficacia del servicio.",
-    }
-
     #Datos que se pasan desde fuera
     businessId = business_id
     categoria = category
-    if categoria not in categorias:
+    if categoria not in CATEGORIAS:
         raise HTTPException(status_code=400, detail="Categoría no válida. Debe ser una de las siguientes: 'Ambiente', 'Seguridad', 'Atención al Cliente'.")
     if not businessId:
         raise HTTPException(status_code=400, detail="Business not found")
     
-    #Obtenemos la lista de reviews similares
-    query_embedding = embeddings.embed_query(categorias[categoria])  
-    col = db["reviewEmbeddings"]
-    pipeline = [
-        {
-            "$vectorSearch": {
-            "filter": {
-                "businessId": businessId
-            },
-            "index": "embedding_vector_index_Reviews",# TODO: CAMBIAR
-            "limit": 5,
-            "numCandidates": 100,
-            "path": "embedding",
-            "queryVector": query_embedding
-            }
-        },
-        {
-        "$project": {
-            "text": 1,
-            "rating": 1,
-            "score": {"$meta": "vectorSearchScore"}
-        }
-    }
-    ]
-    list_reviews = list(col.aggregate(pipeline))
-
-
-    #Nos quedamos con la lista de reviews solo el texto y solo si el score es mayor a 0.5
-    list_reviews = [f"{review['text']}" for review in list_reviews if review['score'] > 0.5]
+    #Obtenemos la lista de reviews similares (vector de la categoría precalculado al arrancar)
+    list_reviews = await run_db(find_category_reviews, businessId, categoria, repos)
 
     # Generamos el prompt para el modelo de lenguaje
-    prompt = f"""
-        Eres un experto en análisis de opiniones de clientes. Tu tarea es analizar las opiniones de los clientes sobre un negocio específico y proporcionar un resumen detallado de la percepción del cliente en una categoría específica.
-
-        Categoría: {categoria}
-        Descripción de la categoría: {categorias[categoria]}
-        
-        Aquí tienes una lista de opiniones de clientes sobre el negocio:
-        {list_reviews}
-
-        Por favor, proporciona un resumen detallado de la percepción del cliente en la categoría '{categoria}'.
-    """
-    # Ejecutamos el modelo de lenguaje con el prompt generado
-    response = llm.invoke(prompt)
-    # Imprimimos la respuesta del modelo de lenguaje
-    print("Respuesta del modelo de lenguaje:")
-    print(response.content)
+    prompt = build_reviews_prompt(categoria, list_reviews)
+    # Ejecutamos el modelo de lenguaje (cliente compartido) con el prompt generado
+    response = await get_chat_model().ainvoke(prompt)
     return response.content
 
+@router.get(
+    "/reviews_analysys/{business_id}/stream",
+    summary="7b. Análisis de reviews de negocio en streaming (SSE)",
+    response_class=StreamingResponse,
+)
+async def stream_business_reviews_analysis(
+    business_id: str,
+    category: str,
+    repos: Repositories = Depends(get_repositories),
+):
+    if category not in CATEGORIAS:
+        raise HTTPException(status_code=400, detail="Categoría no válida. Debe ser una de las siguientes: 'Ambiente', 'Seguridad', 'Atención al Cliente'.")
+    if not business_id:
+        raise HTTPException(status_code=400, detail="Business not found")
+
+    # Los tokens se envían según los genera el modelo (text/event-stream)
+    return StreamingResponse(
+        stream_reviews_analysis(business_id, category, repos),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 
 
@@ -1,47 +1,38 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from pymongo.database import Database
-from bson import ObjectId
-from src.app.services.api_calls import run_kyc_match, call_api
-from src.app.database.mongodb import get_database, get_mongo_client
+from src.app.services.checkin_verification import verify_checkin
+from src.app.services import analytics, reputation, site_selection
+from src.app.database.mongodb import run_db
+from src.app.helpers.pagination import PageParams, next_cursor_headers
+from src.app.helpers.serialization import fast_response
+from src.app.repositories.base import Repositories
+from src.app.repositories.provider import get_repositories
 from src.app.models.ReservationModel import ReservationModel, CheckinSubdoc, ReviewSubdoc, AnomalySubdocModelDTO, ReservationCreateModel, ReviewCreationModel
-from src.app.models.ReviewEmbeddingModel import ReviewEmbeddingModel
+from src.app.services.review_embedding_worker import enqueue_review_embedding, get_review_embedding_worker
 from dotenv import load_dotenv
 from typing import List
 from datetime import datetime
-import os
-import random
-from langchain_openai import AzureOpenAIEmbeddings
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
-
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-embeddings = AzureOpenAIEmbeddings(model="text-embedding-3-large")
-
-def generate_embedding(text):
-    return embeddings.embed_query(text)
-
-def id_length_check(id: str):
-    if len(id) > 26:
-        return False
-    return True
 
-def get_db() -> Database:
-    uri = os.getenv("MONGODB_URI")
-    client = get_mongo_client(uri)
-    return get_database(client)
+async def record_counters(hooks, *args):
+    """
+    Run the counter hooks (reputation, analytics, site selection) of a write already saved.
 
-def convert_mongo_doc(doc):
-    """Convert MongoDB document to format expected by Pydantic models"""
-    if doc and "_id" in doc:
-        doc["_id"] = str(doc["_id"])
-    return doc
-
-def convert_mongo_docs(docs):
-    """Convert list of MongoDB documents to format expected by Pydantic models"""
-    return [convert_mongo_doc(doc) for doc in docs]
+    The write itself succeeded, so a failing hook is logged instead of
+    turning the request into a 500; `rebuild_*` recovers the counters.
+    """
+    for hook in hooks:
+        try:
+            await run_db(hook, *args)
+        except Exception:
+            logger.exception("Counter hook %s.%s failed", hook.__module__, hook.__name__)
 
 # Obtener reservas por eventoId
 @router.get(
@@ -51,11 +42,11 @@ def convert_mongo_docs(docs):
 )
 async def get_reservations_by_event(
     event_id: str,
-    db: Database = Depends(get_db),
+    page: PageParams = Depends(),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    reservations = list(col.find({"eventId": event_id}))
-    return convert_mongo_docs(reservations)
+    reservations, next_page = await run_db(repos.reservations.page_by_event, event_id, page.limit, page.after)
+    return fast_response(reservations, ReservationModel, headers=next_cursor_headers(next_page))
 
 # Obtener reservas por userId
 @router.get(
@@ -65,11 +56,11 @@ async def get_reservations_by_event(
 )
 async def get_reservations_by_user(
     user_id: str,
-    db: Database = Depends(get_db),
+    page: PageParams = Depends(),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    reservations = list(col.find({"userId": user_id}))
-    return convert_mongo_docs(reservations)
+    reservations, next_page = await run_db(repos.reservations.page_by_user, user_id, page.limit, page.after)
+    return fast_response(reservations, ReservationModel, headers=next_cursor_headers(next_page))
 
 @router.get(
     "/{reservation_id}",
@@ -78,11 +69,12 @@ async def get_reservations_by_user(
 )
 async def get_reservation_by_id(
     reservation_id: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    reservation = col.find_one({"_id": ObjectId(reservation_id)})
-    return convert_mongo_doc(reservation)
+    reservation = await run_db(repos.reservations.get, reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+    return fast_response(reservation, ReservationModel)
 
 @router.post(
     "",
@@ -92,19 +84,13 @@ async def get_reservation_by_id(
 )
 async def create_reservation(
     payload: ReservationCreateModel,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    
     # Create reservation data with all required fields
     reservation_data = payload.dict(by_alias=True)
     
     # Get KYCInfor from the user
-    user_col = db["users"]
-    if not id_length_check(payload.userId):
-        user = user_col.find_one({"_id": payload.userId})
-    else:
-        user = user_col.find_one({"_id": ObjectId(payload.userId)})
+    user = await run_db(repos.users.get, payload.userId)
         
     kyc_info = user.get("kyc")
     # TODO: implement otp verification.
@@ -123,9 +109,9 @@ async def create_reservation(
         "canceledReason": None,
     })
     
-    result = col.insert_one(reservation_data)
-    # Convert ObjectId to string for response
-    reservation_data["_id"] = str(result.inserted_id)
+    reservation_data["_id"] = await run_db(repos.reservations.create, reservation_data)
+    event = await run_db(repos.events.get, payload.eventId)
+    await record_counters((analytics.record_reservation, site_selection.record_reservation), repos, event, reservation_data)
     
     return reservation_data
 
@@ -136,10 +122,9 @@ async def create_reservation(
 )
 async def do_checkin(
     reservation_id: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    res = col.find_one({"_id": ObjectId(reservation_id)})
+    res = await run_db(repos.reservations.get, reservation_id)
     if not res:
         raise HTTPException(404, "Reserva no encontrada")
     
@@ -148,79 +133,20 @@ async def do_checkin(
     if checkin and checkin.get("status") in ["completed", "anomaly"]:
         raise HTTPException(400, "Reserva ya completada")
     
-    # Check if user has any anomaly checkins and save in a previous_anomaly_checkins field
-    user_id = res.get("userId")
-    user_col = db["users"]
-    user = user_col.find_one({"_id": ObjectId(user_id)})
-    previous_anomaly_checkins = user.get("anomalyCheckins", 0)
-
-    # TODO: IMPLEMENT THIS REAL LOGIC
-    if previous_anomaly_checkins > 0:
-        previous_anomaly_checkins = True
-    else:
-        previous_anomaly_checkins = False
-
-    
-    # If random > 0.5, set status to anomaly, else set to completed
-    # TODO: Implement real checkin verifyting KYC, OTP, LOCATION
-    # Call to external service to verify location
-    # Call to external service to verify OTP
-    # Call to external service to verify KYC
-
-    ##telefono del usuario 
-    phone = user.get("kyc").get("phone")
-    #TODO: Implementar verificación de ubicación
-    event_col = db["events"]
-    event_id = res.get("eventId")
-    print("event_id:", event_id)
-    length_event_id = event_id
-    if len(length_event_id) > 26:
-        event_type = "string"
-    else:
-        event_type = "objectid"
-    if event_type == "string":
-        event = event_col.find_one({"_id": event_id})
-    else:
-        event = event_col.find_one({"_id": ObjectId(res.get("eventId"))})
-    # Get event latitude and longitude
-
-    latitude = event.get("latitude")
-    longitude = event.get("longitude")
-    
-    result = call_api(
-        phone=phone,
-        scope="dpv:FraudPreventionAndDetection#device-location-read",
-        user_data={
-            "latitude": latitude,
-            "longitude": longitude
-        }
-    )
-    
-    print("Location verification result:", result)
-
-    # TODO: REMOVE THIS NEXT CODE IMPLEMENT REAL LOCATION VERIFICATION
-    status = ""
-    if result:
-        status = "completed"
-    else:
-        status = "anomaly"
-    
-    updated_checkin = {
-        "status": status,
-        "requestedAt": datetime.now(),
-        "otpVerified": True,
-        "locationVerified": True,
-        "kycVerified": True,
-        "completedAt": None,
-        "anomalies": [],
-        "review": None,
-        "previous_anomaly_checkins": previous_anomaly_checkins,
-    }
-    
-    if not id_length_check(reservation_id):
-        col.update_one({"_id": reservation_id}, {"$set": {"checkin": updated_checkin}})
-    else:
-        col.update_one({"_id": ObjectId(reservation_id)}, {"$set": {"checkin": updated_checkin}})
+    # Usuario y evento en paralelo, después ubicación/KYC/OTP en paralelo con timeout
+    try:
+        updated_checkin, event = await verify_checkin(res, repos)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    
+    # La reserva tal y como estaba justo antes de escribir: con check-ins concurrentes solo uno cuenta
+    before = await run_db(repos.reservations.set_checkin, reservation_id, updated_checkin)
+    if before is not None:
+        # Contadores de reputación, analítica y site-selection ($inc atómicos) con el evento ya verificado
+        await record_counters(
+            (reputation.record_checkin, analytics.record_checkin, site_selection.record_checkin),
+            repos, event, before, updated_checkin,
+        )
     
     return updated_checkin
 
@@ -232,28 +158,24 @@ async def do_checkin(
 async def create_trouble(
     reservation_id: str,
     payload: AnomalySubdocModelDTO,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    res = col.find_one({"_id": ObjectId(reservation_id)})
+    res = await run_db(repos.reservations.get, reservation_id)
     # Update reservation checkin status to trouble
     
     if not res or not res.get("checkin") or res["checkin"].get("status") != "completed":
         raise HTTPException(400, "Check-in no válido para crear anomalía")
     
     user_id = res.get("userId")
-    user_col = db["users"]
-    user = user_col.find_one({"_id": ObjectId(user_id)})
     # Update user anomalyCheckins +1
-    user["anomalyCheckins"] += 1
-    user_col.update_one({"_id": ObjectId(user_id)}, {"$set": {"anomalyCheckins": user["anomalyCheckins"]}})
+    await run_db(repos.users.increment, user_id, "anomalyCheckins")
     
     anomaly = payload.dict()
     # Add anomaly to checkin
-    col.update_one(
-        {"_id": ObjectId(reservation_id)},
-        {"$set": {"checkin.status": anomaly.get("status")}}
-    )
+    before = await run_db(repos.reservations.set_checkin_status, reservation_id, anomaly.get("status"))
+    if before is not None:
+        event = await run_db(repos.events.get, before.get("eventId"))
+        await record_counters((reputation.record_anomaly, analytics.record_anomaly), repos, event, before, anomaly.get("status"))
 
     return True
     
@@ -266,59 +188,33 @@ async def create_trouble(
 async def create_review(
     reservation_id: str,
     payload: ReviewCreationModel,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["reservations"]
-    res = col.find_one({"_id": ObjectId(reservation_id)})
+    res = await run_db(repos.reservations.get, reservation_id)
     if not res or not res.get("checkin") or res["checkin"].get("status") != "completed":
         raise HTTPException(400, "Check-in no válido para reseñar")
     review = payload.dict()
     review["createdAt"] = datetime.utcnow()
-    col.update_one(
-        {"_id": ObjectId(reservation_id)},
-        {"$set": {"checkin.review": review}}
-    )
-    
-    business_col = db["businesses"]
-    
-    # Get the event first to get the businessId
-    events_col = db["events"]
-    if not id_length_check(res.get("eventId")):
-        event = events_col.find_one({"_id": res.get("eventId")})
-    else:
-        event = events_col.find_one({"_id": ObjectId(res.get("eventId"))})
-        
-    if not event:
-        raise HTTPException(404, "Evento no encontrado")
-    
-    business_id = event.get("businessId")
-    
-    if not id_length_check(reservation_id):
-        reservation_id = ObjectId(reservation_id)
-    else:
-        reservation_id = reservation_id
-    
-    print("reservation_id:", reservation_id)
-    print("res.get('userId'):", res.get("userId"))
-    print("res.get('eventId'):", res.get("eventId"))
-    print("business_id:", business_id)
-    print("review:", review)
-    
-    # Create review embedding
-    review_embedding = ReviewEmbeddingModel(
-        reservationId=reservation_id,
-        userId=res.get("userId"),
-        eventId=res.get("eventId"),
-        businessId=business_id,
-        rating=review.get("rating"),
-        text=review.get("comment"),
-        embedding=generate_embedding(review.get("comment"))
+    # Con la reseña anterior leída en la misma escritura, dos reseñas concurrentes no se suman dos veces
+    before = await run_db(repos.reservations.set_review, reservation_id, review)
+    # El embedding se genera en segundo plano: el trabajo se encola justo después de guardar la
+    # reseña, antes que cualquier otra escritura, para no dejar reseñas sin trabajo
+    await run_db(
+        enqueue_review_embedding,
+        repos,
+        reservation_id,
+        res.get("userId"),
+        res.get("eventId"),
+        review.get("rating"),
+        review.get("comment"),
     )
-    
-    print("review_embedding:", review_embedding)
-    
-    # Save the embedding in the database. 
-    review_embedding_col = db["reviewEmbeddings"]
-    review_embedding_col.insert_one(review_embedding.dict())
+    get_review_embedding_worker().notify()
+
+    if before is not None:
+        event = await run_db(repos.events.get, before.get("eventId"))
+        await record_counters(
+            (reputation.record_review, analytics.record_review, site_selection.record_review),
+            repos, event, before, review,
+        )
     
     return review
\ No newline at end of file
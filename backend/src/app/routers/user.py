@@ -1,39 +1,31 @@
 from fastapi import APIRouter, Depends, status, HTTPException
-from pymongo.database import Database
-from src.app.database.mongodb import get_database, get_mongo_client
+from src.app.database.mongodb import run_db
+from src.app.repositories.base import Repositories
+from src.app.repositories.provider import get_repositories
 from dotenv import load_dotenv
 from src.app.models.UserModel import UserCreateModel, UserModel, KYCModel, UserForRegistrationModel 
 from src.app.services.api_calls import run_kyc_match, call_api
 import os
 from datetime import datetime
 import uuid
+import logging
 
 load_dotenv()
 
-router = APIRouter(prefix="/users", tags=["users"])
-
-def get_db() -> Database:
-    uri = os.getenv("MONGODB_URI")
-    client = get_mongo_client(uri)
-    return get_database(client)
+logger = logging.getLogger(__name__)
 
-def convert_mongo_doc(doc):
-    """Convert MongoDB document to format expected by Pydantic models"""
-    if doc and "_id" in doc:
-        doc["_id"] = str(doc["_id"])
-    return doc
+router = APIRouter(prefix="/users", tags=["users"])
 
 # Create user
 @router.post("/", response_model=UserForRegistrationModel | dict, status_code=status.HTTP_201_CREATED, summary="6. Crear usuario")
 async def create_user(
     payload: UserCreateModel,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
-    col = db["users"]
     phone = payload.phone
     
     # Check if user already exists
-    existing_user = col.find_one({"kyc.phone": phone})
+    existing_user = await run_db(repos.users.find_by_phone, phone)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -70,11 +62,8 @@ async def create_user(
         
         # TODO: Validate KYC data 
         # Create KYC model instance for validation
-        result = call_api(phone=phone, scope="dpv:ResearchAndDevelopment#kyc-match:match", user_data=kyc_data_copy)
-        print("result:", result)
-        
+        result = await call_api(phone=phone, scope="dpv:ResearchAndDevelopment#kyc-match:match", user_data=kyc_data_copy)
         # Comprobar si el diccionario está vacío
-        print("RESULTTTTTTTT: ", result)
         if result:
             return result
         
@@ -99,10 +88,8 @@ async def create_user(
             "averageUserRating": 0.0,
         }
         
-        result = col.insert_one(user_data)
-        
         # Obtain the user id
-        user_id = result.inserted_id
+        user_id = await run_db(repos.users.create, user_data)
         # Create a UserForRegistrationModel
         user_for_registration = UserForRegistrationModel(id=user_id, name=payload.name, email=payload.email)
         # Return True if user was created successfully
@@ -110,13 +97,13 @@ async def create_user(
         
     except Exception as e:
         # If KYC validation or user creation fails, return False
-        print(f"Error creating user: {e}")
+        logger.exception("Error creating user: %s", e)
 
 
 @router.get("/{user_id}", summary="6. Obtener reputación de usuario")
 async def get_user_reputation(
     user_id: str,
-    db: Database = Depends(get_db),
+    repos: Repositories = Depends(get_repositories),
 ):
     return {"user_id": user_id, "score": 0.0, "breakdown": {}} 
 
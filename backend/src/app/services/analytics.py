@@ -0,0 +1,254 @@
+"""
+Time-bucketed analytics for the business dashboard.
+
+Every reservation state change adds to per-event counters in the
+`analyticsRollups` collection, in hourly, daily and weekly (Monday) UTC
+buckets at once, with one bulk of `$inc` upserts:
+
+  - reservation created (`record_reservation`): reservations;
+  - check-in (`record_checkin`): checkins, plus anomalies when flagged;
+  - anomaly reported after the check-in (`record_anomaly`);
+  - review (`record_review`): ratingSum and ratingCount (a replaced review
+    is taken out of its original bucket first).
+
+`query_analytics` serves any range from the buckets of one granularity
+(chosen from the range length when not given), so its cost depends on the
+number of buckets and events, never on the number of reservations.
+`rebuild_analytics` recomputes the buckets of a business from its
+reservations:
+
+Usage (from backend/):
+    python -m src.app.services.analytics rebuild [--business-id ID]
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from src.app.repositories.base import Repositories
+from src.app.services.reputation import ANOMALY_STATUSES, ATTENDED_STATUSES, checkin_time
+
+GRANULARITIES = ("hour", "day", "week")
+ANALYTICS_BATCH_SIZE = 500
+
+COUNTERS = ("reservations", "checkins", "anomalies", "ratingSum", "ratingCount")
+
+
+def analytics_max_buckets() -> int:
+    return int(os.getenv("ANALYTICS_MAX_BUCKETS", "2000"))
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Start of the bucket of `granularity` that contains `at`."""
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    day = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def next_bucket(start: datetime, granularity: str) -> datetime:
+    return start + {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}[granularity]
+
+
+def choose_granularity(start: datetime, end: datetime) -> str:
+    """Finest granularity that keeps a range of a dashboard chart readable."""
+    span = end - start
+    if span <= timedelta(days=2):
+        return "hour"
+    if span <= timedelta(days=120):
+        return "day"
+    return "week"
+
+
+def bucket_rows(business_id: str, event_id: str, at: datetime, amounts: Dict[str, float]) -> list:
+    """(key, amounts) rows of one change, one per granularity."""
+    amounts = {counter: amount for counter, amount in amounts.items() if amount}
+    if not amounts:
+        return []
+    return [
+        ({"businessId": business_id, "eventId": event_id, "granularity": granularity, "bucketStart": bucket_start(at, granularity)}, amounts)
+        for granularity in GRANULARITIES
+    ]
+
+
+def record_reservation(repos: Repositories, event: Optional[dict], reservation: dict):
+    """Count a new reservation (blocking: call through `run_db`)."""
+    business_id = (event or {}).get("businessId")
+    if business_id:
+        at = reservation.get("preverifiedAt") or datetime.utcnow()
+        repos.analytics.increment(bucket_rows(business_id, reservation["eventId"], at, {"reservations": 1}))
+
+
+def record_checkin(repos: Repositories, event: Optional[dict], reservation: dict, checkin: dict):
+    """
+    Count a check-in (blocking).
+
+    Args:
+        event (dict): The event of the reservation (None if it no longer exists).
+        reservation (dict): The reservation as it was right before the check-in
+            was written (what `set_checkin` returns).
+        checkin (dict): The new `checkin` subdocument.
+    """
+    previous = reservation.get("checkin") or {}
+    if previous.get("status") in ATTENDED_STATUSES or checkin.get("status") not in ATTENDED_STATUSES:
+        return
+    business_id = (event or {}).get("businessId")
+    if business_id:
+        amounts = {"checkins": 1, "anomalies": 1 if checkin["status"] in ANOMALY_STATUSES else 0}
+        at = checkin_time(checkin, datetime.utcnow())
+        repos.analytics.increment(bucket_rows(business_id, reservation["eventId"], at, amounts))
+
+
+def record_anomaly(repos: Repositories, event: Optional[dict], reservation: dict, status: str):
+    """Count an anomaly reported on a completed check-in (blocking)."""
+    previous = reservation.get("checkin") or {}
+    if previous.get("status") in ANOMALY_STATUSES or status not in ANOMALY_STATUSES:
+        return
+    business_id = (event or {}).get("businessId")
+    if business_id:
+        # En el bucket del check-in, igual que en rebuild_analytics (es la única hora guardada)
+        at = checkin_time(previous, datetime.utcnow())
+        repos.analytics.increment(bucket_rows(business_id, reservation["eventId"], at, {"anomalies": 1}))
+
+
+def record_review(repos: Repositories, event: Optional[dict], reservation: dict, review: dict):
+    """Count a review (blocking); a previous review of the reservation is taken out of its bucket."""
+    business_id = (event or {}).get("businessId")
+    if not business_id or review.get("rating") is None:
+        return
+    event_id = reservation["eventId"]
+    rows = bucket_rows(business_id, event_id, review.get("createdAt") or datetime.utcnow(), {"ratingSum": review["rating"], "ratingCount": 1})
+    previous = (reservation.get("checkin") or {}).get("review") or {}
+    if previous.get("rating") is not None and previous.get("createdAt"):
+        rows += bucket_rows(business_id, event_id, previous["createdAt"], {"ratingSum": -previous["rating"], "ratingCount": -1})
+    repos.analytics.increment(rows)
+
+
+def _summary(counters: Dict[str, float]) -> dict:
+    summary = {counter: counters.get(counter, 0) for counter in ("reservations", "checkins", "anomalies")}
+    summary["reviews"] = counters.get("ratingCount", 0)
+    summary["averageRating"] = round(counters["ratingSum"] / counters["ratingCount"], 2) if counters.get("ratingCount") else None
+    return summary
+
+
+def _add(target: Dict[str, float], bucket: dict):
+    for counter in COUNTERS:
+        target[counter] = target.get(counter, 0) + (bucket.get(counter) or 0)
+
+
+def query_analytics(
+    repos: Repositories,
+    business_id: str,
+    start: datetime,
+    end: datetime,
+    granularity: Optional[str] = None,
+    event_id: Optional[str] = None,
+) -> dict:
+    """
+    Dashboard data of a business over [start, end) (blocking).
+
+    The range is widened to whole buckets. Buckets without activity are
+    returned with zeros so charts get a continuous series.
+
+    Raises:
+        ValueError: if the granularity is unknown or the range has more than
+        `analytics_max_buckets()` buckets.
+
+    Returns:
+        dict: totals, one `series` entry per bucket and per-event totals.
+    """
+    granularity = granularity or choose_granularity(start, end)
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    first = bucket_start(start, granularity)
+    max_buckets = analytics_max_buckets()
+    starts = []
+    current = first
+    while current < end:
+        starts.append(current)
+        if len(starts) > max_buckets:
+            raise ValueError(f"The range has more than {max_buckets} {granularity} buckets, use a coarser granularity")
+        current = next_bucket(current, granularity)
+
+    by_bucket = {bucket: {} for bucket in starts}
+    by_event: Dict[str, Dict[str, float]] = {}
+    totals: Dict[str, float] = {}
+    for bucket in repos.analytics.find(business_id, granularity, first, current, event_id):
+        _add(by_bucket.setdefault(bucket["bucketStart"], {}), bucket)
+        _add(by_event.setdefault(bucket["eventId"], {}), bucket)
+        _add(totals, bucket)
+
+    return {
+        "business_id": business_id,
+        "granularity": granularity,
+        "start": first,
+        "end": current,
+        "totals": _summary(totals),
+        "series": [{"bucketStart": bucket, **_summary(counters)} for bucket, counters in sorted(by_bucket.items())],
+        "events": [{"eventId": event, **_summary(counters)} for event, counters in sorted(by_event.items())],
+    }
+
+
+def rebuild_analytics(repos: Repositories, business_id: str) -> int:
+    """
+    Recompute every bucket of a business from its reservations (blocking).
+
+    Anomalies reported after the check-in are counted at the check-in time,
+    since that is the only time stored. Returns the number of buckets.
+    """
+    buckets: Dict[tuple, dict] = {}
+
+    def add(event_id: str, at: datetime, amounts: Dict[str, float]):
+        for key, row_amounts in bucket_rows(business_id, event_id, at, amounts):
+            bucket = buckets.setdefault((event_id, key["granularity"], key["bucketStart"]), dict(key))
+            for counter, amount in row_amounts.items():
+                bucket[counter] = bucket.get(counter, 0) + amount
+
+    for event_ids in repos.events.iter_ids_by_business(business_id, ANALYTICS_BATCH_SIZE):
+        for reservations in repos.reservations.iter_by_events(event_ids, ANALYTICS_BATCH_SIZE):
+            for res in reservations:
+                event_id = res["eventId"]
+                if res.get("preverifiedAt"):
+                    add(event_id, res["preverifiedAt"], {"reservations": 1})
+                checkin = res.get("checkin") or {}
+                at = checkin_time(checkin)
+                if at and checkin.get("status") in ATTENDED_STATUSES:
+                    add(event_id, at, {"checkins": 1, "anomalies": 1 if checkin["status"] in ANOMALY_STATUSES else 0})
+                review = checkin.get("review") or {}
+                if review.get("rating") is not None and (review.get("createdAt") or at):
+                    add(event_id, review.get("createdAt") or at, {"ratingSum": review["rating"], "ratingCount": 1})
+
+    repos.analytics.replace_business(business_id, list(buckets.values()))
+    return len(buckets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the analytics rollups from the reservations.")
+    parser.add_argument("command", choices=("rebuild",))
+    parser.add_argument("--business-id", action="append", help="Business to rebuild (repeatable; default all)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from src.app.database.mongodb import get_client_options, get_database, get_mongo_client
+    from src.app.repositories.mongo import build_mongo_repositories
+
+    load_dotenv()
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI environment variable is required")
+    client = get_mongo_client(mongodb_uri, **get_client_options())
+    try:
+        repos = build_mongo_repositories(get_database(client))
+        business_ids = args.business_id or [business_id for batch in repos.businesses.iter_ids(ANALYTICS_BATCH_SIZE) for business_id in batch]
+        for business_id in business_ids:
+            print(f"📊 {business_id}: {rebuild_analytics(repos, business_id)} buckets")
+        print(f"✅ Rebuilt the analytics of {len(business_ids)} businesses")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Check-in verification orchestrator.
+
+After the reservation is loaded, the user and the event are fetched
+concurrently, then every enabled check (location, KYC, OTP) runs
+concurrently with its own timeout. Check-in latency is therefore close to
+the slowest check instead of the sum of all of them.
+
+Enabled checks come from CHECKIN_CHECKS (comma separated, default
+"location") and the per-check timeout from CHECKIN_CHECK_TIMEOUT_SECONDS.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from src.app.database.mongodb import run_db
+from src.app.repositories.base import Repositories
+from src.app.services.api_calls import call_api
+
+logger = logging.getLogger(__name__)
+
+LOCATION_SCOPE = "dpv:FraudPreventionAndDetection#device-location-read"
+KYC_SCOPE = "dpv:ResearchAndDevelopment#kyc-match:match"
+
+
+def enabled_checks() -> set:
+    return {check.strip() for check in os.getenv("CHECKIN_CHECKS", "location").split(",") if check.strip()}
+
+
+async def load_checkin_context(reservation: dict, repos: Repositories) -> Tuple[Optional[dict], Optional[dict]]:
+    """Load the user and the event of a reservation concurrently."""
+    return await asyncio.gather(
+        run_db(repos.users.get, reservation.get("userId")),
+        run_db(repos.events.get, reservation.get("eventId")),
+    )
+
+
+def is_location_verified(result) -> bool:
+    """
+    Interpret the `verificationResult` of the location API (TRUE, PARTIAL, FALSE...).
+
+    Anything else counts as not verified, including the `{"phone": False}`
+    that `call_api` returns when the authorization is rejected.
+    """
+    if isinstance(result, str):
+        return result.upper() in ("TRUE", "PARTIAL")
+    return result is True
+
+
+async def check_location(user: dict, event: dict) -> bool:
+    result = await call_api(
+        phone=user.get("kyc", {}).get("phone"),
+        scope=LOCATION_SCOPE,
+        user_data={
+            "latitude": event.get("latitude"),
+            "longitude": event.get("longitude")
+        }
+    )
+    logger.debug("Location verification result: %s", result)
+    return is_location_verified(result)
+
+
+async def check_kyc(user: dict) -> bool:
+    kyc = user.get("kyc") or {}
+    failed_fields = await call_api(
+        phone=kyc.get("phone"),
+        scope=KYC_SCOPE,
+        user_data={"name": kyc.get("name"), "email": kyc.get("email"), "phone": kyc.get("phone")},
+    )
+    # call_api devuelve los campos que no coinciden: vacío significa verificado
+    return not failed_fields
+
+
+async def check_otp(reservation: dict) -> Optional[bool]:
+    # TODO: verificación OTP real; hasta tener la API usamos la de la reserva
+    return reservation.get("otpVerified")
+
+
+async def run_check(name: str, coro, timeout: float) -> Optional[bool]:
+    """Run one check with its timeout; errors and timeouts count as not verified (None)."""
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Check-in %s check timed out after %.1fs", name, timeout)
+    except Exception as e:
+        logger.warning("Check-in %s check failed: %s", name, e)
+    return None
+
+
+async def verify_checkin(reservation: dict, repos: Repositories) -> Tuple[dict, dict]:
+    """
+    Run the check-in verification of a reservation.
+
+    Args:
+        reservation (dict): The reservation document.
+        repos (Repositories): The repositories.
+
+    Returns:
+        tuple: the new `checkin` subdocument and the event it was verified
+        against (so callers do not read it again). The status is "anomaly"
+        when an enabled check failed or could not be completed.
+    """
+    user, event = await load_checkin_context(reservation, repos)
+    if user is None or event is None:
+        raise LookupError("Usuario o evento no encontrado")
+
+    checks = enabled_checks()
+    timeout = float(os.getenv("CHECKIN_CHECK_TIMEOUT_SECONDS", "8"))
+    pending: Dict[str, object] = {}
+    if "location" in checks:
+        pending["location"] = check_location(user, event)
+    if "kyc" in checks:
+        pending["kyc"] = check_kyc(user)
+    if "otp" in checks:
+        pending["otp"] = check_otp(reservation)
+
+    outcomes = await asyncio.gather(*(run_check(name, coro, timeout) for name, coro in pending.items()))
+    results = dict(zip(pending, outcomes))
+
+    # Los checks desactivados conservan lo verificado al reservar
+    verified = {
+        "location": results["location"] if "location" in results else True,
+        "kyc": results["kyc"] if "kyc" in results else reservation.get("kycVerified", True),
+        "otp": results["otp"] if "otp" in results else reservation.get("otpVerified", True),
+    }
+    anomalies = [name for name, value in results.items() if value is not True]
+
+    checkin = {
+        "status": "anomaly" if anomalies else "completed",
+        "requestedAt": datetime.utcnow(),
+        "otpVerified": verified["otp"],
+        "locationVerified": verified["location"],
+        "kycVerified": verified["kyc"],
+        "completedAt": None,
+        "anomalies": anomalies,
+        "review": None,
+        "previous_anomaly_checkins": user.get("anomalyCheckins", 0) > 0,
+    }
+    return checkin, event
@@ -0,0 +1,281 @@
+"""
+Shared embedding service with a content-addressed cache.
+
+Texts are keyed by sha256(model + text). Lookups go through:
+
+1. an in-memory LRU of float32 vectors (EMBEDDING_CACHE_SIZE entries),
+2. a persistent tier (EMBEDDING_CACHE_BACKEND=mongo|file|none): the
+   `embeddingCache` collection or a local SQLite file (EMBEDDING_CACHE_PATH),
+3. the remote model, called once per batch of misses. Identical texts
+   requested concurrently by other threads wait for the same call.
+
+EMBEDDING_BACKEND=fake swaps Azure OpenAI for deterministic local vectors
+(benchmarks and offline runs). Fake vectors are keyed under
+"fake-<dimensions>" instead of the model name, so they never reach the
+entries of the real model in the persistent tier.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_CACHE_COLLECTION = "embeddingCache"
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of a (model, text) pair."""
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class FakeEmbeddings:
+    """
+    Deterministic stand-in for the embeddings model: each text maps to a fixed
+    pseudo-random unit vector seeded by its hash. No network calls.
+
+    Args:
+        dimensions (int): Vector size (3072 like text-embedding-3-large).
+    """
+
+    def __init__(self, dimensions: int = 3072):
+        self.dimensions = dimensions
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class MongoEmbeddingStore:
+    """Persistent tier in the `embeddingCache` collection (`_id` = content key)."""
+
+    def __init__(self, db: Database):
+        self.collection = db[EMBEDDING_CACHE_COLLECTION]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        docs = self.collection.find({"_id": {"$in": keys}}, {"embedding": 1})
+        return {doc["_id"]: np.asarray(doc["embedding"], dtype=np.float32) for doc in docs}
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = datetime.utcnow()
+        self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": key},
+                    {"$setOnInsert": {"model": model, "embedding": list(vector), "createdAt": now}},
+                    upsert=True,
+                )
+                for key, vector in items.items()
+            ],
+            ordered=False,
+        )
+
+
+class FileEmbeddingStore:
+    """Persistent tier in a local SQLite file, vectors stored as float32 blobs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, embedding BLOB)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, embedding) VALUES (?, ?, ?)",
+                [(key, model, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+
+class EmbeddingService:
+    """
+    Cached, request-coalescing front of a LangChain embeddings model.
+
+    Args:
+        model (str): Embedding model name (part of the cache key).
+        embeddings: LangChain embeddings instance; built lazily when omitted.
+        store: Persistent tier (MongoEmbeddingStore, FileEmbeddingStore or None).
+        memory_size (int): Entries kept in the in-memory LRU.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL, embeddings=None, store=None, memory_size: int = 2048):
+        self.model = model
+        if embeddings is None and os.getenv("EMBEDDING_BACKEND", "azure").lower() == "fake":
+            embeddings = FakeEmbeddings(int(os.getenv("EMBEDDING_FAKE_DIMENSIONS", "3072")))
+        self._embeddings = embeddings
+        # Parte "modelo" de las claves de caché: los vectores falsos no comparten claves con los reales
+        self.cache_model = f"fake-{embeddings.dimensions}" if isinstance(embeddings, FakeEmbeddings) else model
+        self.store = store
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "store_hits": 0, "remote": 0, "coalesced": 0}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from langchain_openai import AzureOpenAIEmbeddings
+            self._embeddings = AzureOpenAIEmbeddings(model=self.model)
+        return self._embeddings
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one text (cached)."""
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts (cached), preserving input order.
+
+        Only texts missing from both cache tiers and not already being
+        embedded by another caller are sent to the remote model, in one call.
+        """
+        keys = [embedding_key(self.cache_model, text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in unique:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+                    self.stats["memory_hits"] += 1
+
+        missing = [key for key in unique if key not in vectors]
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing)
+            with self._lock:
+                for key, vector in stored.items():
+                    self._remember(key, vector)
+                self.stats["store_hits"] += len(stored)
+            vectors.update(stored)
+            missing = [key for key in missing if key not in vectors]
+
+        # Coalesce: lo que ya está pidiendo otro hilo se espera; el resto lo pedimos nosotros
+        owned: Dict[str, Future] = {}
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            for key in missing:
+                if key in self._memory:
+                    vectors[key] = self._memory[key]
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self.stats["coalesced"] += 1
+                else:
+                    owned[key] = self._inflight[key] = Future()
+
+        if owned:
+            try:
+                owned_keys = list(owned)
+                result = self.embeddings.embed_documents([unique[key] for key in owned_keys])
+                fetched = dict(zip(owned_keys, result))
+                with self._lock:
+                    self.stats["remote"] += len(fetched)
+                    for key, vector in fetched.items():
+                        vectors[key] = np.asarray(vector, dtype=np.float32)
+                        self._remember(key, vectors[key])
+                        self._inflight.pop(key, None)
+                        owned[key].set_result(vectors[key])
+            except BaseException as exc:
+                with self._lock:
+                    for key, future in owned.items():
+                        self._inflight.pop(key, None)
+                        if not future.done():
+                            future.set_exception(exc)
+                raise
+            if self.store is not None:
+                try:
+                    self.store.put_many(self.cache_model, fetched)
+                except Exception as e:
+                    # La caché persistente es opcional: no fallamos la petición por ella
+                    logger.warning("Could not persist %d embeddings: %s", len(fetched), e)
+
+        for key, future in waiting.items():
+            vectors[key] = future.result()
+
+        return [vectors[key].tolist() for key in keys]
+
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def build_embedding_store(db: Optional[Database] = None):
+    """Persistent tier selected by EMBEDDING_CACHE_BACKEND (mongo, file or none)."""
+    backend = os.getenv("EMBEDDING_CACHE_BACKEND", "mongo").lower()
+    if backend == "mongo" and db is not None:
+        return MongoEmbeddingStore(db)
+    if backend == "file":
+        return FileEmbeddingStore(os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"))
+    return None
+
+
+def get_embedding_service(db: Optional[Database] = None, model: str = EMBEDDING_MODEL) -> EmbeddingService:
+    """
+    Get the process-wide embedding service for a model.
+
+    Args:
+        db (Database): Database for the `mongo` persistent tier; the first
+            call that passes one binds it.
+        model (str): Embedding model name.
+
+    Returns:
+        EmbeddingService: the shared service.
+    """
+    with _services_lock:
+        service = _services.get(model)
+        if service is None:
+            service = EmbeddingService(
+                model=model,
+                store=build_embedding_store(db),
+                memory_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+            )
+            _services[model] = service
+        elif service.store is None and db is not None:
+            service.store = build_embedding_store(db)
+        return service
@@ -0,0 +1,54 @@
+"""
+Streaming NDJSON exports of the history of a business.
+
+The documents are read from one database cursor in batches (each batch in the
+DB executor through `run_db`) and written as newline-delimited JSON as soon as
+they arrive, without building the whole list or validating every document
+with Pydantic. Memory stays bounded by the batch size whatever the dataset,
+and the first bytes go out with the first batch.
+"""
+
+import os
+from typing import AsyncIterator, Iterator, List
+
+from src.app.database.mongodb import run_db
+from src.app.helpers.serialization import dumps
+from src.app.repositories.base import Repositories
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_ndjson(docs: List[dict]) -> bytes:
+    """One JSON line per document (orjson, like the read endpoints)."""
+    return b"".join(dumps(doc) + b"\n" for doc in docs)
+
+
+async def iterate_batches(batches: Iterator[list]) -> AsyncIterator[list]:
+    """
+    Consume a blocking batch iterator from async code, one `run_db` call per batch.
+
+    The iterator (and its database cursor) is closed when the consumer stops
+    early, e.g. when the client disconnects.
+    """
+    try:
+        while True:
+            batch = await run_db(next, batches, None)
+            if batch is None:
+                break
+            yield batch
+    finally:
+        await run_db(batches.close)
+
+
+async def export_business_events(business_id: str, repos: Repositories) -> AsyncIterator[bytes]:
+    """NDJSON lines with every event of a business."""
+    async for events in iterate_batches(repos.events.iter_by_business(business_id, EXPORT_BATCH_SIZE)):
+        yield encode_ndjson(events)
+
+
+async def export_business_reservations(business_id: str, repos: Repositories) -> AsyncIterator[bytes]:
+    """NDJSON lines with every reservation of the events of a business."""
+    async for event_ids in iterate_batches(repos.events.iter_ids_by_business(business_id, EXPORT_BATCH_SIZE)):
+        async for reservations in iterate_batches(repos.reservations.iter_by_events(event_ids, EXPORT_BATCH_SIZE)):
+            yield encode_ndjson(reservations)
@@ -1,35 +1,92 @@
-
-import requests
 import os
-import logging
 import time
-import os
-import urllib.parse
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 import httpx
 import base64
 logger = logging.getLogger(__name__)
 
+# Valores por defecto; OGW_BASE_URL, OGW_CLIENT_ID y OGW_CLIENT_SECRET se leen al usarlos (después del .env)
 OGW_BASE = "https://sandbox.opengateway.telefonica.com/apigateway"
 CLIENT_ID = "0f57c7b9-9d68-497d-95ea-5ed4e589484c"
 CLIENT_SECRET = "5f7e0446-5c2b-4307-b1ad-b26f833009be"
-AUTH = (CLIENT_ID, CLIENT_SECRET)
 HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
 SCOPE = "dpv:ResearchAndDevelopment#kyc-match:match"
 REDIRECT_URI = "https://cuatro.studio/ogw/callback"
 
 
-def request_authorization(scope: str, phone: str = "") -> dict:
+def ogw_base_url() -> str:
+    return os.getenv("OGW_BASE_URL", OGW_BASE).rstrip("/")
+
+
+def ogw_credentials() -> Tuple[str, str]:
+    """Client ID and secret of the Open Gateway application."""
+    return os.getenv("OGW_CLIENT_ID", CLIENT_ID), os.getenv("OGW_CLIENT_SECRET", CLIENT_SECRET)
+
+
+def basic_auth_headers() -> Dict[str, str]:
+    """Headers of the Basic-authenticated CIBA calls (bc-authorize, token)."""
+    return _basic_auth_headers(*ogw_credentials())
+
+
+@lru_cache(maxsize=4)
+def _basic_auth_headers(client_id: str, client_secret: str) -> Dict[str, str]:
+    # Cabecera Basic calculada una sola vez por credenciales
+    return {
+        "Authorization": "Basic " + base64.b64encode(f"{client_id}:{client_secret}".encode()).decode(),
+        "Accept": "application/json",
+        "Content-Type": "application/x-www-form-urlencoded"
+    }
+
+# Cliente HTTP compartido por todas las llamadas a Open Gateway (keep-alive)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def build_ogw_client() -> httpx.AsyncClient:
+    """
+    Build the pooled async client for Open Gateway.
+
+    Timeouts and pool size come from OGW_CONNECT_TIMEOUT, OGW_READ_TIMEOUT and
+    OGW_MAX_CONNECTIONS; the base URL from OGW_BASE_URL.
+    """
+    timeout = httpx.Timeout(
+        float(os.getenv("OGW_READ_TIMEOUT", "10")),
+        connect=float(os.getenv("OGW_CONNECT_TIMEOUT", "3")),
+    )
+    max_connections = int(os.getenv("OGW_MAX_CONNECTIONS", "50"))
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(
+        base_url=ogw_base_url() + "/",
+        timeout=timeout,
+        limits=limits,
+    )
+
+
+def init_ogw_client() -> httpx.AsyncClient:
+    """Create the shared client (called from the app lifespan)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_ogw_client()
+    return _client
+
+
+async def close_ogw_client():
+    """Close the shared client and its connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_ogw_client() -> httpx.AsyncClient:
+    """Get the shared client, creating it if the lifespan did not (scripts)."""
+    return init_ogw_client()
+
+
+async def request_authorization(scope: str, phone: str = "") -> dict:
     try:
-        print("Solicitando autorización para el teléfono:", phone)
-        client_id = "0f57c7b9-9d68-497d-95ea-5ed4e589484c"
-        client_secret = "5f7e0446-5c2b-4307-b1ad-b26f833009be"
-
-        auth = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
-        headers = {
-            "Authorization": f"Basic {auth}",
-            "Accept": "application/json",
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
         data = {
             "login_hint": f"tel:{phone}",  # +34636260852
             #"scope": "dpv:FraudPreventionAndDetection#device-location-read"
@@ -37,39 +94,109 @@ def request_authorization(scope: str, phone: str = "") -> dict:
             "scope": scope
         }
 
-        response = httpx.post("https://sandbox.opengateway.telefonica.com/apigateway/bc-authorize",
-                            headers=headers, data=data)
-        print("response:", response.text)
+        response = await get_ogw_client().post("bc-authorize", headers=basic_auth_headers(), data=data)
         auth_req_id = response.json().get("auth_req_id")
         return auth_req_id
     except Exception as e:
-        print("Error al solicitar autorización:", e)
+        logger.warning("Error al solicitar autorización: %s", e)
         return None
 
-def get_access_token_from_auth_req_id(auth_req_id: str) -> str:
-    client_id = "0f57c7b9-9d68-497d-95ea-5ed4e589484c"
-    client_secret = "5f7e0446-5c2b-4307-b1ad-b26f833009be"
-
-    auth = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
-    headers = {
-        "Authorization": f"Basic {auth}",
-        "Accept": "application/json",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-
+async def fetch_access_token(auth_req_id: str) -> dict:
+    """Exchange a CIBA auth_req_id for the token endpoint response (access_token, expires_in...)."""
     data = {
         "grant_type": "urn:openid:params:grant-type:ciba",
         "auth_req_id": auth_req_id
     }
 
-    response = httpx.post(
-        "https://sandbox.opengateway.telefonica.com/apigateway/token",
-        headers=headers,
-        data=data
-    )
-    token_data = response.json()
+    response = await get_ogw_client().post("token", headers=basic_auth_headers(), data=data)
     if response.status_code != 200:
         raise Exception(f"Error al obtener el access_token: {response.status_code} - {response.text}")
 
-    token_data = response.json()
-    return token_data["access_token"]
\ No newline at end of file
+    return response.json()
+
+async def get_access_token_from_auth_req_id(auth_req_id: str) -> str:
+    token_data = await fetch_access_token(auth_req_id)
+    return token_data["access_token"]
+
+
+class AccessTokenCache:
+    """
+    CIBA access tokens cached per (phone, scope).
+
+    A token is reused until `refresh_margin` seconds before its `expires_in`;
+    concurrent requests for the same key share a single bc-authorize + token
+    exchange.
+
+    Args:
+        refresh_margin (float): Seconds before expiry at which a new token is requested.
+        default_ttl (float): Lifetime assumed when the response has no `expires_in`.
+    """
+
+    def __init__(self, refresh_margin: float = 30.0, default_ttl: float = 300.0):
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self._tokens: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.stats = {"hits": 0, "fetches": 0, "coalesced": 0}
+
+    async def _fetch(self, phone: str, scope: str) -> Optional[str]:
+        auth_req_id = await request_authorization(scope=scope, phone=phone)
+        if not auth_req_id:
+            return None
+        token_data = await fetch_access_token(auth_req_id)
+        expires_in = float(token_data.get("expires_in") or self.default_ttl)
+        self._tokens[(phone, scope)] = (token_data["access_token"], time.monotonic() + expires_in)
+        return token_data["access_token"]
+
+    async def get(self, phone: str, scope: str) -> Optional[str]:
+        """
+        Get a valid access token for a phone and scope.
+
+        Returns:
+            str: the access token, or None when the authorization was rejected.
+        """
+        key = (phone, scope)
+        cached = self._tokens.get(key)
+        if cached and time.monotonic() < cached[1] - self.refresh_margin:
+            self.stats["hits"] += 1
+            return cached[0]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats["fetches"] += 1
+        try:
+            token = await self._fetch(phone, scope)
+            future.set_result(token)
+            return token
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el aviso de excepción no recuperada si nadie más esperaba
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, phone: str, scope: str):
+        """Forget a token (e.g. after the API rejected it)."""
+        self._tokens.pop((phone, scope), None)
+
+
+_token_cache: Optional[AccessTokenCache] = None
+
+
+def get_token_cache() -> AccessTokenCache:
+    """Get the process-wide access token cache."""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = AccessTokenCache(
+            refresh_margin=float(os.getenv("OGW_TOKEN_REFRESH_MARGIN_SECONDS", "30")),
+        )
+    return _token_cache
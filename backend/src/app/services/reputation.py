@@ -0,0 +1,325 @@
+"""
+Business reputation, maintained incrementally.
+
+Each business has one `businessReputation` document with counters that are
+updated with atomic increments as things happen:
+
+  - check-in (`record_checkin`): attended reservations, and anomalies when
+    the verification flagged one;
+  - anomaly reported after the check-in (`record_anomaly`);
+  - review (`record_review`): rating sum and count (a replaced review is
+    taken out first);
+  - no-shows (`settle_no_shows`): once an event has ended, its reservations
+    without check-in are counted. A periodic task in the app settles ended
+    events; each event is leased first so two runs do not count it twice,
+    and only marked settled once its no-shows are stored (a run that fails
+    halfway leaves the lease to expire and the event is retried).
+
+Every counter is kept twice: all-time, and time-decayed with a half-life of
+REPUTATION_HALF_LIFE_DAYS so that recent behaviour weighs more. Decay uses
+forward weights: an event at time t adds 2^((t - DECAY_EPOCH) / half-life),
+and reads divide by the weight of "now". Increments stay plain `$inc`s and
+nothing has to be rewritten as time passes.
+
+Reading a reputation (`get_reputation`) is one document read plus a few
+arithmetic operations. `rebuild_reputation` recomputes the counters of a
+business from its events and reservations; run it after changing the
+half-life or the counting rules:
+
+Usage (from backend/):
+    python -m src.app.services.reputation rebuild [--business-id ID]
+    python -m src.app.services.reputation settle
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from src.app.database.mongodb import run_db
+from src.app.repositories.base import Repositories
+
+logger = logging.getLogger(__name__)
+
+REPUTATION_BATCH_SIZE = 500
+# Tiempo que una ejecución de settle_no_shows se reserva un evento antes de que otra lo reintente
+SETTLE_LEASE = timedelta(minutes=5)
+# Origen de los pesos del decaimiento: cambiarlo obliga a reconstruir
+DECAY_EPOCH = datetime(2025, 1, 1)
+
+# Puntuación 0-100: media de valoraciones suavizada, asistencia y check-ins sin anomalías
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5.0
+SCORE_WEIGHTS = {"rating": 0.6, "attendance": 0.25, "integrity": 0.15}
+
+# Estados de check-in que cuentan como asistencia (y los que además son anomalía)
+ATTENDED_STATUSES = ("completed", "anomaly", "trouble")
+ANOMALY_STATUSES = ("anomaly", "trouble")
+
+COUNTERS = ("ratingSum", "ratingCount", "checkins", "anomalies", "noShows")
+
+
+def reputation_half_life_days() -> float:
+    """REPUTATION_HALF_LIFE_DAYS, read when used (after .env is loaded)."""
+    return float(os.getenv("REPUTATION_HALF_LIFE_DAYS", "90"))
+
+
+def reputation_settle_seconds() -> float:
+    """REPUTATION_SETTLE_SECONDS: interval of the no-show settler (0 disables it)."""
+    return float(os.getenv("REPUTATION_SETTLE_SECONDS", "300"))
+
+
+def decay_weight(at: datetime, half_life_days: Optional[float] = None) -> float:
+    """Forward-decay weight of something that happened at `at`."""
+    half_life_days = half_life_days or reputation_half_life_days()
+    return 2.0 ** ((at - DECAY_EPOCH).total_seconds() / (half_life_days * 86400))
+
+
+def counter_increments(at: datetime, half_life_days: Optional[float] = None, **amounts) -> Dict[str, float]:
+    """All-time and decayed increments of some counters, for something that happened at `at`."""
+    weight = decay_weight(at, half_life_days)
+    increments = {}
+    for counter, amount in amounts.items():
+        if amount:
+            increments[counter] = amount
+            increments[f"decayed.{counter}"] = amount * weight
+    return increments
+
+
+def checkin_time(checkin: dict, default: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    UTC time a check-in is counted at: its `requestedAt`, stamped by `verify_checkin`.
+
+    The live hooks and the rebuilds both use it, so a rebuild puts every
+    check-in (and an anomaly reported on it) where the live hook did.
+    """
+    return checkin.get("requestedAt") or default
+
+
+def record_checkin(repos: Repositories, event: Optional[dict], reservation: dict, checkin: dict):
+    """
+    Count a check-in of a reservation (blocking: call through `run_db`).
+
+    Args:
+        event (dict): The event of the reservation (None if it no longer exists).
+        reservation (dict): The reservation as it was right before the check-in
+            was written (what `set_checkin` returns).
+        checkin (dict): The new `checkin` subdocument.
+    """
+    previous = reservation.get("checkin") or {}
+    if previous.get("status") in ATTENDED_STATUSES or checkin.get("status") not in ATTENDED_STATUSES:
+        return
+    business_id = (event or {}).get("businessId")
+    if not business_id:
+        return
+    now = datetime.utcnow()
+    anomalies = 1 if checkin["status"] in ANOMALY_STATUSES else 0
+    repos.reputation.increment(business_id, counter_increments(checkin_time(checkin, now), checkins=1, anomalies=anomalies), now)
+
+
+def record_anomaly(repos: Repositories, event: Optional[dict], reservation: dict, status: str):
+    """Count an anomaly reported on a completed check-in (blocking)."""
+    previous = reservation.get("checkin") or {}
+    if previous.get("status") in ANOMALY_STATUSES or status not in ANOMALY_STATUSES:
+        return
+    business_id = (event or {}).get("businessId")
+    if not business_id:
+        return
+    now = datetime.utcnow()
+    repos.reputation.increment(business_id, counter_increments(checkin_time(previous, now), anomalies=1), now)
+
+
+def record_review(repos: Repositories, event: Optional[dict], reservation: dict, review: dict):
+    """
+    Count a review (blocking). If the reservation already had one, it is
+    taken out first, so the reservation still counts once.
+    """
+    business_id = (event or {}).get("businessId")
+    if not business_id or review.get("rating") is None:
+        return
+    now = datetime.utcnow()
+    increments = counter_increments(review.get("createdAt") or now, ratingSum=review["rating"], ratingCount=1)
+    previous = (reservation.get("checkin") or {}).get("review") or {}
+    if previous.get("rating") is not None:
+        removed = counter_increments(previous.get("createdAt") or now, ratingSum=-previous["rating"], ratingCount=-1)
+        for key, amount in removed.items():
+            increments[key] = increments.get(key, 0) + amount
+    repos.reputation.increment(business_id, increments, now)
+
+
+def settle_no_shows(repos: Repositories, now: Optional[datetime] = None) -> int:
+    """
+    Count the no-shows of every ended event not settled yet (blocking).
+
+    Returns:
+        int: number of events settled by this call.
+    """
+    now = now or datetime.utcnow()
+    settled = 0
+    for events in repos.events.iter_ended_unsettled(now, REPUTATION_BATCH_SIZE):
+        for event in events:
+            # Lease: dos ejecuciones a la vez no lo cuentan dos veces, y si esta falla otra lo reintenta
+            if not repos.events.claim_settlement(event["_id"], now, now + SETTLE_LEASE):
+                continue
+            try:
+                no_shows = repos.reservations.count_no_shows(event["_id"])
+                if no_shows and event.get("businessId"):
+                    repos.reputation.increment(event["businessId"], counter_increments(event["end"], noShows=no_shows), now)
+            except Exception:
+                logger.exception("Error settling no-shows of event %s; retried when the lease expires", event["_id"])
+                continue
+            # Solo se marca liquidado cuando el incremento ya está guardado
+            if repos.events.mark_settled(event["_id"], now):
+                settled += 1
+    return settled
+
+
+async def settle_periodically(repos: Repositories, interval: float):
+    """App task: settle the no-shows of ended events every `interval` seconds."""
+    while True:
+        try:
+            settled = await run_db(settle_no_shows, repos)
+            if settled:
+                logger.info("Settled no-shows of %d ended events", settled)
+        except Exception:
+            logger.exception("Error settling no-shows")
+        await asyncio.sleep(interval)
+
+
+def rebuild_reputation(repos: Repositories, business_id: str, now: Optional[datetime] = None) -> dict:
+    """
+    Recompute the counters of a business from its events and reservations (blocking).
+
+    Ended events are settled along the way. Increments made by requests
+    while the rebuild runs are overwritten: run it when the business is quiet.
+
+    Returns:
+        dict: the stored counters.
+    """
+    now = now or datetime.utcnow()
+    half_life_days = reputation_half_life_days()
+    doc = {counter: 0 for counter in COUNTERS}
+    doc["decayed"] = {counter: 0.0 for counter in COUNTERS}
+
+    def add(at: datetime, **amounts):
+        for key, amount in counter_increments(at, half_life_days, **amounts).items():
+            if key.startswith("decayed."):
+                doc["decayed"][key[len("decayed."):]] += amount
+            else:
+                doc[key] += amount
+
+    for events in repos.events.iter_by_business(business_id, REPUTATION_BATCH_SIZE):
+        ends = {event["_id"]: event.get("end") for event in events}
+        ended = {event_id: end for event_id, end in ends.items() if end and end < now}
+        no_shows = dict.fromkeys(ended, 0)
+        for reservations in repos.reservations.iter_by_events(list(ends), REPUTATION_BATCH_SIZE):
+            for res in reservations:
+                checkin = res.get("checkin")
+                if checkin is None:
+                    if res.get("eventId") in no_shows and res.get("cancelledAt") is None:
+                        no_shows[res["eventId"]] += 1
+                    continue
+                at = checkin_time(checkin, now)
+                if checkin.get("status") in ATTENDED_STATUSES:
+                    add(at, checkins=1, anomalies=1 if checkin["status"] in ANOMALY_STATUSES else 0)
+                review = checkin.get("review") or {}
+                if review.get("rating") is not None:
+                    add(review.get("createdAt") or at, ratingSum=review["rating"], ratingCount=1)
+        for event_id, end in ended.items():
+            add(end, noShows=no_shows[event_id])
+            repos.events.mark_settled(event_id, now)
+
+    doc.update({"updatedAt": now, "rebuiltAt": now})
+    repos.reputation.replace(business_id, doc)
+    return doc
+
+
+def _rate(part: float, total: float) -> float:
+    return part / total if total > 0 else 0.0
+
+
+def compute_reputation(business_id: str, doc: Optional[dict], now: Optional[datetime] = None) -> dict:
+    """
+    Score (0-100) and breakdown of a reputation document (None: no activity yet).
+
+    Recent components come from the decayed counters; the all-time ones are
+    returned alongside for reference.
+    """
+    doc = doc or {}
+    decayed = doc.get("decayed") or {}
+    half_life_days = reputation_half_life_days()
+    scale = 1.0 / decay_weight(now or datetime.utcnow(), half_life_days)
+    recent = {counter: (decayed.get(counter) or 0.0) * scale for counter in COUNTERS}
+
+    # Media bayesiana: con pocas reseñas la valoración tiende a RATING_PRIOR_MEAN
+    rating = (recent["ratingSum"] + RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT) / (recent["ratingCount"] + RATING_PRIOR_WEIGHT)
+    no_show_rate = _rate(recent["noShows"], recent["checkins"] + recent["noShows"])
+    anomaly_rate = _rate(recent["anomalies"], recent["checkins"])
+    components = {
+        "rating": (rating - 1) / 4,
+        "attendance": 1 - no_show_rate,
+        "integrity": 1 - anomaly_rate,
+    }
+    score = 100 * sum(SCORE_WEIGHTS[name] * value for name, value in components.items())
+
+    return {
+        "business_id": business_id,
+        "score": round(score, 1),
+        "breakdown": {
+            "rating": round(rating, 2),
+            "noShowRate": round(no_show_rate, 4),
+            "anomalyRate": round(anomaly_rate, 4),
+            "components": {name: round(value, 4) for name, value in components.items()},
+            "weights": SCORE_WEIGHTS,
+            "recent": {counter: round(value, 2) for counter, value in recent.items()},
+            "allTime": {
+                "ratingAverage": round(_rate(doc.get("ratingSum") or 0, doc.get("ratingCount") or 0), 2),
+                **{counter: doc.get(counter) or 0 for counter in COUNTERS},
+            },
+            "halfLifeDays": half_life_days,
+            "updatedAt": doc.get("updatedAt"),
+        },
+    }
+
+
+def get_reputation(repos: Repositories, business_id: str) -> Optional[dict]:
+    """Reputation of a business (blocking); None if the business does not exist."""
+    doc = repos.reputation.get(business_id)
+    if doc is None and repos.businesses.get(business_id) is None:
+        return None
+    return compute_reputation(business_id, doc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the business reputation counters.")
+    parser.add_argument("command", choices=("rebuild", "settle"), help="rebuild: recompute from scratch; settle: count the no-shows of ended events")
+    parser.add_argument("--business-id", action="append", help="Business to rebuild (repeatable; default all)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from src.app.database.mongodb import get_client_options, get_database, get_mongo_client
+    from src.app.repositories.mongo import build_mongo_repositories
+
+    load_dotenv()
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI environment variable is required")
+    client = get_mongo_client(mongodb_uri, **get_client_options())
+    try:
+        repos = build_mongo_repositories(get_database(client))
+        if args.command == "settle":
+            print(f"✅ Settled no-shows of {settle_no_shows(repos)} ended events")
+            return
+        business_ids = args.business_id or [business_id for batch in repos.businesses.iter_ids(REPUTATION_BATCH_SIZE) for business_id in batch]
+        for business_id in business_ids:
+            doc = rebuild_reputation(repos, business_id)
+            print(f"⭐ {business_id}: score {compute_reputation(business_id, doc)['score']}")
+        print(f"✅ Rebuilt the reputation of {len(business_ids)} businesses")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Background generation of review embeddings.
+
+`create_review` only persists the review and enqueues a job in the
+review embedding outbox (`reviewEmbeddingJobs`, keyed by reservation).
+The worker, started in the app lifespan, claims pending jobs in batches,
+resolves their businessId with one query, embeds all texts in one call and
+upserts the `reviewEmbeddings` documents. Failed batches are retried with
+exponential backoff; jobs that keep failing, or that cannot succeed (event
+not found), are moved to `reviewEmbeddingDeadLetters` so nothing is lost
+silently. A job that cannot be embedded or validated is dead-lettered
+alone; its batchmates go on.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from src.app.database.mongodb import run_db
+from src.app.models.ReviewEmbeddingModel import ReviewEmbeddingModel
+from src.app.repositories.base import Repositories
+from src.app.services.embeddings import get_embedding_service
+from src.app.services.user_profiles import get_user_profiles
+from src.app.services.vector_search import get_vector_search
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_review_embedding(repos: Repositories, reservation_id: str, user_id: str, event_id: str, rating, text: str):
+    """
+    Record a pending review embedding job (one per reservation; a newer review replaces it).
+
+    Args:
+        repos (Repositories): The repositories.
+        reservation_id (str): Reviewed reservation.
+        user_id (str): Author of the review.
+        event_id (str): Reviewed event.
+        rating: Review rating.
+        text (str): Review comment to embed.
+    """
+    now = datetime.utcnow()
+    repos.review_embedding_jobs.enqueue(
+        str(reservation_id),
+        {
+            "userId": user_id,
+            "eventId": event_id,
+            "rating": rating,
+            "text": text,
+            "status": "pending",
+            "attempts": 0,
+            "nextAttemptAt": now,
+            "createdAt": now,
+        },
+    )
+
+
+def requeue_dead_letters(repos: Repositories) -> int:
+    """Move every dead-lettered job back to the queue. Returns how many were requeued."""
+    requeued = 0
+    for job in repos.review_embedding_jobs.list_dead_letters():
+        enqueue_review_embedding(repos, job["_id"], job.get("userId"), job.get("eventId"), job.get("rating"), job.get("text"))
+        repos.review_embedding_jobs.delete_dead_letter(job["_id"])
+        requeued += 1
+    return requeued
+
+
+class ReviewEmbeddingWorker:
+    """
+    Asyncio worker that drains the review embedding jobs.
+
+    Jobs are claimed with a lease, so a job held by a crashed process is
+    picked up again once its lease expires, also by other processes.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 16,
+        poll_seconds: float = 5.0,
+        max_attempts: int = 5,
+        backoff_seconds: float = 2.0,
+        lease_seconds: float = 120.0,
+    ):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        self._repos: Optional[Repositories] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self):
+        """Wake the worker up right away (called after enqueueing)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, repos: Repositories):
+        self._repos = repos
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await run_db(self.process_batch, self._repos)
+            except Exception:
+                logger.exception("Review embedding worker iteration failed")
+                processed = 0
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _dead_letter(self, repos: Repositories, job: dict, error: str):
+        repos.review_embedding_jobs.dead_letter(job, error)
+        logger.error("Review embedding job %s dead-lettered: %s", job["_id"], error)
+
+    def _retry(self, repos: Repositories, jobs: List[dict], error: str):
+        now = datetime.utcnow()
+        for job in jobs:
+            attempts = job.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                self._dead_letter(repos, {**job, "attempts": attempts}, error)
+                continue
+            repos.review_embedding_jobs.reschedule(job["_id"], job["claimId"], {
+                "attempts": attempts,
+                "lastError": error,
+                "nextAttemptAt": now + timedelta(seconds=self.backoff_seconds * 2 ** attempts),
+            })
+
+    def process_batch(self, repos: Repositories) -> int:
+        """
+        Claim and process one batch of jobs (blocking; runs in the DB executor).
+
+        Returns:
+            int: number of jobs claimed.
+        """
+        claim_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        jobs = repos.review_embedding_jobs.claim(claim_id, self.batch_size, now + timedelta(seconds=self.lease_seconds), now)
+        if not jobs:
+            return 0
+
+        # businessId de todos los eventos del lote en una sola consulta
+        events = repos.events.get_many([job.get("eventId") for job in jobs])
+        ready = []
+        for job in jobs:
+            if job.get("eventId") not in events:
+                self._dead_letter(repos, job, "Evento no encontrado")
+            elif not isinstance(job.get("text"), str) or not job["text"].strip():
+                self._dead_letter(repos, job, "Reseña sin texto")
+            else:
+                ready.append(job)
+        if not ready:
+            return len(jobs)
+
+        # Fallos transitorios (embedding, escritura): se reintenta el lote entero
+        try:
+            vectors = get_embedding_service(repos.db).embed_documents([job["text"] for job in ready])
+        except Exception as e:
+            logger.warning("Review embedding batch of %d failed: %s", len(ready), e)
+            self._retry(repos, ready, str(e))
+            return len(jobs)
+
+        # Un trabajo inválido va a dead letters él solo, sin arrastrar al resto del lote
+        now = datetime.utcnow()
+        built, docs = [], []
+        for job, vector in zip(ready, vectors):
+            try:
+                review_embedding = ReviewEmbeddingModel(
+                    reservationId=job["_id"],
+                    userId=job.get("userId"),
+                    eventId=job["eventId"],
+                    businessId=events[job["eventId"]].get("businessId"),
+                    rating=job.get("rating"),
+                    text=job["text"],
+                    embedding=vector,
+                    createdAt=now,
+                    updatedAt=now,
+                )
+            except Exception as e:
+                self._dead_letter(repos, job, str(e))
+                continue
+            built.append(job)
+            docs.append(review_embedding.dict(exclude={"id"}))
+        if not built:
+            return len(jobs)
+
+        try:
+            written = repos.review_embeddings.upsert_many(docs)
+        except Exception as e:
+            logger.warning("Review embedding batch of %d failed: %s", len(built), e)
+            self._retry(repos, built, str(e))
+            return len(jobs)
+
+        # Índice vectorial en memoria y perfiles de usuario al día; los embeddings ya están
+        # guardados, así que un fallo aquí se registra y el lote se confirma igualmente
+        for doc in written:
+            try:
+                if doc["_id"] is not None and repos.db is not None:
+                    get_vector_search().upsert("reviewEmbeddings", doc)
+                get_user_profiles().record_review(doc["userId"], doc["eventId"], doc.get("rating"), repos)
+            except Exception:
+                logger.exception("Could not index review embedding of reservation %s", doc.get("reservationId"))
+
+        repos.review_embedding_jobs.ack([job["_id"] for job in built], claim_id)
+        return len(jobs)
+
+
+_worker: Optional[ReviewEmbeddingWorker] = None
+
+
+def get_review_embedding_worker() -> ReviewEmbeddingWorker:
+    """Get the process-wide review embedding worker."""
+    global _worker
+    if _worker is None:
+        _worker = ReviewEmbeddingWorker(
+            batch_size=int(os.getenv("REVIEW_EMBEDDING_BATCH_SIZE", "16")),
+            poll_seconds=float(os.getenv("REVIEW_EMBEDDING_POLL_SECONDS", "5")),
+            max_attempts=int(os.getenv("REVIEW_EMBEDDING_MAX_ATTEMPTS", "5")),
+        )
+    return _worker
@@ -0,0 +1,174 @@
+"""
+Reviews analysis by category: fixed category prompts, their precomputed
+query vectors and the long-lived chat model used to summarize reviews.
+"""
+
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional
+
+from langchain_openai import AzureChatOpenAI
+from pymongo.database import Database
+
+from src.app.database.mongodb import run_db
+from src.app.repositories.base import Repositories
+from src.app.services.embeddings import embedding_key, get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = "gpt-4o-mini"
+
+#Diccionario de Categorías y el prompt para el modelo de lenguaje
+CATEGORIAS = {
+    "Ambiente": "Quiero saber cómo se percibe mi negocio en términos de ambiente, incluyendo aspectos como limpieza, decoración, y comodidad.",
+    "Seguridad": " Quiero saber cómo se percibe mi negocio en términos de seguridad, incluyendo la percepción de los clientes sobre la seguridad física y la protección de datos.",
+    "Atención al Cliente": "Quiero saber cómo se percibe mi negocio en términos de atención al cliente, incluyendo la amabilidad, rapidez y eficacia del servicio.",
+}
+
+# Vectores de consulta de cada categoría, calculados una sola vez por proceso
+_category_vectors: Dict[str, List[float]] = {}
+_category_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_chat_model() -> AzureChatOpenAI:
+    """Chat model shared by all requests (keeps its HTTP connection pool)."""
+    return AzureChatOpenAI(model=CHAT_MODEL, temperature=0.2, streaming=True)
+
+
+def _snapshot_path() -> Optional[str]:
+    return os.getenv("CATEGORY_VECTORS_PATH")
+
+
+def _load_snapshot(model: str) -> Dict[str, List[float]]:
+    """Read the category vectors snapshot, keeping only entries whose prompt and model still match."""
+    path = _snapshot_path()
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    return {
+        categoria: entry["embedding"]
+        for categoria, entry in snapshot.items()
+        if categoria in CATEGORIAS and entry.get("key") == embedding_key(model, CATEGORIAS[categoria])
+    }
+
+
+def _save_snapshot(model: str, vectors: Dict[str, List[float]]):
+    path = _snapshot_path()
+    if not path:
+        return
+    snapshot = {
+        categoria: {"key": embedding_key(model, CATEGORIAS[categoria]), "embedding": vector}
+        for categoria, vector in vectors.items()
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+
+
+def load_category_vectors(db: Optional[Database] = None) -> Dict[str, List[float]]:
+    """
+    Compute (or load from the CATEGORY_VECTORS_PATH snapshot) the query vector of every category.
+
+    Args:
+        db (Database): Database for the embedding cache's persistent tier.
+
+    Returns:
+        dict: query vector per category.
+    """
+    with _category_lock:
+        missing = [categoria for categoria in CATEGORIAS if categoria not in _category_vectors]
+        if not missing:
+            return _category_vectors
+        service = get_embedding_service(db)
+        _category_vectors.update(_load_snapshot(service.cache_model))
+        missing = [categoria for categoria in CATEGORIAS if categoria not in _category_vectors]
+        if missing:
+            vectors = service.embed_documents([CATEGORIAS[categoria] for categoria in missing])
+            _category_vectors.update(zip(missing, vectors))
+            _save_snapshot(service.cache_model, _category_vectors)
+        return _category_vectors
+
+
+def warm_category_vectors(db: Optional[Database] = None):
+    """Startup hook: precompute the category vectors without failing the app if the model is down."""
+    try:
+        load_category_vectors(db)
+    except Exception as e:
+        logger.warning("Could not precompute category vectors, they will be computed on first use: %s", e)
+
+
+def get_category_vector(categoria: str, db: Optional[Database] = None) -> List[float]:
+    """Query vector of one category."""
+    vector = _category_vectors.get(categoria)
+    if vector is None:
+        vector = load_category_vectors(db)[categoria]
+    return vector
+
+
+def find_category_reviews(business_id: str, categoria: str, repos: Repositories, min_score: float = 0.5) -> List[str]:
+    """
+    Find the business reviews closest to a category.
+
+    Args:
+        business_id (str): The business whose reviews are searched.
+        categoria (str): A key of CATEGORIAS.
+        repos (Repositories): The repositories.
+        min_score (float): Minimum vector search score.
+
+    Returns:
+        list: Texts of the matching reviews.
+    """
+    list_reviews = repos.review_embeddings.search(
+        get_category_vector(categoria, repos.db),
+        limit=5,
+        filter={"businessId": business_id},
+    )
+    #Nos quedamos con la lista de reviews solo el texto y solo si el score es mayor a 0.5
+    return [f"{review['text']}" for review in list_reviews if review['score'] > min_score]
+
+
+def build_reviews_prompt(categoria: str, list_reviews: List[str]) -> str:
+    """Prompt asking the model to summarize the reviews of one category."""
+    return f"""
+        Eres un experto en análisis de opiniones de clientes. Tu tarea es analizar las opiniones de los clientes sobre un negocio específico y proporcionar un resumen detallado de la percepción del cliente en una categoría específica.
+
+        Categoría: {categoria}
+        Descripción de la categoría: {CATEGORIAS[categoria]}
+
+        Aquí tienes una lista de opiniones de clientes sobre el negocio:
+        {list_reviews}
+
+        Por favor, proporciona un resumen detallado de la percepción del cliente en la categoría '{categoria}'.
+    """
+
+
+def format_sse(event: str, data) -> str:
+    """Server-sent event frame; `data` is JSON-encoded so newlines in tokens are safe."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_reviews_analysis(business_id: str, categoria: str, repos: Repositories) -> AsyncIterator[str]:
+    """
+    Stream the reviews analysis of one category as server-sent events.
+
+    Events: `start` right away (so the client gets its first byte before the
+    vector search), one `token` per generated chunk, then `done` with the
+    full text, or `error` if anything fails mid-stream.
+    """
+    yield format_sse("start", {"business_id": business_id, "category": categoria})
+    try:
+        list_reviews = await run_db(find_category_reviews, business_id, categoria, repos)
+        prompt = build_reviews_prompt(categoria, list_reviews)
+        content = []
+        async for chunk in get_chat_model().astream(prompt):
+            if chunk.content:
+                content.append(chunk.content)
+                yield format_sse("token", chunk.content)
+        yield format_sse("done", "".join(content))
+    except Exception as e:
+        logger.exception("Reviews analysis stream failed")
+        yield format_sse("error", str(e))
@@ -0,0 +1,384 @@
+"""
+Site selection: where should a business open its next location.
+
+Demand and supply are binned into a geohash grid (SITE_GRID_PRECISION
+characters, ~1.2 x 0.6 km cells at 6; changing it requires a rebuild). The `siteGrid` collection holds one
+document per cell, updated with atomic increments as things happen:
+
+  - event created (`record_event`): supply of the business vertical;
+  - reservation created, check-in, review (`record_reservation`,
+    `record_checkin`, `record_review`): demand in the cell of the event.
+
+Every process keeps a `SiteGrid`: the cells as NumPy columns, synced from
+`siteGrid` through `updatedAt` by a background task every
+SITE_GRID_SYNC_SECONDS (like the numpy vector index, re-reading an overlap of
+SITE_GRID_SYNC_OVERLAP_SECONDS so late commits are not missed), and reloaded
+whole when the rebuild marker changes. Requests never sync. Ranking scores every cell at once with array operations, so
+a request costs milliseconds whatever the history size:
+
+    score = 100 * (demand * w_demand + rating * w_rating + (1 - saturation) * w_competition)
+
+with demand log-scaled against the best candidate cell, a smoothed average
+rating and saturation = competitors / (competitors + log-demand + 1).
+Cells where the business already has events are left out.
+
+`rebuild_site_grid` recomputes the grid from events and reservations:
+
+Usage (from backend/):
+    python -m src.app.services.site_selection rebuild
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.app.database.mongodb import run_db
+from src.app.repositories.base import Repositories
+from src.app.services.reputation import ATTENDED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+SITE_GRID_BATCH_SIZE = 1000
+
+SCORE_WEIGHTS = {"demand": 0.55, "rating": 0.2, "competition": 0.25}
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5.0
+EARTH_RADIUS_KM = 6371.0
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_CHARS = np.array(list(GEOHASH_ALPHABET))
+_GEOHASH_VALUES = {char: value for value, char in enumerate(GEOHASH_ALPHABET)}
+
+DEMAND_COUNTERS = ("reservations", "checkins", "ratingSum", "ratingCount")
+
+
+# Se leen al usarse (después del .env) para que la app y el CLI usen la misma precisión
+def site_grid_precision() -> int:
+    return int(os.getenv("SITE_GRID_PRECISION", "6"))
+
+
+def site_grid_sync_seconds() -> float:
+    return float(os.getenv("SITE_GRID_SYNC_SECONDS", "60"))
+
+
+def site_grid_sync_overlap_seconds() -> float:
+    return float(os.getenv("SITE_GRID_SYNC_OVERLAP_SECONDS", "300"))
+
+
+# ——— Geohash vectorizado ———
+
+def encode_cells(latitudes, longitudes, precision: Optional[int] = None) -> List[str]:
+    """Geohash cell of each point (arrays in, one string per point out)."""
+    precision = precision or site_grid_precision()
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    lat_range = np.stack([np.full(lat.shape, -90.0), np.full(lat.shape, 90.0)])
+    lon_range = np.stack([np.full(lon.shape, -180.0), np.full(lon.shape, 180.0)])
+    codes = np.zeros((lat.shape[0], precision), dtype=np.int64)
+    for bit in range(5 * precision):
+        # Bits pares: longitud; impares: latitud
+        value, bounds = (lon, lon_range) if bit % 2 == 0 else (lat, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        upper = value >= middle
+        bounds[0] = np.where(upper, middle, bounds[0])
+        bounds[1] = np.where(upper, bounds[1], middle)
+        codes[:, bit // 5] = codes[:, bit // 5] * 2 + upper
+    return ["".join(row) for row in _GEOHASH_CHARS[codes]]
+
+
+def decode_centers(cells: List[str]) -> np.ndarray:
+    """(latitude, longitude) of the center of each geohash cell, as an (n, 2) array."""
+    if not cells:
+        return np.zeros((0, 2))
+    precision = len(cells[0])
+    codes = np.array([[_GEOHASH_VALUES[char] for char in cell] for cell in cells], dtype=np.int64)
+    lat_range = np.stack([np.full(len(cells), -90.0), np.full(len(cells), 90.0)])
+    lon_range = np.stack([np.full(len(cells), -180.0), np.full(len(cells), 180.0)])
+    for bit in range(5 * precision):
+        upper = (codes[:, bit // 5] >> (4 - bit % 5)) & 1 == 1
+        bounds = lon_range if bit % 2 == 0 else lat_range
+        middle = (bounds[0] + bounds[1]) / 2
+        bounds[0] = np.where(upper, middle, bounds[0])
+        bounds[1] = np.where(upper, bounds[1], middle)
+    return np.stack([lat_range.mean(axis=0), lon_range.mean(axis=0)], axis=1)
+
+
+def haversine_km(lat, lon, points: np.ndarray) -> np.ndarray:
+    """Distance (km) from each (lat, lon) to the nearest of `points` ((m, 2) array)."""
+    lat1, lon1 = np.radians(lat)[:, None], np.radians(lon)[:, None]
+    lat2, lon2 = np.radians(points[:, 0])[None, :], np.radians(points[:, 1])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))).min(axis=1)
+
+
+def event_cell(event: Optional[dict]) -> Optional[str]:
+    if not event or event.get("latitude") is None or event.get("longitude") is None:
+        return None
+    return encode_cells([event["latitude"]], [event["longitude"]])[0]
+
+
+def vertical_key(vertical: Optional[str]) -> str:
+    """Vertical as a field name (no dots or dollars)."""
+    return (vertical or "unknown").strip().lower().replace(".", "_").replace("$", "_")
+
+
+# ——— Actualización incremental ———
+
+def record_event(repos: Repositories, event: dict):
+    """Count a new event as supply of its business vertical (blocking: call through `run_db`)."""
+    cell = event_cell(event)
+    business = repos.businesses.get(event.get("businessId")) if event.get("businessId") else None
+    if cell and business:
+        repos.site_grid.increment(cell, {"events": 1, f"supply.{vertical_key(business.get('vertical'))}": 1}, datetime.utcnow())
+
+
+def record_reservation(repos: Repositories, event: Optional[dict], reservation: dict):
+    """Count a new reservation as demand in the cell of its event (blocking)."""
+    cell = event_cell(event)
+    if cell:
+        repos.site_grid.increment(cell, {"reservations": 1}, datetime.utcnow())
+
+
+def record_checkin(repos: Repositories, event: Optional[dict], reservation: dict, checkin: dict):
+    """Count a check-in (blocking); `reservation` is the document before the check-in."""
+    previous = reservation.get("checkin") or {}
+    cell = event_cell(event)
+    if cell and previous.get("status") not in ATTENDED_STATUSES and checkin.get("status") in ATTENDED_STATUSES:
+        repos.site_grid.increment(cell, {"checkins": 1}, datetime.utcnow())
+
+
+def record_review(repos: Repositories, event: Optional[dict], reservation: dict, review: dict):
+    """Count a review (blocking); a previous review of the reservation is taken out."""
+    cell = event_cell(event)
+    if not cell or review.get("rating") is None:
+        return
+    amounts = {"ratingSum": review["rating"], "ratingCount": 1}
+    previous = (reservation.get("checkin") or {}).get("review") or {}
+    if previous.get("rating") is not None:
+        amounts = {"ratingSum": review["rating"] - previous["rating"]}
+    if any(amounts.values()):
+        repos.site_grid.increment(cell, amounts, datetime.utcnow())
+
+
+# ——— Rejilla en memoria y ranking ———
+
+class SiteGrid:
+    """
+    In-process copy of `siteGrid` as NumPy columns.
+
+    Cells changed by any process are picked up by `refresh_periodically`
+    every `sync_seconds` through their `updatedAt`. Each sync re-reads an
+    `overlap_seconds` window before the last `updatedAt` seen: a write stamped
+    earlier but committed after the previous sync is still picked up. The
+    columns are rebuilt only when a cell actually changed. A rebuild can also
+    drop cells, which leaves nothing to sync: when the rebuild marker differs
+    from the one loaded, the grid is reloaded whole.
+    """
+
+    def __init__(self, sync_seconds: float = 60.0, overlap_seconds: float = 300.0):
+        self.sync_seconds = sync_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.cells: Dict[str, dict] = {}
+        self.last_sync: Optional[datetime] = None
+        self.rebuilt_at: Optional[datetime] = None
+        self._columns: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, repos: Repositories):
+        """Apply the cells changed since the last sync (blocking: call through `run_db`)."""
+        with self._lock:
+            rebuilt_at = repos.site_grid.rebuilt_at()
+            if rebuilt_at != self.rebuilt_at:
+                self.cells = {}
+                self.last_sync = None
+                self._columns = None
+                self.rebuilt_at = rebuilt_at
+            since = self.last_sync - self.overlap if self.last_sync else None
+            for cells in repos.site_grid.iter_changed(since, SITE_GRID_BATCH_SIZE):
+                for cell in cells:
+                    # La ventana de solape vuelve a traer celdas ya cargadas: solo cuenta si cambió
+                    if self.cells.get(cell["_id"]) != cell:
+                        self.cells[cell["_id"]] = cell
+                        self._columns = None
+                    if self.last_sync is None or cell["updatedAt"] > self.last_sync:
+                        self.last_sync = cell["updatedAt"]
+
+    def columns(self) -> dict:
+        """Cell IDs, centers, demand counters and supply per vertical as arrays."""
+        with self._lock:
+            if self._columns is None:
+                ids = list(self.cells)
+                docs = [self.cells[cell] for cell in ids]
+                verticals = sorted({vertical for doc in docs for vertical in (doc.get("supply") or {})})
+                self._columns = {
+                    "ids": np.array(ids, dtype=object),
+                    "centers": decode_centers(ids),
+                    **{counter: np.array([doc.get(counter) or 0 for doc in docs], dtype=np.float64) for counter in DEMAND_COUNTERS},
+                    "supply": {
+                        vertical: np.array([(doc.get("supply") or {}).get(vertical) or 0 for doc in docs], dtype=np.float64)
+                        for vertical in verticals
+                    },
+                }
+            return self._columns
+
+    def rank(self, vertical: Optional[str], own_cells: List[str], own_points: np.ndarray, limit: int = 10, radius_km: Optional[float] = None) -> List[dict]:
+        """
+        Best cells for a business of a vertical.
+
+        Args:
+            vertical (str): Business vertical (its competitors are the same vertical).
+            own_cells (list): Cells where the business already has events (excluded).
+            own_points (np.ndarray): (m, 2) coordinates of the business events.
+            limit (int): Number of cells to return.
+            radius_km (float): Only cells within this distance of the business events.
+        """
+        columns = self.columns()
+        if len(columns["ids"]) == 0:
+            return []
+        demand = columns["reservations"] + columns["checkins"]
+        competitors = columns["supply"].get(vertical_key(vertical), np.zeros_like(demand))
+        distance = haversine_km(columns["centers"][:, 0], columns["centers"][:, 1], own_points) if len(own_points) else None
+
+        candidates = (demand > 0) & ~np.isin(columns["ids"], list(own_cells))
+        if radius_km is not None and distance is not None:
+            candidates &= distance <= radius_km
+        if not candidates.any():
+            return []
+
+        log_demand = np.log1p(demand)
+        demand_score = log_demand / log_demand[candidates].max()
+        rating = (columns["ratingSum"] + RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT) / (columns["ratingCount"] + RATING_PRIOR_WEIGHT)
+        rating_score = (rating - 1) / 4
+        saturation = competitors / (competitors + log_demand + 1)
+        score = 100 * (
+            SCORE_WEIGHTS["demand"] * demand_score
+            + SCORE_WEIGHTS["rating"] * rating_score
+            + SCORE_WEIGHTS["competition"] * (1 - saturation)
+        )
+        score = np.where(candidates, score, -np.inf)
+
+        # Top-k sin ordenar toda la rejilla
+        k = min(limit, int(candidates.sum()))
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top])]
+        return [
+            {
+                "cell": columns["ids"][row],
+                "latitude": round(float(columns["centers"][row, 0]), 6),
+                "longitude": round(float(columns["centers"][row, 1]), 6),
+                "score": round(float(score[row]), 1),
+                "reservations": int(columns["reservations"][row]),
+                "checkins": int(columns["checkins"][row]),
+                "averageRating": round(float(columns["ratingSum"][row] / columns["ratingCount"][row]), 2) if columns["ratingCount"][row] else None,
+                "competitors": int(competitors[row]),
+                "distanceKm": round(float(distance[row]), 2) if distance is not None else None,
+            }
+            for row in top
+        ]
+
+
+_grid: Optional[SiteGrid] = None
+_grid_lock = threading.Lock()
+
+
+def get_site_grid() -> SiteGrid:
+    """Process-wide in-memory grid."""
+    global _grid
+    with _grid_lock:
+        if _grid is None:
+            _grid = SiteGrid(sync_seconds=site_grid_sync_seconds(), overlap_seconds=site_grid_sync_overlap_seconds())
+        return _grid
+
+
+async def refresh_periodically(repos: Repositories):
+    """App task: apply other processes' grid changes every sync interval."""
+    grid = get_site_grid()
+    if not grid.sync_seconds:
+        return
+    while True:
+        await asyncio.sleep(grid.sync_seconds)
+        try:
+            await run_db(grid.refresh, repos)
+        except Exception:
+            logger.exception("Site grid sync failed")
+
+
+def rank_locations(repos: Repositories, business: dict, limit: int = 10, radius_km: Optional[float] = None) -> List[dict]:
+    """Top candidate cells for a business (blocking); the grid is kept in sync by `refresh_periodically`."""
+    grid = get_site_grid()
+    points = [
+        (event["latitude"], event["longitude"])
+        for events in repos.events.iter_by_business(business["_id"], SITE_GRID_BATCH_SIZE)
+        for event in events
+        if event.get("latitude") is not None and event.get("longitude") is not None
+    ]
+    own_points = np.array(points, dtype=np.float64).reshape(-1, 2)
+    own_cells = encode_cells(own_points[:, 0], own_points[:, 1]) if len(points) else []
+    return grid.rank(business.get("vertical"), own_cells, own_points, limit, radius_km)
+
+
+def rebuild_site_grid(repos: Repositories) -> int:
+    """Recompute every cell from the events and reservations (blocking). Returns the number of cells."""
+    now = datetime.utcnow()
+    cells: Dict[str, dict] = {}
+
+    def cell_doc(cell: str) -> dict:
+        return cells.setdefault(cell, {"_id": cell, "events": 0, "supply": {}, **{counter: 0 for counter in DEMAND_COUNTERS}, "updatedAt": now})
+
+    for business_ids in repos.businesses.iter_ids(SITE_GRID_BATCH_SIZE):
+        for business_id in business_ids:
+            vertical = vertical_key((repos.businesses.get(business_id) or {}).get("vertical"))
+            for events in repos.events.iter_by_business(business_id, SITE_GRID_BATCH_SIZE):
+                event_cells = {}
+                for event in events:
+                    cell = event_cell(event)
+                    if cell:
+                        event_cells[event["_id"]] = cell
+                        doc = cell_doc(cell)
+                        doc["events"] += 1
+                        doc["supply"][vertical] = doc["supply"].get(vertical, 0) + 1
+                for reservations in repos.reservations.iter_by_events(list(event_cells), SITE_GRID_BATCH_SIZE):
+                    for res in reservations:
+                        doc = cell_doc(event_cells[res["eventId"]])
+                        doc["reservations"] += 1
+                        checkin = res.get("checkin") or {}
+                        if checkin.get("status") in ATTENDED_STATUSES:
+                            doc["checkins"] += 1
+                        review = checkin.get("review") or {}
+                        if review.get("rating") is not None:
+                            doc["ratingSum"] += review["rating"]
+                            doc["ratingCount"] += 1
+    repos.site_grid.replace_all(list(cells.values()), now)
+    return len(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute the site-selection grid from events and reservations.")
+    parser.add_argument("command", choices=("rebuild",))
+    parser.parse_args()
+
+    from dotenv import load_dotenv
+    from src.app.database.mongodb import get_client_options, get_database, get_mongo_client
+    from src.app.repositories.mongo import build_mongo_repositories
+
+    load_dotenv()
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI environment variable is required")
+    client = get_mongo_client(mongodb_uri, **get_client_options())
+    try:
+        cells = rebuild_site_grid(build_mongo_repositories(get_database(client)))
+        # Los procesos en marcha recogen las celdas nuevas en su próxima sincronización
+        print(f"✅ Site grid rebuilt: {cells} cells (precision {site_grid_precision()})")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
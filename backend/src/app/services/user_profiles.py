@@ -0,0 +1,168 @@
+"""
+User taste profiles for event recommendations.
+
+A profile is the rating-weighted mean of the embeddings of the events the
+user rated best, L2-normalized. Profiles are kept in an in-process LRU so
+recommendation requests only pay for the vector search, and new reviews
+update the cached profile in place instead of invalidating it.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.app.repositories.base import Repositories
+
+# Número de reviews mejor valoradas que forman el perfil del usuario
+PROFILE_TOP_REVIEWS = 5
+
+
+def rating_weight(rating: float) -> float:
+    """Normalize a rating to its profile weight (2.5 -> 0, 5.0 -> 1)."""
+    # Asumiendo que el rating está entre 2.5 y 5.0
+    return (rating - 2.5) / (5.0 - 2.5)
+
+
+def _merge_review(reviews: List[dict], event_id: str, rating: float) -> List[dict]:
+    """Top reviews after reviewing `event_id` (an earlier review of the event is replaced)."""
+    merged = [review for review in reviews if review["eventId"] != event_id]
+    merged.append({"eventId": event_id, "rating": rating, "createdAt": datetime.utcnow()})
+    merged.sort(key=lambda review: (review["rating"], review.get("createdAt") or datetime.min), reverse=True)
+    return merged[:PROFILE_TOP_REVIEWS]
+
+
+class UserProfile:
+    """Top rated reviews of a user and the resulting normalized profile vector."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.reviews: List[dict] = []
+        self.embeddings: Dict[str, np.ndarray] = {}
+        self.vector: Optional[np.ndarray] = None
+        self.built_at = time.monotonic()
+
+    @property
+    def event_ids(self) -> List[str]:
+        """Events the profile is built from (excluded from recommendations)."""
+        return list(dict.fromkeys(review["eventId"] for review in self.reviews))
+
+    def compute(self):
+        """Recompute the profile vector from the cached reviews and embeddings."""
+        rows = [review for review in self.reviews if review["eventId"] in self.embeddings]
+        if not rows:
+            self.vector = None
+            return
+        matrix = np.stack([self.embeddings[review["eventId"]] for review in rows])
+        weights = np.array([rating_weight(review["rating"]) for review in rows], dtype=np.float32)
+        # Media de los embeddings ponderados por el rating de cada review
+        mean = (weights @ matrix) / len(rows)
+        norm = np.linalg.norm(mean)
+        if not np.isfinite(norm) or norm == 0:
+            self.vector = None
+            return
+        self.vector = mean / norm
+
+
+class UserProfileStore:
+    """
+    LRU cache of user profiles.
+
+    Entries expire after USER_PROFILE_TTL_SECONDS so reviews written by other
+    worker processes are eventually reflected.
+    """
+
+    def __init__(self, max_users: int = 10000, ttl_seconds: float = 300.0):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._profiles: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, user_id: str) -> Optional[UserProfile]:
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                return None
+            if time.monotonic() - profile.built_at > self.ttl_seconds:
+                del self._profiles[user_id]
+                return None
+            self._profiles.move_to_end(user_id)
+            return profile
+
+    def _store(self, profile: UserProfile):
+        with self._lock:
+            self._profiles[profile.user_id] = profile
+            self._profiles.move_to_end(profile.user_id)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+
+    def build(self, user_id: str, repos: Repositories) -> UserProfile:
+        """Build a profile from the repositories and cache it."""
+        profile = UserProfile(user_id)
+        profile.reviews = repos.review_embeddings.top_rated_by_user(user_id, PROFILE_TOP_REVIEWS)
+        if profile.reviews:
+            profile.embeddings = repos.event_embeddings.find_vectors(profile.event_ids)
+        profile.compute()
+        self._store(profile)
+        return profile
+
+    def get(self, user_id: str, repos: Repositories) -> UserProfile:
+        """
+        Get the profile of a user, building it on a cache miss.
+
+        Returns:
+            UserProfile: `vector` is None when the user has no usable reviews.
+        """
+        return self._cached(user_id) or self.build(user_id, repos)
+
+    def record_review(self, user_id: str, event_id: str, rating: float, repos: Repositories):
+        """
+        Update a cached profile with a new review.
+
+        A review that replaces an earlier one of the same event takes its
+        place. Only the embedding of the reviewed event is fetched, and only
+        when it enters the user's top reviews. Uncached users are left alone:
+        their profile will be built on the next recommendation request.
+        """
+        if rating is None:
+            return
+        profile = self._cached(user_id)
+        if profile is None:
+            return
+        with self._lock:
+            entered = any(review["eventId"] == event_id for review in _merge_review(profile.reviews, event_id, rating))
+            fetch = entered and event_id not in profile.embeddings
+        # La lectura del embedding va fuera del lock; el merge se repite dentro con las reviews actuales
+        embeddings = repos.event_embeddings.find_vectors([event_id]) if fetch else {}
+        with self._lock:
+            replaced = next((review for review in profile.reviews if review["eventId"] == event_id), None)
+            if replaced is not None and rating < replaced["rating"] and len(profile.reviews) >= PROFILE_TOP_REVIEWS:
+                # La review bajó: otra fuera del top puede superarla, se reconstruye en la próxima petición
+                self._profiles.pop(user_id, None)
+                return
+            profile.reviews = _merge_review(profile.reviews, event_id, rating)
+            profile.embeddings.update(embeddings)
+            profile.embeddings = {key: value for key, value in profile.embeddings.items() if key in profile.event_ids}
+            profile.compute()
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+
+_store: Optional[UserProfileStore] = None
+
+
+def get_user_profiles() -> UserProfileStore:
+    """Get the process-wide user profile store."""
+    global _store
+    if _store is None:
+        _store = UserProfileStore(
+            max_users=int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("USER_PROFILE_TTL_SECONDS", "300")),
+        )
+    return _store
@@ -0,0 +1,378 @@
+"""
+Pluggable vector search for the embedding collections.
+
+Two backends share the same interface:
+
+- `AtlasVectorSearch`: the `$vectorSearch` aggregation stage (MongoDB Atlas only).
+- `NumpyVectorSearch`: in-process index, one contiguous float32 matrix per
+  collection, cosine top-k with a single matrix-vector product.
+
+Select it with VECTOR_SEARCH_BACKEND=atlas|numpy (default: atlas).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo.database import Database
+
+from src.app.database.indexes import IndexSpec
+from src.app.database.mongodb import run_db
+
+logger = logging.getLogger(__name__)
+
+# Configuración por colección: índice de Atlas, campos filtrables y campos devueltos
+VECTOR_COLLECTIONS = {
+    "eventEmbeddings": {
+        "index": "embedding_vector_index_Events",
+        "filter_fields": ["eventId", "businessId"],
+        "project_fields": ["eventId", "description"],
+    },
+    "reviewEmbeddings": {
+        "index": "embedding_vector_index_Reviews",
+        "filter_fields": ["businessId", "eventId", "userId"],
+        "project_fields": ["text", "rating"],
+    },
+}
+
+# Sincronización incremental del backend numpy: documentos con updatedAt >= último visto
+SYNC_INDEXES = tuple(
+    IndexSpec(collection, [("updatedAt", 1)], f"idx_{collection}_updatedAt", "NumpyVectorSearch._sync: updatedAt >= last_sync")
+    for collection in VECTOR_COLLECTIONS
+)
+
+
+class VectorSearchBackend:
+    """Common interface of the vector search backends."""
+
+    name = "base"
+
+    def search(
+        self,
+        db: Database,
+        collection: str,
+        query_vector: List[float],
+        limit: int = 10,
+        filter: Optional[dict] = None,
+        num_candidates: int = 100,
+    ) -> List[dict]:
+        """
+        Find the documents whose embedding is closest to `query_vector`.
+
+        Args:
+            db (Database): The MongoDB database instance.
+            collection (str): Embedding collection (a key of VECTOR_COLLECTIONS).
+            query_vector (list): The query embedding.
+            limit (int): Maximum number of results.
+            filter (dict): Pre-filter on the collection's filter fields
+                (equality, `$eq`, `$ne`, `$in` and `$nin`).
+            num_candidates (int): Candidates considered by approximate backends.
+
+        Returns:
+            list: Documents with `_id`, the projected fields and `score`,
+            sorted by decreasing score. Scores follow Atlas' cosine
+            `vectorSearchScore`, i.e. (1 + cosine) / 2 in [0, 1].
+        """
+        raise NotImplementedError
+
+    def upsert(self, collection: str, doc: dict):
+        """Add or replace one embedding document in the index."""
+
+    def delete(self, collection: str, doc_id):
+        """Remove one embedding document from the index."""
+
+    def load(self, db: Database):
+        """Warm the backend (called at startup)."""
+
+    def sync(self, db: Database):
+        """Apply the changes made by other processes (called periodically in the background)."""
+
+
+class AtlasVectorSearch(VectorSearchBackend):
+    """`$vectorSearch` on MongoDB Atlas Search indexes."""
+
+    name = "atlas"
+
+    def search(self, db, collection, query_vector, limit=10, filter=None, num_candidates=100):
+        config = VECTOR_COLLECTIONS[collection]
+        vector_stage = {
+            "index": config["index"],
+            "limit": limit,
+            "numCandidates": num_candidates,
+            "path": "embedding",
+            "queryVector": query_vector,
+        }
+        if filter:
+            vector_stage["filter"] = filter
+        project = {field: 1 for field in config["project_fields"]}
+        project["score"] = {"$meta": "vectorSearchScore"}
+        pipeline = [{"$vectorSearch": vector_stage}, {"$project": project}]
+        return list(db[collection].aggregate(pipeline))
+
+
+class NumpyVectorIndex:
+    """
+    In-memory cosine index over one embedding collection.
+
+    Rows are L2-normalized and stored in a single float32 matrix that grows
+    geometrically; deletes move the last row into the freed slot so the
+    live rows stay contiguous.
+    """
+
+    def __init__(self, filter_fields: List[str], project_fields: List[str], capacity: int = 1024):
+        self.filter_fields = filter_fields
+        self.project_fields = project_fields
+        self.capacity = capacity
+        self.dim: Optional[int] = None
+        self.matrix: Optional[np.ndarray] = None
+        self.size = 0
+        self.ids: List = []
+        self.positions: Dict[str, int] = {}
+        self.payloads: List[dict] = []
+        self.columns: Dict[str, np.ndarray] = {}
+        self.last_sync: Optional[datetime] = None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.size
+
+    def _allocate(self, dim: int):
+        self.dim = dim
+        self.matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+        for field in self.filter_fields:
+            self.columns[field] = np.empty(self.capacity, dtype=object)
+
+    def _grow(self):
+        self.capacity *= 2
+        matrix = np.zeros((self.capacity, self.dim), dtype=np.float32)
+        matrix[: self.size] = self.matrix[: self.size]
+        self.matrix = matrix
+        for field, column in self.columns.items():
+            grown = np.empty(self.capacity, dtype=object)
+            grown[: self.size] = column[: self.size]
+            self.columns[field] = grown
+
+    def upsert(self, doc: dict):
+        vector = np.asarray(doc["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        key = str(doc["_id"])
+        with self.lock:
+            if self.matrix is None:
+                self._allocate(vector.shape[0])
+            if vector.shape[0] != self.dim:
+                raise ValueError(f"Embedding dimension {vector.shape[0]} != index dimension {self.dim}")
+            row = self.positions.get(key)
+            if row is None:
+                if self.size == self.capacity:
+                    self._grow()
+                row = self.size
+                self.size += 1
+                self.positions[key] = row
+                self.ids.append(doc["_id"])
+                self.payloads.append({})
+            self.matrix[row] = vector / norm
+            self.payloads[row] = {field: doc.get(field) for field in self.project_fields}
+            for field, column in self.columns.items():
+                column[row] = doc.get(field)
+
+    def delete(self, doc_id):
+        key = str(doc_id)
+        with self.lock:
+            row = self.positions.pop(key, None)
+            if row is None:
+                return
+            last = self.size - 1
+            if row != last:
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = self.ids[last]
+                self.payloads[row] = self.payloads[last]
+                for column in self.columns.values():
+                    column[row] = column[last]
+                self.positions[str(self.ids[row])] = row
+            self.ids.pop()
+            self.payloads.pop()
+            for column in self.columns.values():
+                column[last] = None
+            self.size = last
+
+    def _filter_mask(self, filter: dict) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for field, condition in filter.items():
+            if field not in self.columns:
+                raise ValueError(f"Field '{field}' is not filterable in this index")
+            column = self.columns[field][: self.size]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, value in condition.items():
+                if operator == "$eq":
+                    mask &= column == value
+                elif operator == "$ne":
+                    mask &= column != value
+                elif operator in ("$in", "$nin"):
+                    values = set(value)
+                    found = np.fromiter((item in values for item in column), dtype=bool, count=self.size)
+                    mask &= found if operator == "$in" else ~found
+                else:
+                    raise ValueError(f"Unsupported filter operator '{operator}'")
+        return mask
+
+    def search(self, query_vector: List[float], limit: int = 10, filter: Optional[dict] = None) -> List[dict]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        with self.lock:
+            if self.size == 0 or norm == 0:
+                return []
+            scores = self.matrix[: self.size] @ (query / norm)
+            if filter:
+                scores = np.where(self._filter_mask(filter), scores, -np.inf)
+            k = min(limit, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for row in top:
+                if not np.isfinite(scores[row]):
+                    break
+                results.append({
+                    "_id": self.ids[row],
+                    **self.payloads[row],
+                    "score": float((1.0 + scores[row]) / 2.0),
+                })
+            return results
+
+
+class NumpyVectorSearch(VectorSearchBackend):
+    """
+    In-process vector search, loaded from Mongo and kept up to date incrementally.
+
+    Writers in this process call `upsert` / `delete`. Documents written by
+    other processes (e.g. the embedding backfill) are picked up by `sync`,
+    which the app runs in the background every VECTOR_INDEX_SYNC_SECONDS
+    (`sync_periodically`), so searches never wait for a database read.
+    Each sync re-reads the last VECTOR_INDEX_SYNC_OVERLAP_SECONDS before the
+    newest `updatedAt` seen, so writes committed late with an older
+    timestamp (concurrent writers, clock skew between servers) are not
+    skipped. Every VECTOR_INDEX_RECONCILE_SECONDS the sync also compares the
+    indexed IDs with the collection: it drops the ones that are gone (deletes
+    leave no `updatedAt`) and loads any that are still missing.
+    """
+
+    name = "numpy"
+
+    def __init__(self, sync_seconds: float = 30.0, reconcile_seconds: float = 600.0, overlap_seconds: float = 300.0):
+        self.sync_seconds = sync_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.indexes: Dict[str, NumpyVectorIndex] = {
+            name: NumpyVectorIndex(config["filter_fields"], config["project_fields"])
+            for name, config in VECTOR_COLLECTIONS.items()
+        }
+        self._reconciled_at: Dict[str, float] = {}
+        self._sync_lock = threading.Lock()
+
+    def _load_docs(self, index: NumpyVectorIndex, cursor):
+        for doc in cursor:
+            if doc.get("embedding"):
+                index.upsert(doc)
+            updated_at = doc.get("updatedAt")
+            if updated_at and (index.last_sync is None or updated_at > index.last_sync):
+                index.last_sync = updated_at
+
+    def _fields(self, index: NumpyVectorIndex) -> dict:
+        return {field: 1 for field in {"embedding", "updatedAt", *index.filter_fields, *index.project_fields}}
+
+    def _sync(self, db: Database, collection: str):
+        with self._sync_lock:
+            index = self.indexes[collection]
+            # Ventana de solape: los upserts son idempotentes y así no se pierden commits tardíos
+            query = {"updatedAt": {"$gte": index.last_sync - self.overlap}} if index.last_sync else {}
+            self._load_docs(index, db[collection].find(query, self._fields(index)).batch_size(1000))
+
+    def _reconcile(self, db: Database, collection: str) -> Tuple[int, int]:
+        """Drop the indexed documents that no longer exist and load the missing ones; returns both counts."""
+        with self._sync_lock:
+            index = self.indexes[collection]
+            # Solo IDs indexados antes de leer la colección: lo añadido después ya está en Mongo
+            with index.lock:
+                indexed = set(index.positions)
+            stored = {doc["_id"] for doc in db[collection].find({}, {"_id": 1}).batch_size(5000)}
+            stored_ids = {str(doc_id): doc_id for doc_id in stored}
+            gone = indexed - set(stored_ids)
+            for doc_id in gone:
+                index.delete(doc_id)
+            missing = [stored_ids[doc_id] for doc_id in set(stored_ids) - indexed]
+            for start in range(0, len(missing), 1000):
+                self._load_docs(index, db[collection].find({"_id": {"$in": missing[start:start + 1000]}}, self._fields(index)))
+            self._reconciled_at[collection] = time.monotonic()
+            return len(gone), len(missing)
+
+    def load(self, db: Database):
+        for collection in self.indexes:
+            self._sync(db, collection)
+            self._reconciled_at[collection] = time.monotonic()
+
+    def sync(self, db: Database):
+        for collection in self.indexes:
+            self._sync(db, collection)
+            if time.monotonic() - self._reconciled_at.get(collection, -float("inf")) >= self.reconcile_seconds:
+                removed, added = self._reconcile(db, collection)
+                if removed or added:
+                    logger.info("Vector index %s reconciled: %d removed, %d added", collection, removed, added)
+
+    def search(self, db, collection, query_vector, limit=10, filter=None, num_candidates=100):
+        return self.indexes[collection].search(query_vector, limit=limit, filter=filter)
+
+    def upsert(self, collection, doc):
+        self.indexes[collection].upsert(doc)
+
+    def delete(self, collection, doc_id):
+        self.indexes[collection].delete(doc_id)
+
+
+_backend: Optional[VectorSearchBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_vector_search() -> VectorSearchBackend:
+    """
+    Get the process-wide vector search backend selected by VECTOR_SEARCH_BACKEND.
+
+    Returns:
+        VectorSearchBackend: the shared backend instance.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend = os.getenv("VECTOR_SEARCH_BACKEND", "atlas").lower()
+            if backend == "numpy":
+                _backend = NumpyVectorSearch(
+                    sync_seconds=float(os.getenv("VECTOR_INDEX_SYNC_SECONDS", "30")),
+                    reconcile_seconds=float(os.getenv("VECTOR_INDEX_RECONCILE_SECONDS", "600")),
+                    overlap_seconds=float(os.getenv("VECTOR_INDEX_SYNC_OVERLAP_SECONDS", "300")),
+                )
+            elif backend == "atlas":
+                _backend = AtlasVectorSearch()
+            else:
+                raise ValueError(f"Unknown VECTOR_SEARCH_BACKEND '{backend}'")
+        return _backend
+
+
+async def sync_periodically(db: Database):
+    """App task: apply other processes' changes to the vector backend every sync interval."""
+    backend = get_vector_search()
+    interval = getattr(backend, "sync_seconds", None)
+    if not interval:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_db(backend.sync, db)
+        except Exception:
+            logger.exception("Vector index sync failed")
@@ -0,0 +1,199 @@
+"""
+Local stand-in for the Telefónica Open Gateway sandbox.
+
+Implements the endpoints the backend calls (bc-authorize, token,
+kyc-match/v0.2/match and location/v0/verify) with configurable latency,
+error rate and rate limit, so `/users/` and the check-in path can be load
+tested offline. Point the backend to it with OGW_BASE_URL:
+
+    uvicorn src.app.simulators.open_gateway:app --port 9090
+    OGW_BASE_URL=http://localhost:9090 uvicorn src.app.main:app --port 8001
+
+Configuration (environment variables, also read from .env):
+    OGW_SIM_LATENCY_MS      Latency distribution of every endpoint:
+                            "fixed:50", "uniform:20,80", "normal:50,15"
+                            or "lognormal:50,0.5" (median, sigma).
+    OGW_SIM_LATENCY_MS_<ENDPOINT>
+                            Override per endpoint (AUTHORIZE, TOKEN, KYC, LOCATION).
+    OGW_SIM_ERROR_RATE      Fraction of requests answered with a 503 (0..1),
+                            also overridable per endpoint.
+    OGW_SIM_RATE_LIMIT      Requests per second accepted (token bucket,
+                            0 = unlimited); the rest get a 429.
+    OGW_SIM_TOKEN_TTL       `expires_in` of the issued access tokens.
+    OGW_SIM_LOCATION_RESULT verificationResult returned (TRUE, FALSE, PARTIAL).
+    OGW_SIM_KYC_MISMATCH_RATE
+                            Fraction of KYC fields answered with "false".
+    OGW_SIM_SEED            Random seed, for reproducible runs.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ENDPOINTS = ("AUTHORIZE", "TOKEN", "KYC", "LOCATION")
+
+
+def parse_latency(spec: str):
+    """
+    Parse a latency distribution spec into a sampler returning seconds.
+
+    Args:
+        spec (str): "fixed:50", "uniform:20,80", "normal:50,15" or "lognormal:50,0.5" (ms).
+
+    Returns:
+        callable: function (rng) -> delay in seconds.
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()] if params else []
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Distribución de latencia no válida: {spec}")
+
+
+class TokenBucket:
+    """Rate limiter: `rate` requests per second with bursts of up to `rate`."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class SimulatorConfig:
+    """Simulator settings, read from the environment (and .env, without overriding it)."""
+
+    def __init__(self):
+        load_dotenv()
+        default_latency = os.getenv("OGW_SIM_LATENCY_MS", "fixed:0")
+        default_error_rate = float(os.getenv("OGW_SIM_ERROR_RATE", "0"))
+        self.latency = {
+            endpoint: parse_latency(os.getenv(f"OGW_SIM_LATENCY_MS_{endpoint}", default_latency))
+            for endpoint in ENDPOINTS
+        }
+        self.error_rate = {
+            endpoint: float(os.getenv(f"OGW_SIM_ERROR_RATE_{endpoint}", default_error_rate))
+            for endpoint in ENDPOINTS
+        }
+        self.token_ttl = int(os.getenv("OGW_SIM_TOKEN_TTL", "3600"))
+        self.location_result = os.getenv("OGW_SIM_LOCATION_RESULT", "TRUE")
+        self.kyc_mismatch_rate = float(os.getenv("OGW_SIM_KYC_MISMATCH_RATE", "0"))
+        self.bucket = TokenBucket(float(os.getenv("OGW_SIM_RATE_LIMIT", "0")))
+        seed = os.getenv("OGW_SIM_SEED")
+        self.rng = random.Random(int(seed) if seed else None)
+
+
+def create_app(config: Optional[SimulatorConfig] = None) -> FastAPI:
+    """Build the simulator app (a fresh config from the environment by default)."""
+    config = config or SimulatorConfig()
+    app = FastAPI(title="Open Gateway Simulator")
+    stats = Counter()
+    # auth_req_id -> (teléfono, scope) y access_token -> teléfono
+    auth_requests = {}
+    tokens = {}
+
+    async def simulate(endpoint: str) -> Optional[JSONResponse]:
+        """Apply rate limit, latency and error injection; returns the error response, if any."""
+        stats[f"{endpoint}.requests"] += 1
+        if not config.bucket.allow():
+            stats[f"{endpoint}.429"] += 1
+            return JSONResponse({"code": "TOO_MANY_REQUESTS"}, status_code=429, headers={"Retry-After": "1"})
+        await asyncio.sleep(config.latency[endpoint](config.rng))
+        if config.rng.random() < config.error_rate[endpoint]:
+            stats[f"{endpoint}.503"] += 1
+            return JSONResponse({"code": "UNAVAILABLE", "message": "Simulated failure"}, status_code=503)
+        return None
+
+    def bearer_phone(request: Request) -> Optional[str]:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        return tokens.get(token)
+
+    @app.post("/bc-authorize")
+    async def bc_authorize(request: Request):
+        error = await simulate("AUTHORIZE")
+        if error:
+            return error
+        if not request.headers.get("Authorization", "").startswith("Basic "):
+            return JSONResponse({"error": "invalid_client"}, status_code=401)
+        form = await request.form()
+        phone = str(form.get("login_hint", "")).removeprefix("tel:")
+        if not phone:
+            return JSONResponse({"error": "invalid_request"}, status_code=400)
+        auth_req_id = uuid.uuid4().hex
+        auth_requests[auth_req_id] = (phone, form.get("scope"))
+        return {"auth_req_id": auth_req_id, "expires_in": 120, "interval": 0}
+
+    @app.post("/token")
+    async def token(request: Request):
+        error = await simulate("TOKEN")
+        if error:
+            return error
+        form = await request.form()
+        auth_request = auth_requests.pop(form.get("auth_req_id"), None)
+        if auth_request is None:
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        access_token = uuid.uuid4().hex
+        tokens[access_token] = auth_request[0]
+        return {"access_token": access_token, "token_type": "Bearer", "expires_in": config.token_ttl}
+
+    @app.post("/kyc-match/v0.2/match")
+    async def kyc_match(request: Request):
+        error = await simulate("KYC")
+        if error:
+            return error
+        if bearer_phone(request) is None:
+            return JSONResponse({"code": "UNAUTHENTICATED"}, status_code=401)
+        payload = await request.json()
+        return {
+            f"{field}Match": "false" if config.rng.random() < config.kyc_mismatch_rate else "true"
+            for field in payload
+            if field != "phone"
+        }
+
+    @app.post("/location/v0/verify")
+    async def location_verify(request: Request):
+        error = await simulate("LOCATION")
+        if error:
+            return error
+        if bearer_phone(request) is None:
+            return JSONResponse({"code": "UNAUTHENTICATED"}, status_code=401)
+        return {"verificationResult": config.location_result}
+
+    @app.get("/_sim/stats")
+    async def get_stats():
+        return dict(stats)
+
+    return app
+
+
+app = create_app()